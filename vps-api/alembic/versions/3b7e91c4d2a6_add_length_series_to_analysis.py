@@ -0,0 +1,33 @@
+"""add length series to analysis results
+
+Revision ID: 3b7e91c4d2a6
+Revises: 0f4b0e2c3a12
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7e91c4d2a6"
+down_revision: Union[str, None] = "0f4b0e2c3a12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("analysis_results", sa.Column("length_series", sa.LargeBinary(), nullable=True))
+    op.add_column("analysis_results", sa.Column("insert_frame_index", sa.Integer(), nullable=True))
+    op.add_column("analysis_results", sa.Column("series_fps", sa.Float(), nullable=True))
+    op.add_column("analysis_results", sa.Column("segmented_until", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("analysis_results", "segmented_until")
+    op.drop_column("analysis_results", "series_fps")
+    op.drop_column("analysis_results", "insert_frame_index")
+    op.drop_column("analysis_results", "length_series")
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from typing import TYPE_CHECKING
-from sqlalchemy import String, TIMESTAMP, func, ForeignKey, Integer, DECIMAL, SmallInteger, Text
+from sqlalchemy import String, TIMESTAMP, func, ForeignKey, Integer, DECIMAL, SmallInteger, Text, Float, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
@@ -61,6 +61,13 @@ class AnalysisResult(Base):
     init_speed: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=True)
     avg_speed: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=True)
     curve_data: Mapped[list] = mapped_column(JSONB, nullable=True)
+    # 测速原始输入：逐帧长度序列（zlib 压缩的 float32，见 app.api.videos.service.encode_length_series）、
+    # 刺入帧、测速帧率和已分割帧的上界（之后的长度为 0，为空表示全部已分割），
+    # 用于不重新分析视频而按新参数重算速度
+    length_series: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)
+    insert_frame_index: Mapped[int] = mapped_column(Integer, nullable=True)
+    series_fps: Mapped[float] = mapped_column(Float, nullable=True)
+    segmented_until: Mapped[int] = mapped_column(Integer, nullable=True)
     processed_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=True)
 
     video: Mapped["Video"] = relationship(back_populates="analysis_result")
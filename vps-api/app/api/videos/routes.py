@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_session
 from app.core.logging import get_logger
 from app.api.videos.service import VideoService
-from app.api.videos.schemas import VideoListResponse, VideoDetailResponse, UploadResponse, AnalysisResponse, CategoryResponse
+from app.api.videos.schemas import VideoListResponse, VideoDetailResponse, UploadResponse, AnalysisResponse, CategoryResponse, SpeedRecomputeRequest, SpeedRecomputeResponse, SpeedSweepRequest, SpeedSweepResponse
 from app.api.users.service import UserService
 from app.core.schemas import BaseResponse
 import uuid
@@ -127,6 +127,26 @@ async def analyze_video(
     await service.process_video_analysis(id)
     return BaseResponse(data={})
 
+@router.post("/analysis/speed", response_model=BaseResponse[SpeedRecomputeResponse])
+async def recompute_analysis_speed(
+    id: uuid.UUID,
+    params: SpeedRecomputeRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    service = VideoService(session)
+    data = await service.recompute_speed(id, params)
+    return BaseResponse(data=data)
+
+@router.post("/analysis/speed/sweep", response_model=BaseResponse[SpeedSweepResponse])
+async def sweep_analysis_speed(
+    id: uuid.UUID,
+    grid: SpeedSweepRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    service = VideoService(session)
+    data = await service.sweep_speed(id, grid)
+    return BaseResponse(data=data)
+
 @router.get("/uploaders", response_model=BaseResponse[List[str]])
 async def get_uploaders(session: AsyncSession = Depends(get_session)):
     data = await UserService(session).get_all_usernames()
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, ConfigDict, Field, field_serializer, computed_field
+from pydantic import BaseModel, ConfigDict, Field, field_serializer, computed_field, PositiveInt, PositiveFloat
 from uuid import UUID
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Tuple, Annotated
 from app.core.storage import storage
 from .enums import VideoStatus
 
@@ -120,6 +120,43 @@ class AnalysisCurvePoint(BaseModel):
     t: float
     v: float
 
+class SpeedRecomputeRequest(BaseModel):
+    """
+    按新参数由已保存的长度序列重算速度；swin / step 为空时按帧率选择。
+    结束点超出已分割范围（end_ratio 过小）时返回 422
+    """
+    swin: Optional[int] = Field(default=None, gt=0)
+    step: Optional[int] = Field(default=None, gt=0)
+    end_ratio: float = Field(default=0.5, gt=0, lt=1)
+    init_speed_sample_points: int = Field(default=5, gt=0)
+    save: bool = False
+
+class SpeedRecomputeResponse(AnalysisMetrics):
+    curve_data: List[AnalysisCurvePoint]
+
+MAX_SPEED_SWEEP_SIZE = 1024
+
+class SpeedSweepRequest(BaseModel):
+    """
+    测速参数网格：各字段取值列表的笛卡尔积即全部参数组合（swin / step 取 null 时按帧率选择）。
+    结束点超出已分割范围的组合不会使整个请求失败，而是在结果的 valid 列标记为 0
+    """
+    swin: List[Optional[PositiveInt]] = Field(default=[None], min_length=1)
+    step: List[Optional[PositiveInt]] = Field(default=[None], min_length=1)
+    end_ratio: List[Annotated[float, Field(gt=0, lt=1)]] = Field(default=[0.5], min_length=1)
+    init_speed_sample_points: List[PositiveInt] = Field(default=[5], min_length=1)
+    peak_outlier_threshold: List[PositiveFloat] = Field(default=[2.0], min_length=1)
+    speed_outlier_threshold: List[PositiveFloat] = Field(default=[3.5], min_length=1)
+
+class SpeedSweepResponse(BaseModel):
+    """
+    紧凑表格：rows 与 columns 一一对应，curves[i] 为第 i 行的 [t, v] 速度曲线；
+    最后一列 valid 为 1.0 表示该组合的结束点在已分割范围内，0.0 表示结果不可信
+    """
+    columns: List[str]
+    rows: List[List[float]]
+    curves: List[List[Tuple[float, float]]]
+
 class AnalysisResponse(BaseModel):
     video: VideoDetailResponse
     analysis: Optional[AnalysisResultResponse] = None
@@ -1,25 +1,91 @@
+import itertools
 import os
 import uuid
+import zlib
 from datetime import datetime
+
+import numpy as np
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.exceptions import UnprocessableEntityException, InternalServerException
 
+from app.core.config import settings
 from app.core.tempfile_manager import TempfileManager
 from app.core.video import transcode_video, extract_first_frame, get_video_metadata
 from app.core.storage import storage
 from app.core.logging import get_logger
 from app.api.videos.repository import VideoRepository
 from app.api.comparisons.repository import ComparisonRepository
-from app.api.videos.schemas import VideoCreate, VideoResponse, VideoDetailResponse, UploadResponse, VideoListResponse, AnalysisResponse, AnalysisResultResponse
+from app.api.videos.schemas import VideoCreate, VideoResponse, VideoDetailResponse, UploadResponse, VideoListResponse, AnalysisResponse, AnalysisResultResponse, SpeedRecomputeRequest, SpeedRecomputeResponse, SpeedSweepRequest, SpeedSweepResponse, MAX_SPEED_SWEEP_SIZE
 from app.api.videos.enums import VideoStatus
 from app.api.videos.models import Video, AnalysisResult
 
-from video_work.core import analyse_video
+from video_work.speed import PEAK_FIT_RADIUS
+from video_work.core import AnalysisOutput, SpeedParams, analyse_video, default_speed_window, estimate_speed, estimate_speed_sweep
 
 logger = get_logger(__name__)
 DEFAULT_CATEGORY_ID = 1
 
+
+def encode_length_series(lens: list[float]) -> bytes:
+    """逐帧长度序列 -> zlib 压缩的 float32（小端）字节"""
+    return zlib.compress(np.asarray(lens, dtype="<f4").tobytes())
+
+
+def decode_length_series(data: bytes) -> list[float]:
+    return np.frombuffer(zlib.decompress(data), dtype="<f4").astype(np.float64).tolist()
+
+
+def build_speed_metrics(output: AnalysisOutput, fps: int) -> dict:
+    """把帧序号换算为秒，得到 analysis_results 的速度字段"""
+    return {
+        "start_time": round(output.predict_start / fps, 3),
+        "end_time": round(output.predict_end / fps, 3),
+        "init_speed": float(output.init_speed),
+        "avg_speed": float(output.avg_speed),
+        "curve_data": [
+            {"t": round(frame_idx / fps, 2), "v": float(v)}
+            for frame_idx, v in zip(output.instantaneous_speed_indexes, output.instantaneous_speeds)
+        ],
+    }
+
+def in_segmented_range(output: AnalysisOutput, lens: list[float], segmented_until: int | None) -> bool:
+    """
+    按需分割在 segmented_until 处停止，之后的长度为 0。calc_speed 只读取结束点之前的长度，
+    0 尾部既不会改变峰值，也不会改变已分割范围内的第一个结束点，
+    因此结束点和峰值拟合窗口都落在已分割范围内时，结果与全量分割完全一致
+    """
+    if segmented_until is None:
+        return True
+    series = lens[output.predict_start : segmented_until]
+    if not series:
+        return False
+    peak_idx = output.predict_start + int(np.argmax(series))
+    return output.predict_end < segmented_until and peak_idx + PEAK_FIT_RADIUS < segmented_until
+
+
+def check_segmented_range(output: AnalysisOutput, lens: list[float], segmented_until: int | None) -> None:
+    """结束点或峰值拟合窗口落入未分割部分时结果不可信，抛出 422"""
+    if not in_segmented_range(output, lens, segmented_until):
+        raise UnprocessableEntityException(
+            detail=(
+                f"结束点（第 {output.predict_end} 帧）超出已分割范围"
+                f"（前 {segmented_until} 帧），请调大 end_ratio 或重新分析视频"
+            )
+        )
+
+SWEEP_PARAM_COLUMNS = [
+    "swin",
+    "step",
+    "end_ratio",
+    "init_speed_sample_points",
+    "peak_outlier_threshold",
+    "speed_outlier_threshold",
+]
+SWEEP_METRIC_COLUMNS = ["start_time", "end_time", "init_speed", "avg_speed"]
+# 1.0 表示结束点在已分割范围内（结果与全量分割一致），0.0 表示落入未分割部分、结果不可信
+SWEEP_VALID_COLUMN = "valid"
+
 class VideoService:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -196,6 +262,78 @@ class VideoService:
         return AnalysisResponse(video=video_detail, analysis=analysis_resp)
 
 
+    async def _load_length_series(self, video_id: uuid.UUID) -> tuple[AnalysisResult, list[float], int, float, int]:
+        """读取已保存的测速输入，返回 (analysis_result, 长度序列, 刺入帧, 测速帧率, 视频帧率)；已分割范围见 ar.segmented_until"""
+        video = await self.repository.get_video_with_analysis_result(video_id)
+        ar = video.analysis_result
+        if ar is None or ar.length_series is None or ar.insert_frame_index is None:
+            raise UnprocessableEntityException(detail="分析结果缺少长度序列，请重新分析视频")
+        fps = int(video.fps) if video.fps else 0
+        series_fps = float(ar.series_fps) if ar.series_fps else float(fps)
+        if fps <= 0 or series_fps <= 0:
+            raise UnprocessableEntityException(detail="视频 FPS 缺失，无法换算预测时间")
+        return ar, decode_length_series(ar.length_series), int(ar.insert_frame_index), series_fps, fps
+
+    async def recompute_speed(self, video_id: uuid.UUID, params: SpeedRecomputeRequest) -> SpeedRecomputeResponse:
+        """
+        由已保存的逐帧长度序列按新参数重算速度（不重新解码和推理）；
+        params.save 为 True 时把结果写回 analysis_results
+        """
+        ar, lens, insert_frame_index, series_fps, fps = await self._load_length_series(video_id)
+        output = estimate_speed(
+            lens,
+            insert_frame_index,
+            series_fps,
+            swin=params.swin,
+            step=params.step,
+            end_ratio=params.end_ratio,
+            init_speed_sample_points=params.init_speed_sample_points,
+        )
+        check_segmented_range(output, lens, ar.segmented_until)
+        metrics = build_speed_metrics(output, fps)
+        if params.save:
+            for key, value in metrics.items():
+                setattr(ar, key, value)
+            ar.processed_at = datetime.utcnow()
+            await self.session.commit()
+        return SpeedRecomputeResponse(**metrics)
+
+    async def sweep_speed(self, video_id: uuid.UUID, grid: SpeedSweepRequest) -> SpeedSweepResponse:
+        """在参数网格上一次性计算全部测速结果，返回紧凑表格"""
+        combos = list(itertools.product(*(getattr(grid, name) for name in SWEEP_PARAM_COLUMNS)))
+        if len(combos) > MAX_SPEED_SWEEP_SIZE:
+            raise UnprocessableEntityException(
+                detail=f"参数组合过多（{len(combos)}），最多 {MAX_SPEED_SWEEP_SIZE} 组"
+            )
+        ar, lens, insert_frame_index, series_fps, fps = await self._load_length_series(video_id)
+        default_swin, default_step = default_speed_window(series_fps)
+        params = [
+            SpeedParams(**dict(zip(SWEEP_PARAM_COLUMNS, combo)))
+            for combo in combos
+        ]
+        outputs = estimate_speed_sweep(lens, insert_frame_index, series_fps, params)
+
+        rows: list[list[float]] = []
+        curves: list[list[tuple[float, float]]] = []
+        for p, output in zip(params, outputs):
+            metrics = build_speed_metrics(output, fps)
+            rows.append([
+                p.swin if p.swin is not None else default_swin,
+                p.step if p.step is not None else default_step,
+                p.end_ratio,
+                p.init_speed_sample_points,
+                p.peak_outlier_threshold,
+                p.speed_outlier_threshold,
+                *(metrics[name] for name in SWEEP_METRIC_COLUMNS),
+                float(in_segmented_range(output, lens, ar.segmented_until)),
+            ])
+            curves.append([(point["t"], point["v"]) for point in metrics["curve_data"]])
+        return SpeedSweepResponse(
+            columns=SWEEP_PARAM_COLUMNS + SWEEP_METRIC_COLUMNS + [SWEEP_VALID_COLUMN],
+            rows=rows,
+            curves=curves,
+        )
+
     async def process_video_analysis(self, video_id: uuid.UUID) -> None:
         video = await self.repository.get_video_with_analysis_result(video_id)
         video.status = int(VideoStatus.PROCESSING)
@@ -224,7 +362,15 @@ class VideoService:
                 with TempfileManager.create_temp_file(suffix=".mp4") as temp_save_path:
                     logger.info("start analysing video ...", extra={"video_id": str(video_id), "raw_path": video.raw_path})
                     # 调用模型分析视频
-                    output = analyse_video(temp_video_path, temp_save_path, status_callback=status_callback)
+                    output = analyse_video(
+                        temp_video_path,
+                        temp_save_path,
+                        status_callback=status_callback,
+                        detect_backend=settings.DETECT_BACKEND,
+                        quantize=settings.ANALYSIS_QUANTIZE,
+                        detect_max_side=settings.DETECT_MAX_SIDE,
+                        detect_interval=settings.DETECT_INTERVAL,
+                    )
                     logger.info("end analysing video ...", extra={"video_id": str(video_id), "raw_path": video.raw_path})
                     try:
                         logger.info("start uploading analysed video ...", extra={"video_id": str(video_id), "raw_path": video.raw_path})   
@@ -240,31 +386,26 @@ class VideoService:
                         logger.error(f"Failed to save analysed video {video_id}: {e}")
                     
 
-                start_time = round(output.predict_start / fps, 3)
-                end_time = round(output.predict_end / fps, 3)
-                curve_data = [
-                    {"t": round(frame_idx / fps, 2), "v": float(v)}
-                    for frame_idx, v in zip(output.instantaneous_speed_indexes, output.instantaneous_speeds)
-                ]
+                metrics = build_speed_metrics(output, fps)
+                series = {
+                    "length_series": encode_length_series(output.origin_lens),
+                    "insert_frame_index": output.insert_frame_index,
+                    "series_fps": output.fps,
+                    "segmented_until": output.segmented_until,
+                }
 
                 if video.analysis_result:
                     ar = video.analysis_result
                     ar.marked_path = analysed_video_name
-                    ar.start_time = start_time
-                    ar.end_time = end_time
-                    ar.init_speed = float(output.init_speed)
-                    ar.avg_speed = float(output.avg_speed)
-                    ar.curve_data = curve_data
+                    for key, value in {**metrics, **series}.items():
+                        setattr(ar, key, value)
                     ar.processed_at = datetime.utcnow()
                 else:
                     video.analysis_result = AnalysisResult(
                         video_id=video.id,
                         marked_path=analysed_video_name,
-                        start_time=start_time,
-                        end_time=end_time,
-                        init_speed=float(output.init_speed),
-                        avg_speed=float(output.avg_speed),
-                        curve_data=curve_data,
+                        **metrics,
+                        **series,
                         processed_at=datetime.utcnow(),
                     )
 
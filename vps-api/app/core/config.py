@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -24,6 +27,15 @@ class Settings(BaseSettings):
 
     TMP_DIR: str = 'video-puncture'
 
+    # 检测模型推理后端：torch（Ultralytics/PyTorch）、onnx（onnxruntime CPU）、openvino
+    DETECT_BACKEND: Literal["torch", "onnx", "openvino"] = "torch"
+    # 分类、分割模型使用 INT8 动态量化（仅 CPU 节点建议开启）
+    ANALYSIS_QUANTIZE: bool = False
+    # 检测在长边不超过该值的代理帧上进行（如 640），为空时在原始分辨率上检测
+    DETECT_MAX_SIDE: int | None = None
+    # 检测关键帧间隔：1 为逐帧检测，大于 1 时只检测关键帧、中间帧插值
+    DETECT_INTERVAL: int = Field(default=1, ge=1)
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
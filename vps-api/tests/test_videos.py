@@ -74,3 +74,160 @@ async def test_delete_video():
         mock_storage.delete_file.assert_any_call("raw")
         mock_storage.delete_file.assert_any_call("thumb")
         service.repository.delete_video_record.assert_called_once()
+
+def test_length_series_roundtrip():
+    from app.api.videos.service import decode_length_series, encode_length_series
+
+    lens = [0.0] * 50 + [300.0 - i * 1.5 for i in range(120)]
+    data = encode_length_series(lens)
+    assert len(data) < len(lens) * 4
+    assert decode_length_series(data) == lens
+
+@pytest.mark.asyncio
+async def test_recompute_speed_from_stored_series():
+    from app.api.videos.schemas import SpeedRecomputeRequest
+    from app.api.videos.service import encode_length_series
+    from video_work.core import estimate_speed
+
+    lens = [0.0] * 20 + [300.0 - i * 2.0 for i in range(140)]
+    analysis = SimpleNamespace(
+        length_series=encode_length_series(lens),
+        insert_frame_index=20,
+        series_fps=30.0,
+        segmented_until=None,
+        curve_data=None,
+    )
+    mock_session = AsyncMock()
+    service = VideoService(mock_session)
+    service.repository = MagicMock()
+    service.repository.get_video_with_analysis_result = AsyncMock(
+        return_value=SimpleNamespace(fps=30, analysis_result=analysis)
+    )
+
+    result = await service.recompute_speed(uuid.uuid4(), SpeedRecomputeRequest(swin=20, step=10))
+    expected = estimate_speed(lens, 20, 30.0, swin=20, step=10)
+    assert result.avg_speed == pytest.approx(expected.avg_speed)
+    assert result.start_time == round(20 / 30, 3)
+    assert len(result.curve_data) == len(expected.instantaneous_speeds)
+    assert analysis.curve_data is None
+    mock_session.commit.assert_not_awaited()
+
+    await service.recompute_speed(uuid.uuid4(), SpeedRecomputeRequest(save=True))
+    assert analysis.curve_data
+    mock_session.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_recompute_speed_requires_series():
+    from app.api.videos.schemas import SpeedRecomputeRequest
+    from app.core.exceptions import UnprocessableEntityException
+
+    service = VideoService(AsyncMock())
+    service.repository = MagicMock()
+    service.repository.get_video_with_analysis_result = AsyncMock(
+        return_value=SimpleNamespace(
+            fps=30,
+            analysis_result=SimpleNamespace(
+                length_series=None, insert_frame_index=None, series_fps=None, segmented_until=None
+            ),
+        )
+    )
+    with pytest.raises(UnprocessableEntityException):
+        await service.recompute_speed(uuid.uuid4(), SpeedRecomputeRequest())
+
+@pytest.mark.asyncio
+async def test_recompute_speed_rejects_unsegmented_tail():
+    from app.api.videos.schemas import SpeedRecomputeRequest
+    from app.api.videos.service import encode_length_series
+    from app.core.exceptions import UnprocessableEntityException
+    from video_work.core import estimate_speed
+
+    # 按需分割在第 130 帧停止，之后的长度为 0
+    lens = [0.0] * 20 + [300.0 - i * 2.0 for i in range(110)] + [0.0] * 30
+    analysis = SimpleNamespace(
+        length_series=encode_length_series(lens),
+        insert_frame_index=20,
+        series_fps=30.0,
+        segmented_until=130,
+        curve_data=None,
+    )
+    service = VideoService(AsyncMock())
+    service.repository = MagicMock()
+    service.repository.get_video_with_analysis_result = AsyncMock(
+        return_value=SimpleNamespace(fps=30, analysis_result=analysis)
+    )
+
+    full = lens[:130] + [300.0 - i * 2.0 for i in range(110, 140)]
+    # 结束点落在已分割范围内时，无论 swin 和 end_ratio 如何，结果都与全量分割一致
+    for params in (
+        SpeedRecomputeRequest(end_ratio=0.5),
+        SpeedRecomputeRequest(end_ratio=0.4),
+        SpeedRecomputeRequest(swin=40, step=20),
+    ):
+        result = await service.recompute_speed(uuid.uuid4(), params)
+        expected = estimate_speed(full, 20, 30.0, swin=params.swin, step=params.step, end_ratio=params.end_ratio)
+        assert result.end_time == round(expected.predict_end / 30, 3)
+        assert result.avg_speed == pytest.approx(expected.avg_speed)
+    with pytest.raises(UnprocessableEntityException):
+        await service.recompute_speed(uuid.uuid4(), SpeedRecomputeRequest(end_ratio=0.2))
+
+@pytest.mark.asyncio
+async def test_sweep_speed_returns_compact_table():
+    from app.api.videos.schemas import SpeedSweepRequest
+    from app.api.videos.service import SWEEP_METRIC_COLUMNS, SWEEP_PARAM_COLUMNS, encode_length_series
+    from video_work.core import estimate_speed
+
+    lens = [0.0] * 20 + [300.0 - i * 2.0 for i in range(140)]
+    analysis = SimpleNamespace(
+        length_series=encode_length_series(lens), insert_frame_index=20, series_fps=30.0, segmented_until=None
+    )
+    service = VideoService(AsyncMock())
+    service.repository = MagicMock()
+    service.repository.get_video_with_analysis_result = AsyncMock(
+        return_value=SimpleNamespace(fps=30, analysis_result=analysis)
+    )
+
+    grid = SpeedSweepRequest(swin=[None, 20], step=[10], end_ratio=[0.4, 0.5])
+    result = await service.sweep_speed(uuid.uuid4(), grid)
+    assert result.columns == SWEEP_PARAM_COLUMNS + SWEEP_METRIC_COLUMNS + ["valid"]
+    assert len(result.rows) == len(result.curves) == 4
+    assert [row[:3] for row in result.rows] == [[30, 10, 0.4], [30, 10, 0.5], [20, 10, 0.4], [20, 10, 0.5]]
+
+    expected = estimate_speed(lens, 20, 30.0, swin=20, step=10, end_ratio=0.5)
+    avg_col = result.columns.index("avg_speed")
+    assert result.rows[3][avg_col] == pytest.approx(expected.avg_speed)
+    assert len(result.curves[3]) == len(expected.instantaneous_speeds)
+
+@pytest.mark.asyncio
+async def test_sweep_speed_flags_rows_outside_segmented_range():
+    from app.api.videos.schemas import SpeedSweepRequest
+    from app.api.videos.service import SWEEP_VALID_COLUMN, encode_length_series
+
+    # 按需分割在第 130 帧停止，之后的长度为 0
+    lens = [0.0] * 20 + [300.0 - i * 2.0 for i in range(110)] + [0.0] * 30
+    analysis = SimpleNamespace(
+        length_series=encode_length_series(lens), insert_frame_index=20, series_fps=30.0, segmented_until=130
+    )
+    service = VideoService(AsyncMock())
+    service.repository = MagicMock()
+    service.repository.get_video_with_analysis_result = AsyncMock(
+        return_value=SimpleNamespace(fps=30, analysis_result=analysis)
+    )
+
+    grid = SpeedSweepRequest(swin=[30, 40], end_ratio=[0.2, 0.4, 0.5])
+    result = await service.sweep_speed(uuid.uuid4(), grid)
+    assert result.columns[-1] == SWEEP_VALID_COLUMN
+    assert len(result.rows) == 6
+    ratio_col = result.columns.index("end_ratio")
+    assert [(row[ratio_col], row[-1]) for row in result.rows] == [
+        (0.2, 0.0), (0.4, 1.0), (0.5, 1.0), (0.2, 0.0), (0.4, 1.0), (0.5, 1.0)
+    ]
+
+@pytest.mark.asyncio
+async def test_sweep_speed_limits_grid_size():
+    from app.api.videos.schemas import SpeedSweepRequest
+    from app.core.exceptions import UnprocessableEntityException
+
+    service = VideoService(AsyncMock())
+    grid = SpeedSweepRequest(swin=list(range(1, 33)), step=list(range(1, 33)), end_ratio=[0.4, 0.5])
+    with pytest.raises(UnprocessableEntityException):
+        await service.sweep_speed(uuid.uuid4(), grid)
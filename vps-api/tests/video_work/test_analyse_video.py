@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import video_work.core as core
+from video_work.classify.classify import Classify
+from video_work.detect.detect import Detect
+from video_work.boxes import FrameBoxes
+
+VIDEO_PATH = str(Path(__file__).resolve().parents[1] / "data" / "video1.mp4")
+INSERT_CROP = 100
+
+
+class _FakeDetect:
+    """每帧一个固定的检测框"""
+
+    optimize_detect_boxes = staticmethod(Detect.optimize_detect_boxes)
+
+    def __init__(self, backend: str = "torch") -> None:
+        pass
+
+    def predict_boxes(self, frames, frame_width, frame_height, **kwargs) -> FrameBoxes:
+        box = np.array([[0.45, 0.45, 0.5, 0.5, 0.9]], dtype=np.float32)
+        return FrameBoxes.from_frame_arrays([box for _ in frames])
+
+
+class _FakeClassify:
+    """第 INSERT_CROP 个裁剪之后都判为已刺入"""
+
+    find_first_inserted_frame = staticmethod(Classify.find_first_inserted_frame)
+
+    def __init__(self, quantize: bool = False) -> None:
+        self.seen = 0
+
+    def predict_images(self, tensors):
+        preds = [int(self.seen + i >= INSERT_CROP) for i in range(len(tensors))]
+        self.seen += len(tensors)
+        return preds, [0.99] * len(tensors)
+
+
+class _FakeSegment:
+    """每个裁剪一个固定的正方形多边形"""
+
+    def __init__(self, quantize: bool = False) -> None:
+        pass
+
+    def predict_images(self, tensors, output="polygon", **kwargs):
+        det = {"conf": 0.9, "length": 20.0}
+        if output == "polygon":
+            det["segments"] = np.array([2, 2, 22, 2, 22, 22, 2, 22], dtype=np.int32)
+        return [[dict(det)] for _ in tensors]
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    masks: list[int] = []
+    written: list[int] = []
+
+    def composite(frame, boxes, polygons, **kwargs):
+        masks.append(len(list(polygons)))
+        return frame
+
+    def save(frames, output_path, fps, size):
+        written.append(sum(1 for _ in frames))
+
+    monkeypatch.setattr(core, "Detect", _FakeDetect)
+    monkeypatch.setattr(core, "Classify", _FakeClassify)
+    monkeypatch.setattr(core, "Segment", _FakeSegment)
+    monkeypatch.setattr(core, "composite_frame", composite)
+    monkeypatch.setattr(core, "save_frames2video", save)
+    return masks, written
+
+
+def test_rendered_frames_keep_masks_outside_speed_range(rendered, tmp_path):
+    masks, written = rendered
+    out = core.analyse_video(VIDEO_PATH, str(tmp_path / "out.mp4"))
+    assert out.insert_frame_index > 0
+    assert written == [len(masks)]
+    # 插入帧之前的帧同样有掩码
+    assert masks and all(count == 1 for count in masks)
+
+
+def test_speed_only_segments_from_insert_frame(rendered, tmp_path):
+    masks, written = rendered
+    out = core.analyse_video(VIDEO_PATH, str(tmp_path / "out.mp4"), save_video=False)
+    assert written == [] and masks == []
+    assert all(length == 0.0 for length in out.origin_lens[: out.insert_frame_index])
+    assert all(length == 20.0 for length in out.origin_lens[out.insert_frame_index :])
@@ -0,0 +1,52 @@
+import numpy as np
+
+from video_work.boxes import BOX_SIDE, FrameBoxes
+from video_work.detect.detect import Detect
+from video_work.tools import make_group_square_annotations, make_group_square_boxes
+
+
+def _ann(x1, y1, x2, y2, conf=0.9):
+    return {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "conf": conf}
+
+
+def test_frame_boxes_roundtrip():
+    annotations = [[_ann(0.1, 0.1, 0.2, 0.2)], [], [_ann(0.3, 0.3, 0.4, 0.4), _ann(0.5, 0.5, 0.6, 0.6, 0.4)]]
+    boxes = FrameBoxes.from_annotations(annotations)
+    assert len(boxes) == 3
+    assert boxes.rows(1).shape == (0, 6)
+    assert boxes.rows(2).shape == (2, 6)
+    out = boxes.to_annotations()
+    assert [len(frame) for frame in out] == [1, 0, 2]
+    assert np.isclose(out[2][1]["conf"], 0.4)
+
+
+def test_best_per_frame_picks_highest_conf():
+    boxes = FrameBoxes.from_annotations(
+        [[_ann(0.1, 0.1, 0.2, 0.2, 0.6), _ann(0.3, 0.3, 0.4, 0.4, 0.8)], [_ann(0.1, 0.1, 0.2, 0.2, 0.3)]]
+    )
+    best, valid = boxes.best_per_frame(0.5)
+    assert valid.tolist() == [True, False]
+    assert np.isclose(best[0, 0], 0.3)
+
+
+def test_optimize_fills_long_gaps_from_nearest_detection():
+    annotations = [[] for _ in range(200)]
+    annotations[150] = [_ann(0.4, 0.4, 0.5, 0.5)]
+    out = Detect.optimize_detect_norm_annotation(annotations, wnd_size=20, step=10, box_scale=1)
+    assert all(len(frame) == 1 for frame in out)
+    assert np.isclose(out[0][0]["x1"], 0.4, atol=1e-5)
+    assert np.isclose(out[199][0]["x2"], 0.5, atol=1e-5)
+
+
+def test_optimize_without_detections_uses_full_frame():
+    out = Detect.optimize_detect_norm_annotation([[] for _ in range(5)], wnd_size=4, step=2, box_scale=1)
+    assert out[0][0]["x1"] == 0.0 and out[0][0]["x2"] == 1.0
+
+
+def test_group_square_sides_are_quantized_per_group():
+    annotations = [[_ann(0.1, 0.1, 0.2, 0.2)], [_ann(0.1, 0.1, 0.6, 0.3)], [_ann(0.4, 0.4, 0.5, 0.5)]]
+    boxes = make_group_square_boxes(FrameBoxes.from_annotations(annotations), 2, (1000, 1000))
+    assert boxes.boxes[:, BOX_SIDE].tolist() == [512.0, 512.0, 224.0]
+    legacy = make_group_square_annotations(annotations, 2, (1000, 1000))
+    assert [ann["square_side_px"] for frame in legacy for ann in frame] == [512.0, 512.0, 224.0]
+    assert legacy[0][0]["x1"] == 0.0
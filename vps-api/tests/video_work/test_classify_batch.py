@@ -0,0 +1,81 @@
+import torch
+from torchvision import transforms
+
+from video_work.classify.classify import Classify, ClassifyCascade
+
+
+class _TinyNet(torch.nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.conv = torch.nn.Conv2d(3, 2, 3)
+
+    def forward(self, x):
+        return self.conv(x).mean(dim=(2, 3))
+
+
+def _make_classifier() -> Classify:
+    torch.manual_seed(0)
+    classifier = object.__new__(Classify)
+    classifier.device = torch.device("cpu")
+    classifier.model = _TinyNet().to(memory_format=torch.channels_last).eval()
+    classifier.last_batch_timings = []
+    classifier.transform = transforms.Compose(
+        [transforms.Resize((32, 32)), transforms.Normalize(mean=[0.5] * 3, std=[0.25] * 3)]
+    )
+    return classifier
+
+
+def test_batched_tensor_matches_tensor_list():
+    classifier = _make_classifier()
+    crops = torch.rand(10, 3, 48, 48)
+    preds, probs = classifier.predict_images(crops, batch=4)
+    list_preds, list_probs = classifier.predict_images(list(crops), batch=3)
+    assert preds == list_preds
+    assert torch.allclose(torch.tensor(probs), torch.tensor(list_probs), atol=1e-6)
+    assert [size for size, _ in classifier.last_batch_timings] == [3, 3, 3, 1]
+
+
+def test_auto_batch_size_on_cpu():
+    classifier = _make_classifier()
+    assert 4 <= classifier.auto_batch_size() <= 64
+    preds, _ = classifier.predict_images(torch.rand(5, 3, 40, 40))
+    assert len(preds) == 5
+
+
+class _LookupClassifier:
+    """裁剪的第一个像素存放序号，粗筛/精分结果分别查表，记录精分过的序号"""
+
+    def __init__(self, coarse: list[tuple[int, float]], fine: list[tuple[int, float]]) -> None:
+        self.coarse = coarse
+        self.fine = fine
+        self.refined: list[int] = []
+
+    def predict_images(self, frame_tensors, batch=None, input_size=None):
+        indices = [int(t[0, 0, 0]) for t in frame_tensors]
+        if input_size is None:
+            self.refined.extend(indices)
+            table = self.fine
+        else:
+            table = self.coarse
+        return [table[i][0] for i in indices], [table[i][1] for i in indices]
+
+
+def test_cascade_refines_only_near_transitions_and_uncertain_crops():
+    n = 40
+    coarse = [(0, 0.01)] * 20 + [(1, 0.99)] * 20
+    coarse[5] = (0, 0.3)  # 低置信度
+    fine = [(0, 0.02)] * 18 + [(1, 0.97)] * 22
+    classifier = _LookupClassifier(coarse, fine)
+    cascade = ClassifyCascade(classifier, margin=3)
+    crops = torch.arange(n, dtype=torch.float32).view(n, 1, 1, 1).expand(n, 3, 2, 2)
+
+    preds, probs = [], []
+    for chunk in (crops[:22], crops[22:]):  # 跳变靠近第一块末尾，精分范围顺延到第二块
+        chunk_preds, chunk_probs = cascade.predict(chunk)
+        preds.extend(chunk_preds)
+        probs.extend(chunk_probs)
+
+    assert sorted(classifier.refined) == [5, 17, 18, 19, 20, 21, 22]
+    assert preds[18:20] == [1, 1]
+    assert preds[:5] == [0] * 5 and probs[30] == 0.99
+    assert cascade.coarse_count == n and cascade.fine_count == 7
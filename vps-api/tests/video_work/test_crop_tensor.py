@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import torch
+
+from video_work.boxes import box_row
+from video_work.paint import square_crop_with_origin
+from video_work.tools import frames2tensors, square_crops2tensor
+
+
+def _frames(n: int) -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (300, 400, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def test_matches_per_crop_conversion_inside_and_at_border():
+    frames = _frames(3)
+    boxes = [
+        box_row([0.4, 0.4, 0.5, 0.5, 0.9, 224.0]),  # 完全在画面内
+        box_row([0.0, 0.0, 0.1, 0.1, 0.9, 224.0]),  # 左上角越界补 0
+        box_row([0.9, 0.9, 1.0, 1.0, 0.9, 224.0]),  # 右下角越界补 0
+    ]
+    batch, origins = square_crops2tensor(frames, boxes, torch.device("cpu"))
+    assert batch.shape == (3, 3, 224, 224)
+    for (index, origin_x, origin_y), tensor in zip(origins, batch):
+        crop, expected_x, expected_y = square_crop_with_origin(frames[index], boxes[index])
+        assert (origin_x, origin_y) == (expected_x, expected_y)
+        (expected,) = frames2tensors([crop], torch.device("cpu"))
+        assert torch.equal(tensor, expected)
+
+
+def test_skips_invalid_boxes_and_rejects_mixed_sides():
+    frames = _frames(2)
+    invalid = box_row([0.5, 0.5, 0.5, 0.5, 0.9, 224.0])
+    batch, origins = square_crops2tensor(frames, [invalid, box_row([0.4, 0.4, 0.5, 0.5, 0.9, 224.0])], torch.device("cpu"))
+    assert batch.shape[0] == 1 and origins[0][0] == 1
+    assert square_crops2tensor(frames[:1], [invalid], torch.device("cpu")) is None
+    with pytest.raises(ValueError):
+        square_crops2tensor(
+            frames,
+            [box_row([0.4, 0.4, 0.5, 0.5, 0.9, 224.0]), box_row([0.4, 0.4, 0.5, 0.5, 0.9, 320.0])],
+            torch.device("cpu"),
+        )
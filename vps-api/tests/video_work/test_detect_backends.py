@@ -0,0 +1,109 @@
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from video_work.detect.backends import OnnxDetectBackend, _letterbox, create_detect_backend, export_onnx
+from video_work.detect.detect import Detect
+
+
+class _FakeInput:
+    name = "images"
+
+
+class _FakeSession:
+    def __init__(self, output: np.ndarray) -> None:
+        self.output = output
+        self.inputs: list[np.ndarray] = []
+
+    def get_inputs(self):
+        return [_FakeInput()]
+
+    def run(self, _names, feeds):
+        self.inputs.append(feeds["images"])
+        return [self.output[: feeds["images"].shape[0]]]
+
+
+def _make_backend(output: np.ndarray, imgsz: int = 64) -> OnnxDetectBackend:
+    backend = object.__new__(OnnxDetectBackend)
+    backend.session = _FakeSession(output)
+    backend.input_name = "images"
+    backend.imgsz = imgsz
+    backend.conf_threshold = 0.25
+    backend.iou_threshold = 0.7
+    backend.max_det = 300
+    return backend
+
+
+def test_letterbox_pads_to_square():
+    padded, ratio, pad_x, pad_y = _letterbox(np.zeros((32, 64, 3), dtype=np.uint8), 64)
+    assert padded.shape == (64, 64, 3)
+    assert ratio == 1.0 and pad_x == 0.0 and pad_y == 16.0
+
+
+def test_raw_output_is_decoded_with_nms_and_unletterboxed():
+    # (B, 4 + nc, A)：两个高度重叠的同类框 + 一个低分框
+    raw = np.zeros((1, 5, 3), dtype=np.float32)
+    raw[0, :, 0] = [32, 32, 20, 20, 0.9]
+    raw[0, :, 1] = [33, 32, 20, 20, 0.8]
+    raw[0, :, 2] = [10, 10, 4, 4, 0.1]
+    backend = _make_backend(raw)
+    (dets,) = backend.predict([np.zeros((32, 64, 3), dtype=np.uint8)])
+    assert dets.shape == (1, 6)
+    # letterbox 上边距 16 被还原
+    np.testing.assert_allclose(dets[0, :5], [22, 6, 42, 26, 0.9], atol=1e-5)
+    assert backend.session.inputs[0].shape == (1, 3, 64, 64)
+
+
+def test_end_to_end_output_is_thresholded():
+    out = np.zeros((1, 300, 6), dtype=np.float32)
+    out[0, 0] = [0, 16, 10, 26, 0.8, 0]
+    out[0, 1] = [0, 16, 10, 26, 0.1, 0]
+    (dets,) = _make_backend(out).predict([np.zeros((32, 64, 3), dtype=np.uint8)])
+    np.testing.assert_allclose(dets, [[0, 0, 10, 10, 0.8, 0]], atol=1e-5)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_detect_backend("tensorrt", "yolo.pt")
+
+
+def test_detect_instances_are_cached_per_backend(monkeypatch):
+    monkeypatch.setattr(Detect, "_instances", {})
+    monkeypatch.setattr(
+        "video_work.detect.detect.create_detect_backend", lambda name, path: types.SimpleNamespace(name=name)
+    )
+    torch_detector = Detect(backend="torch")
+    onnx_detector = Detect(backend="onnx")
+    assert onnx_detector is not torch_detector
+    assert (torch_detector.backend.name, onnx_detector.backend.name) == ("torch", "onnx")
+    assert Detect(backend="torch") is torch_detector
+
+
+def test_export_onnx_replaces_cache_atomically(tmp_path, monkeypatch):
+    exported_from: list[Path] = []
+
+    class _FakeYOLO:
+        def __init__(self, path: str) -> None:
+            self.path = Path(path)
+
+        def export(self, **kwargs):
+            exported_from.append(self.path)
+            out = self.path.with_suffix(".onnx")
+            out.write_bytes(b"onnx:" + self.path.read_bytes())
+            return str(out)
+
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=_FakeYOLO))
+    weights = tmp_path / "yolo.pt"
+    weights.write_bytes(b"weights")
+
+    onnx_path = export_onnx(str(weights))
+    assert Path(onnx_path).read_bytes() == b"onnx:weights"
+    # 在临时目录里导出，不直接写最终路径；临时目录随后被清理
+    assert exported_from[0].parent != tmp_path
+    assert {p.name for p in tmp_path.iterdir()} == {"yolo.pt", "yolo.onnx"}
+    # 缓存有效时不再导出
+    assert export_onnx(str(weights)) == onnx_path
+    assert len(exported_from) == 1
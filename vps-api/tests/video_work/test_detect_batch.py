@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from video_work.detect.detect import Detect
+
+
+class _FakeBackend:
+    """帧内像素值即帧序号；帧序号 % 3 决定框数（0、1、2 个），记录每批的大小"""
+
+    def __init__(self) -> None:
+        self.batch_sizes: list[int] = []
+
+    def predict(self, batch):
+        self.batch_sizes.append(len(batch))
+        results = []
+        for frame in batch:
+            idx = int(frame[0, 0, 0])
+            rows = [
+                [10.0 + idx + k * 20.0, 5.0 + k, 30.0 + idx + k * 20.0, 40.0 + k, 0.5 + 0.01 * idx, 0.0]
+                for k in range(idx % 3)
+            ]
+            results.append(np.array(rows, dtype=np.float32).reshape(-1, 6))
+        return results
+
+
+def _make_detector() -> Detect:
+    detector = object.__new__(Detect)
+    detector.backend = _FakeBackend()
+    return detector
+
+
+def _frames(n: int) -> list[np.ndarray]:
+    return [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(n)]
+
+
+@pytest.mark.parametrize("n,batch_size", [(10, 4), (9, 3), (5, 16), (1, 1)])
+def test_batched_matches_per_frame(n, batch_size):
+    detector = _make_detector()
+    batched = detector.predict_images(_frames(n), 200, 100, batch_size=batch_size)
+    expected_sizes = [batch_size] * (n // batch_size) + ([n % batch_size] if n % batch_size else [])
+    assert detector.backend.batch_sizes == expected_sizes
+
+    single = _make_detector().predict_images(_frames(n), 200, 100, batch_size=1)
+    assert batched == single
+
+
+def test_one_annotation_list_per_frame():
+    detector = _make_detector()
+    out = detector.predict_images(_frames(10), 200, 100, batch_size=4)
+    # 每帧恰好一个列表（不会重复追加），列表长度等于该帧的框数
+    assert len(out) == 10
+    assert [len(frame_boxes) for frame_boxes in out] == [i % 3 for i in range(10)]
+    assert out[4][0]["x1"] == pytest.approx(14.0 / 200)
+    assert out[4][0]["conf"] == pytest.approx(0.54)
+
+
+def test_all_empty_batches_keep_frame_count():
+    detector = _make_detector()
+    frames = [np.full((4, 4, 3), 3 * i, dtype=np.uint8) for i in range(7)]  # 框数全为 0
+    out = detector.predict_images(frames, 200, 100, batch_size=3)
+    assert out == [[] for _ in range(7)]
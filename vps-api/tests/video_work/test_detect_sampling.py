@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from video_work.detect.detect import Detect
+
+
+class _FakeBackend:
+    """帧内像素值即帧序号，框按 box_fn(帧序号) 生成，记录每次被检测的帧"""
+
+    def __init__(self, box_fn) -> None:
+        self.box_fn = box_fn
+        self.seen: list[int] = []
+
+    def predict(self, batch):
+        results = []
+        for frame in batch:
+            idx = int(frame[0, 0, 0])
+            self.seen.append(idx)
+            box = self.box_fn(idx)
+            data = np.zeros((0, 6), dtype=np.float32) if box is None else np.array([box + [0.9, 0.0]], dtype=np.float32)
+            results.append(data)
+        return results
+
+
+def _make_detector(box_fn) -> Detect:
+    detector = object.__new__(Detect)
+    detector.backend = _FakeBackend(box_fn)
+    return detector
+
+
+def _frames(n: int) -> list[np.ndarray]:
+    return [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(n)]
+
+
+def _linear_box(idx: int) -> list[float]:
+    return [10.0 + idx * 0.1, 10.0, 30.0 + idx * 0.1, 30.0]
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 50, 97])
+def test_sampled_keeps_one_entry_per_frame(n):
+    detector = _make_detector(_linear_box)
+    out = detector.predict_images(_frames(n), 100, 100, batch_size=4, interval=5)
+    assert len(out) == n
+    assert all(len(frame_boxes) == 1 for frame_boxes in out)
+
+
+def test_sampled_interpolates_stable_boxes():
+    detector = _make_detector(_linear_box)
+    dense = _make_detector(_linear_box).predict_images(_frames(60), 100, 100, batch_size=8)
+    out = detector.predict_images(_frames(60), 100, 100, batch_size=8, interval=6)
+    assert len(detector.backend.seen) < 60 // 3
+    for a, b in zip(out, dense):
+        for key in ("x1", "y1", "x2", "y2", "conf"):
+            assert a[0][key] == pytest.approx(b[0][key], abs=1e-5)
+
+
+def test_sampled_redetects_gap_on_jump():
+    def jump_box(idx: int) -> list[float] | None:
+        if idx < 23:
+            return None
+        return [50.0, 50.0, 70.0, 70.0]
+
+    detector = _make_detector(jump_box)
+    dense = _make_detector(jump_box).predict_images(_frames(40), 100, 100)
+    out = detector.predict_images(_frames(40), 100, 100, batch_size=2, interval=5)
+    assert [len(f) for f in out] == [len(f) for f in dense]
+    # 目标出现的区间 (20, 25) 被逐帧补检测
+    assert set(range(20, 26)).issubset(detector.backend.seen)
+
+
+def test_invalid_interval():
+    detector = _make_detector(_linear_box)
+    with pytest.raises(ValueError):
+        detector.predict_images(_frames(3), 100, 100, interval=0)
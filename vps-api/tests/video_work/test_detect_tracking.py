@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from video_work.detect.detect import Detect
+
+
+class _SquareBackend:
+    """在帧中找亮色方块作为检测框，记录被检测的帧序号"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def predict(self, batch):
+        results = []
+        for frame in batch:
+            self.calls += 1
+            ys, xs = np.nonzero(frame[:, :, 0] > 128)
+            if ys.size == 0:
+                results.append(np.zeros((0, 6), dtype=np.float32))
+                continue
+            results.append(
+                np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, 0]], dtype=np.float32)
+            )
+        return results
+
+
+def _moving_square(n: int, size: int = 120, side: int = 20) -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    texture = rng.integers(150, 255, (side, side, 3), dtype=np.uint8)
+    frames = []
+    for i in range(n):
+        frame = np.zeros((size, size, 3), dtype=np.uint8)
+        x = 20 + i
+        frame[40 : 40 + side, x : x + side] = texture
+        frames.append(frame)
+    return frames
+
+
+def _make_detector() -> Detect:
+    detector = object.__new__(Detect)
+    detector.backend = _SquareBackend()
+    return detector
+
+
+def test_tracking_follows_target_with_fewer_detections():
+    frames = _moving_square(40)
+    dense = _make_detector().predict_images(frames, 120, 120)
+    detector = _make_detector()
+    out = detector.predict_images(frames, 120, 120, track_max_interval=10)
+    assert detector.backend.calls == 4
+    for a, b in zip(out, dense):
+        for key in ("x1", "y1", "x2", "y2"):
+            assert a[0][key] == pytest.approx(b[0][key], abs=1e-5)
+
+
+def test_tracking_redetects_when_target_disappears():
+    frames = _moving_square(10)
+    for frame in frames[5:]:
+        frame[:] = 0
+    detector = _make_detector()
+    out = detector.predict_images(frames, 120, 120, track_max_interval=30)
+    assert [len(f) for f in out] == [1] * 5 + [0] * 5
+    assert detector.backend.calls == 6
+
+
+def test_tracking_rejects_interval():
+    with pytest.raises(ValueError):
+        _make_detector().predict_images(_moving_square(3), 120, 120, interval=2, track_max_interval=5)
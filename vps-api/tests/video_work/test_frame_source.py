@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from video_work.tools import VideoFrameSource, extract_video_frames
+
+VIDEO_PATH = str(Path(__file__).resolve().parents[1] / "data" / "video1.mp4")
+
+
+def test_meta_available_before_decoding():
+    source = VideoFrameSource(VIDEO_PATH)
+    assert source.meta["width"] > 0
+    assert source.meta["height"] > 0
+    assert source.meta["fps"] > 0
+    assert len(source) > 0
+
+
+def test_iterate_multiple_times_and_fix_frame_count():
+    source = VideoFrameSource(VIDEO_PATH)
+    first = sum(1 for _ in source)
+    second = sum(1 for _ in source)
+    assert first == second
+    assert len(source) == first
+
+
+def test_iter_windows_bounded_by_window():
+    source = VideoFrameSource(VIDEO_PATH, window=7)
+    sizes = [len(w) for w in source.iter_windows()]
+    assert all(size <= 7 for size in sizes)
+    assert sum(sizes) == len(source)
+
+
+def test_extract_video_frames_matches_source():
+    source = VideoFrameSource(VIDEO_PATH)
+    video = extract_video_frames(VIDEO_PATH)
+    assert video["meta"]["frame_count"] == len(video["frames"])
+    first = next(iter(source))
+    assert np.array_equal(first, video["frames"][0])
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        VideoFrameSource(VIDEO_PATH, window=0)
+
+
+def test_proxy_source_downscales_frames():
+    source = VideoFrameSource(VIDEO_PATH)
+    proxy = source.proxy(320)
+    assert max(proxy.meta["width"], proxy.meta["height"]) == 320
+    frame = next(iter(proxy))
+    assert frame.shape[1] == proxy.meta["width"]
+    assert frame.shape[0] == proxy.meta["height"]
+    # 原始帧源不受影响
+    assert source.meta["width"] > proxy.meta["width"]
+
+
+def test_proxy_larger_than_video_keeps_resolution():
+    source = VideoFrameSource(VIDEO_PATH, max_side=10000)
+    frame = next(iter(source))
+    assert frame.shape[:2] == (source.meta["height"], source.meta["width"])
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from video_work.classify.classify import Classify, InsertionFrameSearch
+
+
+def _sequence(seed: int, n: int = 200) -> tuple[list[int], list[float]]:
+    rng = random.Random(seed)
+    insert = rng.randrange(n)
+    classes, probs = [], []
+    for i in range(n):
+        # 插入点之后大部分为 1，夹杂噪声
+        cls = int(i >= insert) if rng.random() > 0.05 else 1 - int(i >= insert)
+        classes.append(cls)
+        probs.append(rng.uniform(0.55, 1.0))
+    return classes, probs
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("chunk", [1, 7, 32])
+def test_streaming_search_matches_full_search(seed, chunk):
+    classes, probs = _sequence(seed)
+    expected = Classify.find_first_inserted_frame(list(classes), list(probs))
+
+    search = InsertionFrameSearch(post_roll=10)
+    for i in range(0, len(classes), chunk):
+        if search.update(classes[i : i + chunk], probs[i : i + chunk]):
+            break
+    prefix_classes, prefix_probs = list(search.class_list), list(search.prob_list)
+    assert Classify.find_first_inserted_frame(prefix_classes, prefix_probs) == expected
+    if search.done:
+        assert search.insert_frame_index == expected
+
+
+def test_stops_early_after_post_roll():
+    classes = [0] * 10 + [1] * 200
+    probs = [0.95] * 210
+    search = InsertionFrameSearch(post_roll=5)
+    consumed = 0
+    for i in range(len(classes)):
+        consumed += 1
+        if search.update(classes[i : i + 1], probs[i : i + 1]):
+            break
+    assert search.insert_frame_index == 10
+    # 窗口 [8, 28) 首次满足条件，再收 5 个即停止
+    assert consumed == 28 + 5
+
+
+def _reference_fix_class_prob(class_list, prob_list, class_index):
+    """修改前的逐帧实现，用于对拍"""
+    n = len(class_list)
+    for i in range(class_index - 1, -1, -1):
+        if class_list[i] != 0:
+            found_prob = 0.6
+            for j in range(i - 1, -1, -1):
+                if class_list[j] == 0:
+                    found_prob = prob_list[j]
+                    break
+            class_list[i] = 0
+            prob_list[i] = found_prob
+    for i in range(class_index + 1, n):
+        if class_list[i] != 1:
+            found_prob = 0.6
+            for j in range(i + 1, n):
+                if class_list[j] == 1:
+                    found_prob = prob_list[j]
+                    break
+            class_list[i] = 1
+            prob_list[i] = found_prob
+    return class_list, prob_list
+
+
+def _reference_find_first_inserted_frame(class_list, prob_list, judge_wnd=20):
+    required_count = 0.9 * judge_wnd
+    thresholds = [0.9, 0.8, 0.7, 0.6]
+    insert_frame_index = -1
+    for i in range(len(prob_list) - judge_wnd + 1):
+        wnd_probs = prob_list[i:i + judge_wnd]
+        wnd_classes = class_list[i:i + judge_wnd]
+        count = sum(1 for j in range(judge_wnd) if wnd_classes[j] == 1)
+        if count >= required_count:
+            for threshold in thresholds:
+                for k in range(judge_wnd - 4):
+                    if all(wnd_classes[k + l] == 1 and wnd_probs[k + l] > threshold for l in range(5)):
+                        insert_frame_index = i + k
+                        break
+                if insert_frame_index != -1:
+                    break
+            if insert_frame_index != -1:
+                break
+    if insert_frame_index == -1:
+        insert_frame_index = 0
+    _reference_fix_class_prob(class_list, prob_list, insert_frame_index)
+    return insert_frame_index
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("judge_wnd", [5, 10, 20])
+def test_vectorized_search_matches_reference(seed, judge_wnd):
+    rng = random.Random(seed)
+    n = rng.randrange(0, 150)
+    classes = [int(rng.random() < 0.8) for _ in range(n)]
+    probs = [rng.choice([0.6, 0.7, 0.8, 0.9, rng.uniform(0.5, 1.0)]) for _ in range(n)]
+
+    expected_classes, expected_probs = list(classes), list(probs)
+    expected = _reference_find_first_inserted_frame(expected_classes, expected_probs, judge_wnd)
+    got = Classify.find_first_inserted_frame(classes, probs, judge_wnd)
+    assert got == expected
+    assert classes == expected_classes
+    assert probs == expected_probs
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_vectorized_fix_matches_reference(seed):
+    rng = random.Random(seed)
+    n = rng.randrange(1, 80)
+    classes = [rng.randrange(2) for _ in range(n)]
+    probs = [rng.random() for _ in range(n)]
+    index = rng.randrange(0, n + 1)
+    expected = _reference_fix_class_prob(list(classes), list(probs), index)
+    assert Classify.fix_class_prob(classes, probs, index) == expected
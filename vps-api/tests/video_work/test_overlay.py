@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from video_work.paint import composite_frame, overlay_crop_mask_on_frame, overlay_polygon_on_frame
+from video_work.tools import get_coord_mask
+
+
+def _reference_overlay(frame, crop_shape, origin_x, origin_y, segments, alpha=0.35):
+    """原实现：整块 crop 三通道掩码 + float32 混合"""
+    mask = get_coord_mask(crop_shape, segments, color=(255, 255, 0))
+    fh, fw = frame.shape[:2]
+    ch, cw = mask.shape[:2]
+    x1, y1 = max(origin_x, 0), max(origin_y, 0)
+    x2, y2 = min(origin_x + cw, fw), min(origin_y + ch, fh)
+    if x2 <= x1 or y2 <= y1:
+        return frame
+    roi = frame[y1:y2, x1:x2]
+    mask_roi = mask[y1 - origin_y : y2 - origin_y, x1 - origin_x : x2 - origin_x]
+    idx = np.any(mask_roi != 0, axis=2)
+    roi_f = roi.astype(np.float32)
+    roi_f[idx] = roi_f[idx] * (1.0 - alpha) + mask_roi.astype(np.float32)[idx] * alpha
+    roi[:] = np.clip(roi_f, 0, 255).astype(np.uint8)
+    return frame
+
+
+@pytest.mark.parametrize(
+    "origin",
+    [(40, 30), (-50, -20), (250, 150), (400, 300)],
+)
+def test_polygon_overlay_matches_full_mask(origin):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8)
+    crop_shape = (160, 160, 3)
+    segments = np.array([10, 20, 150, 60, 170, 140, 30, 155, -5, 80], dtype=np.int32)
+
+    expected = _reference_overlay(frame.copy(), crop_shape, *origin, segments)
+    got = overlay_polygon_on_frame(frame.copy(), segments, crop_shape, *origin)
+    assert np.abs(got.astype(np.int16) - expected.astype(np.int16)).max() <= 1
+    assert np.array_equal((got != frame).any(axis=2), (expected != frame).any(axis=2))
+
+
+def test_crop_mask_overlay_blends_in_place():
+    frame = np.full((50, 60, 3), 100, dtype=np.uint8)
+    mask = np.zeros((20, 20, 3), dtype=np.uint8)
+    mask[5:15, 5:15] = (255, 255, 0)
+    out = overlay_crop_mask_on_frame(frame, mask, origin_x=10, origin_y=10, alpha=0.25)
+    assert out is frame
+    assert frame[20, 20].tolist() == [139, 139, 75]
+    assert frame[0, 0].tolist() == [100, 100, 100]
+
+
+def test_composite_frame_draws_boxes_and_polygons_once():
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    boxes = np.array([[0.1, 0.1, 0.6, 0.6, 0.9]], dtype=np.float32)
+    polygons = [((64, 64, 3), 20, 20, np.array([0, 0, 40, 0, 40, 40, 0, 40], dtype=np.int32))]
+    out = composite_frame(frame, boxes, polygons)
+    assert out is frame
+    assert frame[40, 40].tolist() == [89, 89, 0]
+    assert frame[12, 50].tolist() == [0, 255, 0]
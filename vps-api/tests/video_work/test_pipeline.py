@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from video_work.pipeline import prefetch
+
+
+def test_prefetch_preserves_order():
+    assert list(prefetch(range(100), maxsize=3)) == list(range(100))
+
+
+def test_prefetch_propagates_producer_error():
+    def producer():
+        yield 1
+        raise RuntimeError("decode failed")
+
+    it = prefetch(producer(), maxsize=2)
+    assert next(it) == 1
+    with pytest.raises(RuntimeError, match="decode failed"):
+        next(it)
+
+
+def test_prefetch_early_exit_stops_producer():
+    closed = threading.Event()
+
+    def producer():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    it = prefetch(producer(), maxsize=2)
+    assert [next(it) for _ in range(5)] == [0, 1, 2, 3, 4]
+    it.close()
+    assert closed.is_set()
+
+
+def test_prefetch_is_bounded():
+    produced = []
+
+    def producer():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    it = prefetch(producer(), maxsize=2)
+    assert next(it) == 0
+    time.sleep(0.3)
+    # 已消费 1 个 + 队列容量 2 个 + 生产者手上阻塞的 1 个
+    assert len(produced) <= 4
+    assert list(it) == list(range(1, 10))
+
+
+def test_prefetch_invalid_maxsize():
+    with pytest.raises(ValueError):
+        list(prefetch([1], maxsize=0))
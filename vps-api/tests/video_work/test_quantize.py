@@ -0,0 +1,76 @@
+import torch
+import torch.nn as nn
+
+from video_work.models.quantize import (
+    PointwiseLinear,
+    convert_pointwise_convs,
+    load_or_build_int8,
+    quantize_dynamic_int8,
+)
+
+
+def _model() -> nn.Module:
+    torch.manual_seed(0)
+    return nn.Sequential(
+        nn.Conv2d(3, 16, 3, padding=1),
+        nn.Conv2d(16, 32, 1),
+        nn.GELU(),
+        nn.Sequential(nn.Conv2d(32, 8, 1, bias=False)),
+    ).eval()
+
+
+def test_pointwise_conversion_is_exact():
+    model = _model()
+    x = torch.rand(2, 3, 8, 8)
+    expected = model(x)
+    converted = convert_pointwise_convs(_model())
+    assert isinstance(converted[1], PointwiseLinear)
+    assert isinstance(converted[0], nn.Conv2d)
+    assert torch.allclose(converted(x), expected, atol=1e-5)
+
+
+def test_int8_model_is_close_and_cached(tmp_path):
+    model = _model()
+    x = torch.rand(2, 3, 8, 8)
+    expected = model(x)
+    assert torch.allclose(quantize_dynamic_int8(model)(x), expected, atol=0.1)
+
+    weights = tmp_path / "weights.pth"
+    weights.write_bytes(b"")
+    built = load_or_build_int8(str(weights), _model, _model)
+    assert (tmp_path / "weights.pth.int8.pt").exists()
+    # 缓存命中时由未加载权重的结构 + INT8 state_dict 还原
+    cached = load_or_build_int8(str(weights), lambda: None, lambda: nn.Sequential(*_model()))
+    assert torch.allclose(cached(x), built(x))
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path, caplog):
+    weights = tmp_path / "weights.pth"
+    weights.write_bytes(b"")
+    cache = tmp_path / "weights.pth.int8.pt"
+    cache.write_bytes(b"truncated")
+
+    x = torch.rand(2, 3, 8, 8)
+    with caplog.at_level("WARNING", logger="video_work.models.quantize"):
+        model = load_or_build_int8(str(weights), _model, _model)
+    assert torch.allclose(model(x), quantize_dynamic_int8(_model())(x))
+    assert str(cache) in caplog.text
+    # 重建后的缓存可以正常加载
+    cached = load_or_build_int8(str(weights), lambda: None, _model)
+    assert torch.allclose(cached(x), model(x))
+    # 不留下临时文件
+    assert {p.name for p in tmp_path.iterdir()} == {"weights.pth", "weights.pth.int8.pt"}
+
+
+def test_read_only_weights_dir_skips_cache(tmp_path, monkeypatch):
+    weights = tmp_path / "weights.pth"
+    weights.write_bytes(b"")
+
+    def deny(*args, **kwargs):
+        raise PermissionError("read-only")
+
+    # 以 root 运行时 chmod 无法模拟只读目录，直接让临时文件创建失败
+    monkeypatch.setattr("video_work.models.quantize.tempfile.mkstemp", deny)
+    model = load_or_build_int8(str(weights), _model, _model)
+    assert isinstance(model, nn.Module)
+    assert not (tmp_path / "weights.pth.int8.pt").exists()
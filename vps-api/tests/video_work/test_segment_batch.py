@@ -0,0 +1,143 @@
+import cv2
+import numpy as np
+import torch
+
+from video_work.segment.segment import Segment, _SlideLayout
+from video_work.speed import get_coord_min_rect_len
+
+
+class _ChannelNet(torch.nn.Module):
+    """前景 logit 取第一个通道，输出与输入同尺寸的 2 类 logits"""
+
+    def forward(self, x):
+        fg = x[:, :1] * 4.0
+        return torch.cat([-fg, fg], dim=1)
+
+
+def _make_segmenter() -> Segment:
+    segmenter = object.__new__(Segment)
+    segmenter.device = torch.device("cpu")
+    segmenter.model = _ChannelNet().eval()
+    segmenter.input_size = (224, 224)
+    segmenter._norm_mean = torch.zeros(1, 3, 1, 1)
+    segmenter._norm_std = torch.ones(1, 3, 1, 1)
+    segmenter.batch_size = 8
+    segmenter.last_batch_timings = []
+    segmenter._layouts = {}
+    return segmenter
+
+
+def _image(h: int, w: int, box: tuple[int, int, int, int]) -> torch.Tensor:
+    image = torch.full((3, h, w), -1.0)
+    x1, y1, x2, y2 = box
+    image[:, y1:y2, x1:x2] = 1.0
+    return image
+
+
+def test_cross_image_batches_match_single_tile_batches():
+    segmenter = _make_segmenter()
+    images = [
+        _image(300, 500, (40, 60, 420, 120)),
+        _image(200, 200, (10, 10, 150, 40)),
+        torch.zeros(3, 0, 0),
+        _image(460, 460, (100, 100, 400, 160)),
+    ]
+    single = segmenter.predict_images(images, crop_size=224, stride=(160, 160), batch=1)
+    tiles = len(segmenter.last_batch_timings)
+
+    batched = segmenter.predict_images(images, crop_size=224, stride=(160, 160), batch=5)
+    sizes = [size for size, _ in segmenter.last_batch_timings]
+    assert sum(sizes) == tiles
+    assert sizes[:-1] == [5] * (len(sizes) - 1)
+
+    assert [len(r) for r in batched] == [1, 1, 0, 1]
+    for got, expected in zip(batched, single):
+        assert [d["segments"].tolist() for d in got] == [d["segments"].tolist() for d in expected]
+
+
+def test_benchmark_batch_size_picks_a_candidate():
+    segmenter = _make_segmenter()
+    size = segmenter.benchmark_batch_size(candidates=(1, 2, 4), crop_size=224, repeats=1)
+    assert size in (1, 2, 4)
+    assert segmenter.batch_size == size
+
+
+def test_layout_fuse_matches_loop_accumulation():
+    layout = _SlideLayout(300, 460, 224, 224, 160, 160, torch.device("cpu"))
+    assert layout.positions[-1] == (76, 236)
+    tile_probs = torch.rand(layout.count, 224, 224)
+
+    weight = layout.weight.numpy()
+    prob_sum = np.zeros((300, 460), dtype=np.float32)
+    w_sum = np.zeros((300, 460), dtype=np.float32)
+    for patch, (y0, x0) in zip(tile_probs.numpy(), layout.positions):
+        prob_sum[y0 : y0 + 224, x0 : x0 + 224] += patch * weight
+        w_sum[y0 : y0 + 224, x0 : x0 + 224] += weight
+    expected = prob_sum / np.maximum(w_sum, 1e-6)
+
+    assert np.allclose(layout.fuse(tile_probs).numpy(), expected, atol=1e-5)
+
+
+def test_layouts_are_cached_per_size():
+    segmenter = _make_segmenter()
+    images = [_image(300, 300, (0, 0, 100, 100)), _image(300, 300, (50, 50, 200, 90))]
+    segmenter.predict_images(images, crop_size=224)
+    segmenter.predict_images(images[:1], crop_size=224)
+    assert list(segmenter._layouts) == [(300, 300, 224, 224, 224, 224)]
+
+
+def test_contour_confidence_matches_full_size_mask():
+    rng = np.random.default_rng(0)
+    prob_map = rng.uniform(0.0, 0.4, size=(120, 160)).astype(np.float32)
+    prob_map[10:50, 20:90] = rng.uniform(0.6, 1.0, size=(40, 70))
+    prob_map[70:110, 100:150] = 0.8
+    prob_map[5:7, 150:152] = 0.9  # 小于 min_area 的噪点
+    bin_mask = (prob_map >= 0.5).astype(np.uint8) * 255
+
+    results = Segment._prob_map_to_results(prob_map, bin_mask, min_area=32, epsilon_ratio=0.002)
+    assert len(results) == 2
+    for det in results:
+        segment = det["segments"]
+        assert segment.dtype == np.int32 and segment.ndim == 1
+        fill = np.zeros(prob_map.shape, dtype=np.uint8)
+        cv2.fillPoly(fill, [segment.reshape(-1, 1, 2)], 1)
+        assert abs(det["conf"] - float(prob_map[fill.astype(bool)].mean())) < 1e-4
+    assert results[0]["conf"] >= results[1]["conf"]
+
+
+def test_length_output_skips_polygons():
+    prob_map = np.zeros((200, 200), dtype=np.float32)
+    cv2.fillPoly(prob_map, [np.array([[20, 30], [170, 120], [160, 140], [10, 50]], dtype=np.int32)], 0.9)
+    bin_mask = (prob_map >= 0.5).astype(np.uint8) * 255
+
+    polygon = Segment._prob_map_to_results(prob_map, bin_mask, 32, 0.002)
+    lengths = Segment._prob_map_to_results(prob_map, bin_mask, 32, 0.002, output="length")
+    assert len(polygon) == len(lengths) == 1
+    assert "segments" not in lengths[0]
+    assert abs(polygon[0]["length"] - get_coord_min_rect_len(polygon[0]["segments"])) < 1e-3
+    assert lengths[0]["length"] == polygon[0]["length"]
+    assert lengths[0]["conf"] == polygon[0]["conf"]
+
+
+def test_whole_and_auto_modes_use_fewer_tiles():
+    segmenter = _make_segmenter()
+    images = [
+        _image(200, 200, (20, 90, 180, 110)),
+        _image(280, 280, (20, 120, 260, 150)),
+        _image(400, 400, (40, 180, 360, 220)),
+    ]
+    kwargs = dict(crop_size=224, stride=(160, 160), output="length")
+
+    slide = segmenter.predict_images(images, mode="slide", **kwargs)
+    slide_tiles = sum(size for size, _ in segmenter.last_batch_timings)
+    whole = segmenter.predict_images(images, mode="whole", **kwargs)
+    assert sum(size for size, _ in segmenter.last_batch_timings) == 3
+    auto = segmenter.predict_images(images, mode="auto", **kwargs)
+    auto_tiles = sum(size for size, _ in segmenter.last_batch_timings)
+    assert slide_tiles == 1 + 4 + 9
+    assert auto_tiles == 1 + 1 + 9
+
+    for results in (whole, auto):
+        for got, expected in zip(results, slide):
+            assert len(got) == len(expected) == 1
+            assert abs(got[0]["length"] - expected[0]["length"]) <= 3.0
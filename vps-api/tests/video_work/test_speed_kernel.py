@@ -0,0 +1,157 @@
+import random
+
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter1d
+
+from video_work.speed import (
+    calc_instantaneous_speeds,
+    calc_length_diff,
+    calc_speed,
+    calc_speed_batch,
+    detect_outliers_mad,
+    fix_to_monotonic_decreasing,
+    forward_fill_outliers,
+)
+
+
+def _reference_length_diff(length_list, swin=6, step=2):
+    def average_within(nums, index, r=2):
+        values = nums[max(0, index - r) : min(len(nums), index + r + 1)]
+        return sum(values) / len(values)
+
+    diffs, indexes = [], []
+    for i in range(0, len(length_list) - swin + 1, step):
+        diffs.append(average_within(length_list, i) - average_within(length_list, i + swin - 1))
+        indexes.append(i)
+    return diffs, indexes
+
+
+def _reference_fill(speeds, outlier_positions, fallback):
+    speeds = np.array(speeds, dtype=np.float64)
+    for pos in outlier_positions:
+        prev_pos = int(pos) - 1
+        while prev_pos >= 0 and not np.isfinite(speeds[prev_pos]):
+            prev_pos -= 1
+        speeds[int(pos)] = float(speeds[prev_pos]) if prev_pos >= 0 else fallback
+    return speeds
+
+
+def _reference_speeds(lengths, start_end, fps, swin, step, init_shaft_len=20):
+    start_idx, end_idx = start_end
+    needle_lengths = gaussian_filter1d(lengths[start_idx : end_idx + 1], sigma=3).tolist()
+    start_length = needle_lengths[0] if needle_lengths[0] > 0 else 0.000001
+    r = init_shaft_len / start_length
+    diffs, indexes = _reference_length_diff(needle_lengths, swin=swin, step=step)
+    speeds = np.asarray([(max(0.0, d) * r) / (swin / fps) for d in diffs], dtype=np.float64)
+    avg_speed = 0.0
+    if speeds.size:
+        idx_arr = np.asarray(indexes)
+        valid_mask = (idx_arr >= start_idx) & (idx_arr + swin - 1 <= end_idx) & np.isfinite(speeds)
+        valid = speeds[valid_mask]
+        if valid.size:
+            outliers = detect_outliers_mad(valid, threshold=3.5)
+            inliers = valid[~outliers]
+            avg_speed = float(np.mean(inliers)) if inliers.size else float(np.mean(valid))
+            speeds = _reference_fill(speeds, np.flatnonzero(valid_mask)[outliers], avg_speed)
+    return avg_speed, speeds.tolist()
+
+
+def _needle_lengths(rng: random.Random, n: int) -> list[float]:
+    start = rng.uniform(150, 400)
+    speed = rng.uniform(0.5, 4.0)
+    lengths = [max(0.0, start - speed * i + rng.gauss(0, 3)) for i in range(n)]
+    for _ in range(rng.randrange(0, 4)):  # 偶发的分割跳变
+        lengths[rng.randrange(n)] *= rng.uniform(0.2, 1.8)
+    return lengths
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("swin,step", [(30, 15), (60, 30), (8, 2), (5, 1)])
+def test_length_diff_matches_reference(seed, swin, step):
+    lengths = _needle_lengths(random.Random(seed), 40 + seed * 13)
+    diffs, indexes = calc_length_diff(lengths, swin=swin, step=step)
+    expected, expected_indexes = _reference_length_diff(lengths, swin=swin, step=step)
+    assert indexes == expected_indexes
+    assert np.allclose(diffs, expected, rtol=0, atol=1e-9)
+
+
+def test_length_diff_accepts_rows():
+    rng = random.Random(1)
+    rows = np.asarray([_needle_lengths(rng, 90) for _ in range(4)])
+    diffs, indexes = calc_length_diff(rows, swin=30, step=15)
+    assert diffs.shape == (4, len(indexes))
+    for row, row_diffs in zip(rows, diffs):
+        assert np.allclose(row_diffs, calc_length_diff(row.tolist(), swin=30, step=15)[0])
+    assert calc_length_diff(rows[:, :10], swin=30, step=15)[0].shape == (4, 0)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_monotonic_fix_matches_loop(seed):
+    lengths = _needle_lengths(random.Random(seed), 80)
+    fixed, _ = fix_to_monotonic_decreasing(list(lengths))
+    # 首元素为峰值修正后的长度，其余按原循环逐个截断
+    expected = [fixed[0]] + lengths[1:]
+    for i in range(1, len(expected)):
+        if expected[i] > expected[i - 1]:
+            expected[i] = expected[i - 1]
+    assert fixed == pytest.approx(expected)
+
+
+def test_forward_fill_matches_walk():
+    rng = np.random.default_rng(0)
+    speeds = rng.uniform(0, 50, size=(5, 30))
+    speeds[rng.random(speeds.shape) < 0.15] = np.nan
+    outliers = np.isfinite(speeds) & (rng.random(speeds.shape) < 0.2)
+    outliers[:, 0] = np.isfinite(speeds[:, 0])
+    fallback = np.arange(5, dtype=np.float64)
+    filled = forward_fill_outliers(speeds, outliers, fallback)
+    for row in range(5):
+        expected = _reference_fill(speeds[row], np.flatnonzero(outliers[row]), fallback[row])
+        assert np.array_equal(filled[row], expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("fps", [30, 60])
+def test_calc_speed_matches_reference(seed, fps):
+    lengths = _needle_lengths(random.Random(seed), 150)
+    swin, step = (60, 30) if fps >= 60 else (30, 15)
+    _, avg_speed, speeds = calc_speed(lengths, (0, 120), fps=fps, swin=swin, step=step)
+    expected_avg, expected_speeds = _reference_speeds(lengths, (0, 120), fps, swin, step)
+    assert avg_speed == pytest.approx(expected_avg, rel=1e-9, abs=1e-9)
+    assert speeds == pytest.approx(expected_speeds, rel=1e-9, abs=1e-9)
+
+
+def test_instantaneous_speeds_accept_rows():
+    rng = random.Random(2)
+    rows = np.asarray([_needle_lengths(rng, 100) for _ in range(3)])
+    speeds, indexes = calc_instantaneous_speeds(rows, fps=30, swin=30, step=15)
+    assert speeds.shape == (3, len(indexes))
+    for row, row_speeds in zip(rows, speeds):
+        single, _ = calc_instantaneous_speeds(row, fps=30, swin=30, step=15)
+        assert np.allclose(row_speeds, single)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_speed_batch_matches_single_calls(seed):
+    lengths = _needle_lengths(random.Random(seed), 150)
+    params = [
+        (swin, step, points, threshold)
+        for swin, step in ((30, 15), (20, 10), (8, 2))
+        for points in (3, 5)
+        for threshold in (1.0, 2.5, 3.5)
+    ]
+    results = calc_speed_batch(lengths, (0, 110), params, fps=30)
+    for (swin, step, points, threshold), (init_speed, avg_speed, speeds) in zip(params, results):
+        expected = calc_speed(
+            lengths,
+            (0, 110),
+            fps=30,
+            swin=swin,
+            step=step,
+            init_speed_sample_points=points,
+            outlier_threshold=threshold,
+        )
+        assert init_speed == pytest.approx(expected[0], rel=1e-9, abs=1e-9)
+        assert avg_speed == pytest.approx(expected[1], rel=1e-9, abs=1e-9)
+        assert speeds == pytest.approx(expected[2], rel=1e-9, abs=1e-9)
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from video_work.core import SpeedParams, _segmented_end_reached, estimate_speed, estimate_speed_sweep
+
+
+def _origin_lens(seed: int) -> list[float]:
+    rng = random.Random(seed)
+    start = rng.uniform(200, 400)
+    lens = [0.0] * 40 + [max(0.0, start - 2.5 * i + rng.gauss(0, 4)) for i in range(160)]
+    lens[60] *= 1.6  # 峰值附近的离群点
+    return lens
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sweep_matches_single_estimates(seed):
+    lens = _origin_lens(seed)
+    params = [
+        SpeedParams(swin=swin, step=step, end_ratio=ratio, peak_outlier_threshold=peak, speed_outlier_threshold=spd)
+        for swin, step in ((None, None), (20, 10))
+        for ratio in (0.4, 0.5, 0.7)
+        for peak in (1.5, 2.0)
+        for spd in (2.0, 3.5)
+    ]
+    outputs = estimate_speed_sweep(lens, 40, 30.0, params)
+    assert len(outputs) == len(params)
+    for p, out in zip(params, outputs):
+        expected = estimate_speed(lens, 40, 30.0, **p.model_dump())
+        assert (out.predict_start, out.predict_end) == (expected.predict_start, expected.predict_end)
+        assert out.instantaneous_speed_indexes == expected.instantaneous_speed_indexes
+        assert out.init_speed == pytest.approx(expected.init_speed, rel=1e-9, abs=1e-9)
+        assert out.avg_speed == pytest.approx(expected.avg_speed, rel=1e-9, abs=1e-9)
+        assert out.instantaneous_speeds == pytest.approx(expected.instantaneous_speeds, rel=1e-9, abs=1e-9)
+        assert out.origin_lens == []
+
+
+def _lazy_lens(lens: list[float], insert: int, swin: int, chunk: int = 16) -> list[float]:
+    """模拟 analyse_video 的按需分割：逐块填入长度，满足停止条件后其余帧保持 0"""
+    lazy = [0.0] * len(lens)
+    for start in range(insert, len(lens), chunk):
+        stop = min(start + chunk, len(lens))
+        lazy[start:stop] = lens[start:stop]
+        if _segmented_end_reached(lazy[insert:stop], swin):
+            break
+    return lazy
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lazy_segmentation_matches_full_series(seed):
+    rng = random.Random(seed)
+    # 300px 平台 + 单帧 450px 尖峰，之后每帧缩短 1px：原始最大值会让峰值偏高、过早停止
+    lens = [0.0] * 20 + [300.0 + rng.gauss(0, 1) for _ in range(40)] + [300.0 - i for i in range(1, 280)]
+    lens[40] = 450.0
+    lazy = _lazy_lens(lens, 20, swin=30)
+    assert lazy[-1] == 0.0  # 确实提前停止了
+
+    expected = estimate_speed(lens, 20, 30.0)
+    got = estimate_speed(lazy, 20, 30.0)
+    assert (got.predict_start, got.predict_end) == (expected.predict_start, expected.predict_end)
+    assert got.init_speed == pytest.approx(expected.init_speed, rel=1e-9, abs=1e-9)
+    assert got.avg_speed == pytest.approx(expected.avg_speed, rel=1e-9, abs=1e-9)
+    assert got.instantaneous_speeds == pytest.approx(expected.instantaneous_speeds, rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lazy_segmentation_matches_noisy_series(seed):
+    lens = _origin_lens(seed)
+    lazy = _lazy_lens(lens, 40, swin=30)
+    expected = estimate_speed(lens, 40, 30.0)
+    got = estimate_speed(lazy, 40, 30.0)
+    assert (got.predict_start, got.predict_end) == (expected.predict_start, expected.predict_end)
+    assert got.avg_speed == pytest.approx(expected.avg_speed, rel=1e-9, abs=1e-9)
+    assert got.instantaneous_speeds == pytest.approx(expected.instantaneous_speeds, rel=1e-9, abs=1e-9)
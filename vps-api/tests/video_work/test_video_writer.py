@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from video_work.tools import FfmpegVideoWriter, VideoFrameSource, save_frames2video
+
+
+def _frames(count: int, h: int, w: int):
+    for i in range(count):
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        frame[:, : (i * 7) % w] = (0, 128, 255)
+        yield frame
+
+
+def test_streams_frames_and_resizes_only_mismatched(tmp_path):
+    output = str(tmp_path / "out.mp4")
+    frames = list(_frames(10, 120, 160)) + list(_frames(5, 90, 100))
+    save_frames2video(frames, output, fps=25, size=(160, 120))
+
+    source = VideoFrameSource(output)
+    assert (source.meta["width"], source.meta["height"]) == (160, 120)
+    decoded = list(source)
+    assert len(decoded) == 15
+    assert decoded[0].shape == (120, 160, 3)
+
+
+def test_empty_frames_raise_and_leave_no_file(tmp_path):
+    output = tmp_path / "empty.mp4"
+    with pytest.raises(ValueError, match="frames is empty"):
+        save_frames2video(iter(()), str(output), fps=25, size=(64, 64))
+    assert not output.exists()
+
+
+def test_producer_error_aborts_encoder(tmp_path):
+    output = tmp_path / "broken.mp4"
+
+    def frames():
+        yield from _frames(3, 64, 64)
+        raise KeyError("render failed")
+
+    with pytest.raises(KeyError):
+        save_frames2video(frames(), str(output), fps=25, size=(64, 64))
+    assert not output.exists()
+
+
+@pytest.mark.parametrize(
+    "name,size",
+    [
+        ("missing/out.mp4", (64, 64)),  # 输出目录不存在，ffmpeg 无法打开输出
+        ("odd.mp4", (63, 64)),  # 输出文件已创建，编码器因奇数宽度（yuv420p）失败
+    ],
+)
+def test_ffmpeg_failure_surfaces_stderr(tmp_path, name, size):
+    output = tmp_path / name
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        with FfmpegVideoWriter(str(output), fps=25, size=size) as writer:
+            for frame in _frames(5, size[1], size[0]):
+                writer.write(frame)
+    # 不留下截断的输出文件
+    assert not output.exists()
@@ -162,7 +162,7 @@ def test_segment() -> None:
     for (frame_idx, crop, origin_x, origin_y), seg in zip(crop_items, seg_results):
         for det in seg:
             segments = det.get("segments")
-            if not segments:
+            if segments is None or len(segments) == 0:
                 continue
             mask_crop = get_coord_mask(crop.shape, segments, color=(255, 255, 0))
             overlay_crop_mask_on_frame(
@@ -243,7 +243,7 @@ def test_speed() -> None:
         max_len = 0.0
         for det in seg:
             segments = det.get("segments")
-            if not segments:
+            if segments is None or len(segments) == 0:
                 continue
             max_len = max(max_len, get_coord_min_rect_len(segments))
         origin_lens[int(frame_idx)] = max(origin_lens[int(frame_idx)], max_len)
@@ -294,6 +294,112 @@ def test_speed() -> None:
     print(f"speeds graph saved to {output_dir / f'{video_path.stem}_speeds.png'}")
     
 
+def test_int8_accuracy() -> None:
+    """对比 INT8 动态量化模型与浮点模型的插入帧和长度序列"""
+    detector = Detect()
+    video = extract_video_frames(str(video_path))
+    frames = video["frames"]
+    meta = video["meta"]
+    detect_norm_annotation = detector.predict_images(frames, int(meta["width"]), int(meta["height"]))
+    annotations_per_frame = Detect.optimize_detect_norm_annotation(
+        detect_norm_annotation,
+        box_scale = get_detect_box_sacle(int(meta["width"]), int(meta["height"]))
+    )
+    group_square_annotations = make_group_square_annotations(
+        annotations_per_frame,
+        group_size=30,
+        image_size=(int(meta["width"]), int(meta["height"])),
+    )
+
+    crop_frame_indexes: list[int] = []
+    crop_frames = []
+    for frame_idx, (frame, frame_anns) in enumerate(zip(frames, group_square_annotations)):
+        for ann in frame_anns:
+            out = square_crop_with_origin(frame, ann)
+            if out is None:
+                continue
+            crop_frame_indexes.append(frame_idx)
+            crop_frames.append(out[0])
+    if not crop_frames:
+        raise RuntimeError("no crop_frames generated")
+
+    def run(quantize: bool) -> tuple[int, list[float]]:
+        classifier = Classify(quantize=quantize)
+        segmenter = Segment(quantize=quantize)
+        preds, probs = classifier.predict_images(frames2tensors(crop_frames, classifier.device))
+        insert_frame_index = Classify.find_first_inserted_frame(class_list=preds, prob_list=probs)
+        seg_results = segmenter.predict_images(
+            frames2tensors(crop_frames, segmenter.device), conf_thres=0.5
+        )
+        origin_lens = [0.0 for _ in range(len(frames))]
+        for frame_idx, seg in zip(crop_frame_indexes, seg_results):
+            for det in seg:
+                segments = det.get("segments")
+                if segments is not None and len(segments) > 0:
+                    origin_lens[frame_idx] = max(origin_lens[frame_idx], get_coord_min_rect_len(segments))
+        return insert_frame_index, origin_lens
+
+    float_index, float_lens = run(quantize=False)
+    int8_index, int8_lens = run(quantize=True)
+    diffs = [abs(a - b) for a, b in zip(float_lens, int8_lens)]
+    print(f"insert_frame_index float: {float_index}, int8: {int8_index}")
+    print(f"length max abs diff: {max(diffs):.3f}, mean abs diff: {sum(diffs) / len(diffs):.3f}")
+
+
+def test_segment_modes() -> None:
+    """对比 slide / whole / auto 分割模式的耗时和长度序列（以 slide 为基准），并按裁剪边长分段统计"""
+    import time
+
+    detector = Detect()
+    segmenter = Segment()
+    video = extract_video_frames(str(video_path))
+    frames = video["frames"]
+    meta = video["meta"]
+    detect_norm_annotation = detector.predict_images(frames, int(meta["width"]), int(meta["height"]))
+    annotations_per_frame = Detect.optimize_detect_norm_annotation(
+        detect_norm_annotation,
+        box_scale = get_detect_box_sacle(int(meta["width"]), int(meta["height"]))
+    )
+    group_square_annotations = make_group_square_annotations(
+        annotations_per_frame,
+        group_size=30,
+        image_size=(int(meta["width"]), int(meta["height"])),
+    )
+    crop_frames = []
+    for frame, frame_anns in zip(frames, group_square_annotations):
+        for ann in frame_anns:
+            out = square_crop_with_origin(frame, ann)
+            if out is not None:
+                crop_frames.append(out[0])
+    if not crop_frames:
+        raise RuntimeError("no crop_frames generated")
+    tensors = frames2tensors(crop_frames, segmenter.device)
+
+    def run(mode: str) -> list[float]:
+        started = time.perf_counter()
+        seg_results = segmenter.predict_images(tensors, mode=mode, conf_thres=0.5, output="length")
+        elapsed = time.perf_counter() - started
+        tiles = sum(size for size, _ in segmenter.last_batch_timings)
+        print(f"mode={mode}: {elapsed:.2f}s, {tiles} tiles, {elapsed / len(tensors) * 1000:.1f} ms/crop")
+        return [max((det["length"] for det in seg), default=0.0) for seg in seg_results]
+
+    slide_lens = run("slide")
+    sides = [max(t.shape[1], t.shape[2]) for t in tensors]
+    for mode in ("whole", "auto"):
+        lens = run(mode)
+        for low, high in ((0, 384), (385, 512), (513, 10**6)):
+            diffs = [
+                abs(a - b) / max(a, 1.0)
+                for a, b, side in zip(slide_lens, lens, sides)
+                if low <= side <= high
+            ]
+            if diffs:
+                print(
+                    f"  side {low}-{high}: {len(diffs)} crops, "
+                    f"length mean rel diff {sum(diffs) / len(diffs):.3%}, max {max(diffs):.3%}"
+                )
+
+
 if __name__ == "__main__":
     
     # test_detect()
@@ -301,3 +407,5 @@ if __name__ == "__main__":
     test_segment()
 
     test_speed()
+    # test_int8_accuracy()
+    # test_segment_modes()
@@ -0,0 +1,155 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+
+"""
+    列式检测框表示：整段视频的检测框存放在一个 (N, 6) float32 数组中，
+    另有一个 (N,) 帧序号数组（升序）。列含义见 BOX_* 常量。
+    检测 -> 平滑 -> 分组正方形 -> 裁剪 -> 绘制 全流程都使用该结构，
+    List[List[Dict[str, float]]] 形式仅在对外兼容的接口处转换。
+"""
+
+__all__ = [
+    "BOX_X1",
+    "BOX_Y1",
+    "BOX_X2",
+    "BOX_Y2",
+    "BOX_CONF",
+    "BOX_SIDE",
+    "BOX_COLUMNS",
+    "FrameBoxes",
+    "box_row",
+    "as_box_array",
+]
+
+# 列：归一化坐标 x1, y1, x2, y2，置信度 conf，正方形边长像素 side（0 表示未设置）
+BOX_X1, BOX_Y1, BOX_X2, BOX_Y2, BOX_CONF, BOX_SIDE = range(6)
+BOX_COLUMNS = 6
+
+
+def box_row(ann: Dict[str, float] | Sequence[float] | NDArray[np.floating]) -> NDArray[np.float32]:
+    """把单个检测框（dict 或数组行）转为长度为 BOX_COLUMNS 的数组行"""
+    if isinstance(ann, dict):
+        return np.array(
+            [
+                float(ann.get("x1", 0.0)),
+                float(ann.get("y1", 0.0)),
+                float(ann.get("x2", 1.0)),
+                float(ann.get("y2", 1.0)),
+                float(ann.get("conf", 0.0)),
+                float(ann.get("square_side_px", 0.0)),
+            ],
+            dtype=np.float32,
+        )
+    row = np.zeros(BOX_COLUMNS, dtype=np.float32)
+    values = np.asarray(ann, dtype=np.float32).reshape(-1)[:BOX_COLUMNS]
+    row[: values.size] = values
+    return row
+
+
+def as_box_array(
+    annotations: List[Dict[str, float]] | NDArray[np.floating],
+) -> NDArray[np.float32]:
+    """把一帧的检测框（dict 列表或二维数组）转为 (M, BOX_COLUMNS) 数组"""
+    if isinstance(annotations, np.ndarray):
+        if annotations.size == 0:
+            return np.zeros((0, BOX_COLUMNS), dtype=np.float32)
+        arr = np.atleast_2d(annotations)
+        if arr.shape[1] == BOX_COLUMNS and arr.dtype == np.float32:
+            return arr
+        out = np.zeros((arr.shape[0], BOX_COLUMNS), dtype=np.float32)
+        out[:, : min(arr.shape[1], BOX_COLUMNS)] = arr[:, :BOX_COLUMNS]
+        return out
+    if not annotations:
+        return np.zeros((0, BOX_COLUMNS), dtype=np.float32)
+    return np.stack([box_row(ann) for ann in annotations], axis=0)
+
+
+class FrameBoxes(BaseModel):
+    boxes: NDArray[np.float32] = Field(..., description="(N, 6) 检测框数组，列见 BOX_*")
+    frame_idx: NDArray[np.int64] = Field(..., description="(N,) 每个框所属的帧序号（升序）")
+    frame_count: int = Field(..., description="视频总帧数（允许某些帧没有框）")
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, extra="forbid")
+
+    _offsets: NDArray[np.int64] = PrivateAttr()
+
+    def model_post_init(self, __context) -> None:
+        if self.boxes.ndim != 2 or self.boxes.shape[1] != BOX_COLUMNS:
+            raise ValueError(f"boxes must be (N, {BOX_COLUMNS})")
+        if self.frame_idx.shape != (self.boxes.shape[0],):
+            raise ValueError("frame_idx must be (N,)")
+        self._offsets = np.searchsorted(
+            self.frame_idx, np.arange(self.frame_count + 1), side="left"
+        ).astype(np.int64)
+
+    @classmethod
+    def empty(cls, frame_count: int) -> "FrameBoxes":
+        return cls(
+            boxes=np.zeros((0, BOX_COLUMNS), dtype=np.float32),
+            frame_idx=np.zeros((0,), dtype=np.int64),
+            frame_count=int(frame_count),
+        )
+
+    @classmethod
+    def from_frame_arrays(cls, per_frame: Sequence[NDArray[np.floating]]) -> "FrameBoxes":
+        """由每帧一个 (M_i, K) 数组（K <= 6，缺失列补 0）构造"""
+        arrays = [as_box_array(arr) for arr in per_frame]
+        counts = np.array([arr.shape[0] for arr in arrays], dtype=np.int64)
+        if arrays and counts.sum() > 0:
+            boxes = np.concatenate(arrays, axis=0)
+        else:
+            boxes = np.zeros((0, BOX_COLUMNS), dtype=np.float32)
+        frame_idx = np.repeat(np.arange(len(arrays), dtype=np.int64), counts)
+        return cls(boxes=boxes, frame_idx=frame_idx, frame_count=len(arrays))
+
+    @classmethod
+    def from_annotations(cls, annotations: List[List[Dict[str, float]]]) -> "FrameBoxes":
+        return cls.from_frame_arrays([as_box_array(frame_boxes) for frame_boxes in annotations])
+
+    def to_annotations(self) -> List[List[Dict[str, float]]]:
+        """转回 List[List[Dict[str, float]]]，设置了正方形边长的框带 square_side_px 字段"""
+        out: List[List[Dict[str, float]]] = [[] for _ in range(self.frame_count)]
+        for frame, row in zip(self.frame_idx.tolist(), self.boxes.tolist()):
+            ann = {
+                "x1": row[BOX_X1],
+                "y1": row[BOX_Y1],
+                "x2": row[BOX_X2],
+                "y2": row[BOX_Y2],
+                "conf": row[BOX_CONF],
+            }
+            if row[BOX_SIDE] > 0:
+                ann["square_side_px"] = row[BOX_SIDE]
+            out[frame].append(ann)
+        return out
+
+    def __len__(self) -> int:
+        return int(self.frame_count)
+
+    def rows(self, frame: int) -> NDArray[np.float32]:
+        """第 frame 帧的检测框（视图，不拷贝）"""
+        start, end = self._offsets[frame], self._offsets[frame + 1]
+        return self.boxes[start:end]
+
+    def best_per_frame(
+        self, conf_threshold: float = 0.0
+    ) -> tuple[NDArray[np.float64], NDArray[np.bool_]]:
+        """
+            每帧取 conf >= conf_threshold 中置信度最高的框（并列时取靠前的），
+            返回 (frame_count, 6) 数组和 (frame_count,) 有效标记。
+        """
+        best = np.zeros((self.frame_count, BOX_COLUMNS), dtype=np.float64)
+        valid = np.zeros(self.frame_count, dtype=bool)
+        keep = np.flatnonzero(self.boxes[:, BOX_CONF] >= conf_threshold)
+        if keep.size == 0:
+            return best, valid
+        frames = self.frame_idx[keep]
+        order = np.lexsort((keep, -self.boxes[keep, BOX_CONF], frames))
+        frames_sorted = frames[order]
+        first = np.flatnonzero(np.r_[True, frames_sorted[1:] != frames_sorted[:-1]])
+        chosen = keep[order[first]]
+        best[frames_sorted[first]] = self.boxes[chosen]
+        valid[frames_sorted[first]] = True
+        return best, valid
@@ -1,31 +1,51 @@
 
+import time
+import numpy as np
 import torch
 from pathlib import Path
 from torchvision import transforms
 
 from video_work.models.menet_classifier import MENetClassifier
+from video_work.models.quantize import load_or_build_int8
 
 
 DEFAULT_MODEL_PATH = str(Path(__file__).resolve().parent / "menet-backbone.pth.tar")
+# 单个 384x384 输入在推理时的激活显存相对输入大小的估算倍数
+_ACTIVATION_FACTOR = 48
+# 找插入帧时依次尝试的概率阈值（从大到小）
+INSERT_PROB_THRESHOLDS = (0.9, 0.8, 0.7, 0.6)
 
 # TODO: 分类模型待改为 efficientnet
 class Classify:
-    _instance: "Classify | None" = None
+    _instances: dict[bool, "Classify"] = {}
 
-    def __new__(cls, model_path: str = DEFAULT_MODEL_PATH) -> "Classify":
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    def __new__(cls, model_path: str = DEFAULT_MODEL_PATH, quantize: bool = False) -> "Classify":
+        if quantize not in cls._instances:
+            cls._instances[quantize] = super().__new__(cls)
+        return cls._instances[quantize]
 
-    def __init__(self, model_path: str = DEFAULT_MODEL_PATH) -> None:
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, quantize: bool = False) -> None:
+        """quantize 为 True 时使用 INT8 动态量化模型（仅 CPU，见 video_work.models.quantize）"""
         if hasattr(self, "_initialized") and self._initialized:
             return
         self.model_path = model_path or DEFAULT_MODEL_PATH
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.device = device
-        self.model = MENetClassifier(num_classes=2, weight_path=self.model_path)
-        self.model.to(device)
+        self.quantize = quantize
+        if quantize:
+            self.device = torch.device("cpu")
+            self.model = load_or_build_int8(
+                self.model_path,
+                build_float=lambda: MENetClassifier(num_classes=2, weight_path=self.model_path),
+                build_skeleton=lambda: MENetClassifier(num_classes=2),
+            )
+        else:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            self.device = device
+            self.model = MENetClassifier(num_classes=2, weight_path=self.model_path)
+            self.model.to(device)
+        self.model.to(memory_format=torch.channels_last)
         self.model.eval()
+        # 最近一次 predict_images 每个批次的 (批大小, 耗时秒)
+        self.last_batch_timings: list[tuple[int, float]] = []
         self.transform = transforms.Compose(
             [
                 transforms.Resize((384, 384)),
@@ -38,29 +58,69 @@ class Classify:
         self._initialized = True
 
     
-    def predict_images(self, frame_tensors, batch: int = 6) -> tuple[list[int], list[float]]:
+    def auto_batch_size(self) -> int:
+        """
+        按可用资源估计分类批大小：GPU 取空闲显存的一半 / 单样本激活估算，
+        CPU 取线程数的 2 倍；结果限制在 [4, 64]。
+        """
+        if self.device.type == "cuda":
+            free, _ = torch.cuda.mem_get_info(self.device)
+            per_sample = 3 * 384 * 384 * 4 * _ACTIVATION_FACTOR
+            size = int(free * 0.5 // per_sample)
+        else:
+            size = torch.get_num_threads() * 2
+        return max(4, min(64, size))
+
+    def predict_images(
+        self, frame_tensors, batch: int | None = None, input_size: int | None = None
+    ) -> tuple[list[int], list[float]]:
+        """
+        frame_tensors 为 CHW、RGB、float(0~1) 的张量列表，或同尺寸的 (N, 3, H, W) 张量
+        （如 make_group_square_boxes 同组裁剪得到的批），后者整批做一次 Resize + Normalize。
+        batch 为 None 时按 auto_batch_size 选择；推理使用 inference_mode + channels_last，
+        每个批次的耗时记录在 last_batch_timings。
+        input_size 不为空时以该分辨率代替 384 推理（级联分类的粗筛）。
+        """
         if frame_tensors is None:
             raise ValueError("frame_tensors is None")
-        processed_tensors = []
-        for tensor in frame_tensors:
-            if tensor is None:
-                raise ValueError("tensor in frame_tensors is None")
-            tensor = self.transform(tensor)
-            processed_tensors.append(tensor)
-        if not processed_tensors:
-            return [], []
+        if batch is None:
+            batch = self.auto_batch_size()
         if batch <= 0:
             raise ValueError("batch must be positive")
+        self.last_batch_timings = []
+        transform = self.transform
+        if input_size is not None:
+            transform = transforms.Compose(
+                [transforms.Resize((input_size, input_size)), self.transform.transforms[-1]]
+            )
+        if isinstance(frame_tensors, torch.Tensor) and frame_tensors.ndim == 4:
+            if frame_tensors.shape[0] == 0:
+                return [], []
+            processed = transform(frame_tensors)
+        else:
+            processed_tensors = []
+            for tensor in frame_tensors:
+                if tensor is None:
+                    raise ValueError("tensor in frame_tensors is None")
+                tensor = transform(tensor)
+                processed_tensors.append(tensor)
+            if not processed_tensors:
+                return [], []
+            processed = torch.stack(processed_tensors, dim=0)
+        processed = processed.to(self.device)
         all_preds: list[int] = []
         all_probs: list[float] = []
-        for i in range(0, len(processed_tensors), batch):
-            batch_tensors = processed_tensors[i : i + batch]
-            batch_tensor = torch.stack(batch_tensors, dim=0)
-            with torch.no_grad():
+        for i in range(0, processed.shape[0], batch):
+            batch_tensor = processed[i : i + batch].contiguous(memory_format=torch.channels_last)
+            started = time.perf_counter()
+            with torch.inference_mode():
                 logits = self.model(batch_tensor)
                 probs = torch.softmax(logits, dim=1)[:, 1]
                 preds = torch.argmax(logits, dim=1).tolist()
                 prob_list = probs.tolist()
+            self.last_batch_timings.append(
+                (int(batch_tensor.shape[0]), time.perf_counter() - started)
+            )
             all_preds.extend(int(p) for p in preds)
             all_probs.extend(float(p) for p in prob_list)
         return all_preds, all_probs
@@ -69,33 +129,39 @@ class Classify:
     @staticmethod
     def fix_class_prob(class_list, prob_list, class_index):
         """
-        功能：修正分类-概率序列
+        功能：修正分类-概率序列（原地修改并返回）
+        - class_index 之前的非 0 帧改为 0，概率取其前面最近的 0 帧的概率（没有则 0.6）
+        - class_index 之后的非 1 帧改为 1，概率取其后面最近的 1 帧的概率（没有则 0.6）
+        “最近的帧”都按修正前的序列查找。
         """
         n = len(class_list)
-        # 向前遍历，从 class_index-1 到 0
-        for i in range(class_index - 1, -1, -1):
-            if class_list[i] != 0:
-                # 向前搜索最近的0的概率
-                found_prob = 0.6
-                for j in range(i - 1, -1, -1):
-                    if class_list[j] == 0:
-                        found_prob = prob_list[j]
-                        break
-                class_list[i] = 0
-                prob_list[i] = found_prob
-        
-        # 向后遍历，从 class_index+1 到 n-1
-        for i in range(class_index + 1, n):
-            if class_list[i] != 1:
-                # 向后搜索最近的1的概率
-                found_prob = 0.6
-                for j in range(i + 1, n):
-                    if class_list[j] == 1:
-                        found_prob = prob_list[j]
-                        break
-                class_list[i] = 1
-                prob_list[i] = found_prob
-        
+        if n == 0:
+            return class_list, prob_list
+        classes = np.asarray(class_list)
+        probs = np.asarray(prob_list, dtype=np.float64)[:n]
+        positions = np.arange(n)
+        fixed_probs = probs.copy()
+
+        # 向前：每帧之前最近的 0 帧
+        prev_zero = np.maximum.accumulate(np.where(classes == 0, positions, -1))
+        prev_zero = np.concatenate(([-1], prev_zero[:-1]))
+        before = (positions < class_index) & (classes != 0)
+        fixed_probs[before] = np.where(
+            prev_zero[before] >= 0, probs[np.maximum(prev_zero[before], 0)], 0.6
+        )
+
+        # 向后：每帧之后最近的 1 帧
+        next_one = np.minimum.accumulate(np.where(classes == 1, positions, n)[::-1])[::-1]
+        next_one = np.concatenate((next_one[1:], [n]))
+        after = (positions > class_index) & (classes != 1)
+        fixed_probs[after] = np.where(
+            next_one[after] < n, probs[np.minimum(next_one[after], n - 1)], 0.6
+        )
+
+        changed = np.flatnonzero(before | after)
+        for i in changed.tolist():
+            class_list[i] = 0 if before[i] else 1
+            prob_list[i] = float(fixed_probs[i])
         return class_list, prob_list
 
     @staticmethod
@@ -105,36 +171,163 @@ class Classify:
         """
        
         ############# 找关键插入帧 START  #############
-        required_count = 0.9 * judge_wnd
-        
-        # 阈值列表，从大到小排列
-        thresholds = [0.9, 0.8, 0.7, 0.6]
-        insert_frame_index = -1
-        
-        for i in range(len(prob_list) - judge_wnd + 1):
-            wnd_probs = prob_list[i:i + judge_wnd]
-            wnd_classes = class_list[i:i + judge_wnd]
-            
-            # 计算当前窗口内 `class=1` 的帧数
-            count = sum(1 for j in range(judge_wnd) if wnd_classes[j] == 1)
-            
-            if count >= required_count:
-                # 遍历各个阈值
-                for threshold in thresholds:
-                    # 寻找连续5帧 `class=1` 且概率 > 阈值
-                    for k in range(judge_wnd - 4):
-                        if all(wnd_classes[k + l] == 1 and wnd_probs[k + l] > threshold for l in range(5)):
-                            insert_frame_index = i + k
-                            break
-                    if insert_frame_index != -1:
-                        break
-                if insert_frame_index != -1:
-                    break
-        if insert_frame_index == -1:
-            insert_frame_index = 0
+        match = _first_insert_match(class_list, prob_list, judge_wnd)
+        insert_frame_index = match[0] + match[1] if match is not None else 0
         ############# 找关键插入帧 END  #############
         
         # 分类序列修正 
         Classify.fix_class_prob(class_list, prob_list, insert_frame_index)
         
         return insert_frame_index
+
+
+def _first_insert_match(class_list, prob_list, judge_wnd: int = 20) -> tuple[int, int] | None:
+    """
+        找第一个满足插入条件的窗口，返回 (窗口起点 i, 窗口内偏移 k)，没有则返回 None。
+        条件：窗口内 class=1 的帧数 >= 0.9 * judge_wnd，且窗口内（起点在 [i, i + judge_wnd - 5]）
+        存在连续 5 帧 class=1 且概率 > 阈值；阈值按 INSERT_PROB_THRESHOLDS 从大到小尝试，
+        k 取第一个命中阈值下最靠前的起点。前缀和实现，O(n * 阈值数)。
+    """
+    n = len(prob_list)
+    last_start = judge_wnd - 5
+    if judge_wnd < 5 or n < judge_wnd:
+        return None
+    ones = np.asarray(class_list[:n]) == 1
+    probs = np.asarray(prob_list, dtype=np.float64)
+    positions = np.arange(n - 4)
+
+    count_prefix = np.concatenate(([0], np.cumsum(ones)))
+    wnd_counts = count_prefix[judge_wnd:] - count_prefix[:-judge_wnd]
+    qualified = wnd_counts >= 0.9 * judge_wnd
+
+    # 每个阈值下：从每个位置起，最近的“连续 5 帧达标”起点
+    next_runs = []
+    for threshold in INSERT_PROB_THRESHOLDS:
+        good_prefix = np.concatenate(([0], np.cumsum(ones & (probs > threshold))))
+        run_start = (good_prefix[5:] - good_prefix[:-5]) == 5
+        next_run = np.minimum.accumulate(np.where(run_start, positions, n)[::-1])[::-1]
+        next_runs.append(next_run)
+
+    windows = np.arange(n - judge_wnd + 1)
+    earliest = np.minimum.reduce(next_runs)
+    matched = qualified & (earliest[windows] <= windows + last_start)
+    hits = np.flatnonzero(matched)
+    if hits.size == 0:
+        return None
+    i = int(hits[0])
+    for next_run in next_runs:
+        if next_run[i] <= i + last_start:
+            return i, int(next_run[i]) - i
+    return None
+
+
+class InsertionFrameSearch:
+    """
+        流式插入帧搜索：按顺序喂入分类结果，每次只检查新凑满的 judge_wnd 窗口，
+        判定规则与 Classify.find_first_inserted_frame 相同。
+        找到插入帧后再多收 post_roll 个结果（供 fix_class_prob 修正使用）即 done，
+        之后的裁剪无需再分类。对收集到的前缀调用 find_first_inserted_frame 与对完整序列调用结果一致。
+    """
+
+    def __init__(self, judge_wnd: int = 20, post_roll: int = 30) -> None:
+        if judge_wnd < 5:
+            raise ValueError("judge_wnd must be >= 5")
+        if post_roll < 0:
+            raise ValueError("post_roll must be non-negative")
+        self.judge_wnd = int(judge_wnd)
+        self.post_roll = int(post_roll)
+        self.class_list: list[int] = []
+        self.prob_list: list[float] = []
+        self.insert_frame_index: int | None = None
+        self._confirmed_at = 0
+        self._next_window = 0
+
+    def update(self, preds: list[int], probs: list[float]) -> bool:
+        """追加一批分类结果，返回是否已经可以停止分类"""
+        self.class_list.extend(preds)
+        self.prob_list.extend(probs)
+        end = len(self.class_list)
+        if self.insert_frame_index is None and self._next_window + self.judge_wnd <= end:
+            # 只检查新凑满的窗口
+            start = self._next_window
+            match = _first_insert_match(
+                self.class_list[start:], self.prob_list[start:end], self.judge_wnd
+            )
+            if match is not None:
+                self.insert_frame_index = start + match[0] + match[1]
+                self._confirmed_at = start + match[0] + self.judge_wnd
+            self._next_window = end - self.judge_wnd + 1
+        return self.done
+
+    @property
+    def done(self) -> bool:
+        return (
+            self.insert_frame_index is not None
+            and len(self.class_list) >= self._confirmed_at + self.post_roll
+        )
+
+
+class ClassifyCascade:
+    """
+        两级分类级联（按顺序逐块调用 predict）：
+        1. 粗筛：所有裁剪以 coarse_size 分辨率分类
+        2. 精分：只有粗筛类别发生跳变的位置前后 margin 个裁剪、以及粗筛置信度低于 confident 的裁剪，
+           才用 384 全分辨率重新分类并覆盖粗筛结果
+        confident 应高于插入帧判定的所有概率阈值（INSERT_PROB_THRESHOLDS），
+        这样保留下来的粗筛结果不会改变“连续 5 帧概率 > 阈值”的判定。
+        跳变靠近块末尾时，剩余的精分范围顺延到下一块的开头。
+    """
+
+    def __init__(
+        self,
+        classifier: Classify,
+        coarse_size: int = 192,
+        margin: int = 8,
+        confident: float = 0.95,
+    ) -> None:
+        if coarse_size <= 0:
+            raise ValueError("coarse_size must be positive")
+        if margin < 0:
+            raise ValueError("margin must be non-negative")
+        self.classifier = classifier
+        self.coarse_size = int(coarse_size)
+        self.margin = int(margin)
+        self.confident = float(confident)
+        self.coarse_count = 0
+        self.fine_count = 0
+        self._last_class: int | None = None
+        self._carry = 0
+
+    def predict(self, frame_tensors) -> tuple[list[int], list[float]]:
+        preds, probs = self.classifier.predict_images(frame_tensors, input_size=self.coarse_size)
+        n = len(preds)
+        if n == 0:
+            return preds, probs
+        self.coarse_count += n
+
+        classes = np.asarray(preds)
+        prob_1 = np.asarray(probs, dtype=np.float64)
+        refine = np.where(classes == 1, prob_1, 1.0 - prob_1) < self.confident
+        refine[: min(self._carry, n)] = True
+
+        transitions = np.flatnonzero(classes[1:] != classes[:-1]) + 1
+        if self._last_class is not None and int(classes[0]) != self._last_class:
+            transitions = np.concatenate(([0], transitions))
+        for j in transitions.tolist():
+            refine[max(0, j - self.margin) : j + self.margin] = True
+        self._carry = max(0, int(transitions[-1]) + self.margin - n) if transitions.size else 0
+        self._last_class = int(classes[-1])
+
+        indices = np.flatnonzero(refine)
+        if indices.size == 0:
+            return preds, probs
+        if isinstance(frame_tensors, torch.Tensor):
+            subset = frame_tensors[torch.as_tensor(indices, device=frame_tensors.device)]
+        else:
+            subset = [frame_tensors[i] for i in indices.tolist()]
+        fine_preds, fine_probs = self.classifier.predict_images(subset)
+        self.fine_count += len(fine_preds)
+        for i, pred, prob in zip(indices.tolist(), fine_preds, fine_probs):
+            preds[i] = pred
+            probs[i] = prob
+        return preds, probs
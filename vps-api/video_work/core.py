@@ -1,26 +1,28 @@
-from typing import Callable, Optional
+from contextlib import closing
+from typing import Callable, Optional, Sequence
+import numpy as np
+from numpy.typing import NDArray
 from pydantic import BaseModel
 from video_work.detect.detect import Detect
-from video_work.classify.classify import Classify
-from video_work.segment.segment import Segment
-from video_work.paint import (
-    draw_box_on_frame, 
-    overlay_crop_mask_on_frame, 
-    square_crop_with_origin
-)
+from video_work.detect.backends import DetectBackendName
+from video_work.classify.classify import Classify, ClassifyCascade, InsertionFrameSearch
+from video_work.segment.segment import Segment, SegmentMode
+from video_work.paint import composite_frame
+from video_work.boxes import BOX_SIDE
 from video_work.tools import (
     save_frames2video,
     get_device,
-    frames2tensors,
-    make_group_square_annotations,
-    get_coord_mask,
-    extract_video_frames,
-    get_detect_box_sacle
+    square_crops2tensor,
+    make_group_square_boxes,
+    get_detect_box_sacle,
+    VideoFrameSource,
 )
+from video_work.pipeline import prefetch
 from video_work.speed import (
-    get_coord_min_rect_len,
+    PEAK_FIT_RADIUS,
     fix_to_monotonic_decreasing, 
-    calc_speed
+    calc_speed,
+    calc_speed_batch,
 )
 
 
@@ -31,28 +33,248 @@ class AnalysisOutput(BaseModel):
     instantaneous_speed_indexes: list[int]
     predict_start: int
     predict_end: int
+    # 测速的原始输入，保存后可用 estimate_speed 以不同参数重新计算速度
+    origin_lens: list[float] = []
+    insert_frame_index: int = 0
+    fps: float = 0.0
+    # 已分割帧的上界（不含）：按需分割停止后其余帧长度为 0；None 表示全部帧都已分割
+    segmented_until: int | None = None
+
+
+def default_speed_window(fps: float) -> tuple[int, int]:
+    """按帧率选择测速窗口和步长：60fps -> (60, 30)，否则 (30, 15)"""
+    return (60, 30) if fps >= 60 else (30, 15)
+
+
+class SpeedParams(BaseModel):
+    """一组测速参数；swin / step 为 None 时按帧率选择"""
+    swin: int | None = None
+    step: int | None = None
+    end_ratio: float = 0.5  # 长度降到起始长度的该比例以下时作为结束点
+    init_speed_sample_points: int = 5
+    peak_outlier_threshold: float = 2.0  # 峰值修正的 MAD 离群阈值
+    speed_outlier_threshold: float = 3.5  # 瞬时速度的 MAD 离群阈值
+
+
+def _find_end_points(lens: Sequence[float], end_ratios: Sequence[float]) -> list[int | None]:
+    """
+        单调递减的长度序列中，第一个不大于 lens[0] * end_ratio 的下标（从 1 开始找），
+        找不到或起始长度为 0 时为 None（对应 predict_end = predict_start + 1、floor_idx = peak_idx）
+    """
+    arr = np.asarray(lens, dtype=np.float64)
+    ratios = np.asarray(end_ratios, dtype=np.float64)
+    if arr.size < 2 or arr[0] <= 0:
+        return [None] * ratios.size
+    hit = arr[None, 1:] <= (arr[0] * ratios)[:, None]
+    first = np.argmax(hit, axis=1) + 1
+    return [int(i) if found else None for i, found in zip(first, hit.any(axis=1))]
+
+
+def _segmented_end_reached(
+    lens_prefix: Sequence[float],
+    swin: int,
+    end_ratio: float = 0.5,
+    peak_outlier_threshold: float = 2.0,
+) -> bool:
+    """
+        按需分割的停止条件。lens_prefix 为从插入帧开始、已完整分割的长度前缀，
+        对其重跑 estimate_speed 的峰值修正与结束点查找（与全量序列使用同一个峰值估计），
+        峰值拟合窗口已完整、且结束点之后已多分割 swin 帧时返回 True。
+        此后的帧只要不超过当前峰值，全量分割得到的结束点与速度与此一致。
+    """
+    lens, peak_idx = fix_to_monotonic_decreasing(
+        [float(v) for v in lens_prefix], outlier_threshold=peak_outlier_threshold
+    )
+    (end_idx,) = _find_end_points(lens, [end_ratio])
+    return (
+        end_idx is not None
+        and len(lens) > peak_idx + PEAK_FIT_RADIUS
+        and len(lens) > end_idx + swin
+    )
+
+
+def _speed_output(
+    end_idx: int | None,
+    insert_frame_index: int,
+    swin: int,
+    step: int,
+    speed: tuple[float, float, list[float]],
+) -> AnalysisOutput:
+    init_speed, avg_speed, instantaneous_speeds = speed
+    predict_start = insert_frame_index
+    predict_end = predict_start + (end_idx if end_idx is not None else 1)
+    return AnalysisOutput(
+        init_speed=float(init_speed),
+        avg_speed=float(avg_speed),
+        instantaneous_speeds=[float(v) for v in instantaneous_speeds],
+        instantaneous_speed_indexes=[
+            int(predict_start + i * step + swin // 2)
+            for i in range(len(instantaneous_speeds))
+        ],
+        predict_start=int(predict_start),
+        predict_end=int(predict_end),
+    )
+
+
+def estimate_speed(
+    origin_lens: Sequence[float],
+    insert_frame_index: int,
+    fps: float,
+    swin: int | None = None,
+    step: int | None = None,
+    end_ratio: float = 0.5,
+    init_speed_sample_points: int = 5,
+    peak_outlier_threshold: float = 2.0,
+    speed_outlier_threshold: float = 3.5,
+) -> AnalysisOutput:
+    """
+        由逐帧针梗长度序列计算速度（不涉及视频和模型，毫秒级）。
+        origin_lens 为每帧的分割长度，insert_frame_index 为（已调整的）刺入帧；
+        其余参数见 SpeedParams。多组参数请用 estimate_speed_sweep。
+    """
+    default_swin, default_step = default_speed_window(fps)
+    swin = default_swin if swin is None else int(swin)
+    step = default_step if step is None else int(step)
+
+    # 优化长度（从insert_frame_index开始取帧，并做单调递减处理）
+    lens, peak_idx = fix_to_monotonic_decreasing(
+        [float(v) for v in origin_lens[insert_frame_index:]],
+        outlier_threshold=peak_outlier_threshold,
+    )
+    # 寻找floor_idx（长度剩余 end_ratio，默认1/2 时作为结束点）
+    (end_idx,) = _find_end_points(lens, [end_ratio])
+    floor_idx = peak_idx if end_idx is None else end_idx
+    # 计算速度 
+    speed = calc_speed(
+        lens,
+        (0, int(floor_idx)),
+        fps=fps,
+        swin=swin, 
+        step=step,
+        init_speed_sample_points = init_speed_sample_points,
+        outlier_threshold=speed_outlier_threshold,
+    )
+    out = _speed_output(end_idx, insert_frame_index, swin, step, speed)
+    out.origin_lens = [float(v) for v in origin_lens]
+    out.insert_frame_index = int(insert_frame_index)
+    out.fps = float(fps)
+    return out
+
+
+def estimate_speed_sweep(
+    origin_lens: Sequence[float],
+    insert_frame_index: int,
+    fps: float,
+    params: Sequence[SpeedParams],
+) -> list[AnalysisOutput]:
+    """
+        一次计算多组测速参数的结果（与逐组调用 estimate_speed 相同，输出不含 origin_lens）。
+        峰值修正按 peak_outlier_threshold 分组只做一次，结束点对所有 end_ratio 向量化查找，
+        同一结束点的参数交给 calc_speed_batch 共用平滑和长度差。
+    """
+    default_swin, default_step = default_speed_window(fps)
+    resolved = [
+        (
+            default_swin if p.swin is None else int(p.swin),
+            default_step if p.step is None else int(p.step),
+        )
+        for p in params
+    ]
+    results: list[AnalysisOutput | None] = [None] * len(params)
+
+    by_peak: dict[float, list[int]] = {}
+    for i, p in enumerate(params):
+        by_peak.setdefault(float(p.peak_outlier_threshold), []).append(i)
+
+    for peak_threshold, rows in by_peak.items():
+        lens, peak_idx = fix_to_monotonic_decreasing(
+            [float(v) for v in origin_lens[insert_frame_index:]],
+            outlier_threshold=peak_threshold,
+        )
+        end_idxs = _find_end_points(lens, [params[i].end_ratio for i in rows])
+
+        by_floor: dict[int, list[tuple[int, int | None]]] = {}
+        for i, end_idx in zip(rows, end_idxs):
+            floor_idx = peak_idx if end_idx is None else end_idx
+            by_floor.setdefault(int(floor_idx), []).append((i, end_idx))
+
+        for floor_idx, items in by_floor.items():
+            speeds = calc_speed_batch(
+                lens,
+                (0, floor_idx),
+                [
+                    (
+                        resolved[i][0],
+                        resolved[i][1],
+                        params[i].init_speed_sample_points,
+                        params[i].speed_outlier_threshold,
+                    )
+                    for i, _ in items
+                ],
+                fps=fps,
+            )
+            for (i, end_idx), speed in zip(items, speeds):
+                swin, step = resolved[i]
+                results[i] = _speed_output(end_idx, insert_frame_index, swin, step, speed)
+    return results
 
 
 def analyse_video(
     video_path: str, 
     temp_save_path: str,
-    status_callback: Optional[Callable[[dict], None]] = None
+    status_callback: Optional[Callable[[dict], None]] = None,
+    frame_window: int = 32,
+    detect_batch_size: int = 16,
+    detect_max_side: int | None = None,
+    detect_interval: int | None = 1,
+    detect_backend: DetectBackendName = "torch",
+    detect_track_max_interval: int = 0,
+    classify_post_roll: int = 30,
+    classify_cascade: bool = False,
+    quantize: bool = False,
+    segment_all: bool | None = None,
+    segment_batch_size: int | None = None,
+    segment_mode: SegmentMode = "slide",
+    save_video: bool = True,
 ) -> AnalysisOutput:
+    """
+        视频分析主流程。视频帧以流的方式多次遍历（检测 -> 裁剪 -> 渲染），
+        不再整段驻留内存；frame_window 控制每次解码/推理的帧窗口大小，
+        detect_batch_size 控制 YOLO 每批推理的帧数。
+        detect_max_side 不为空时检测在缩小后的代理帧上进行（检测框为归一化坐标，如 640），
+        裁剪/分类/分割/渲染仍使用原始分辨率的帧；默认 None 在原始分辨率上检测。
+        detect_interval 为关键帧检测间隔（默认 1 逐帧检测；None 时按帧率自动选择，30fps -> 2，60fps -> 4），
+        关键帧之间的检测框由插值得到，关键帧不一致时自动逐帧补检测。
+        detect_track_max_interval > 0 时改用跟踪模式（替代关键帧插值），
+        检测到针后用模板跟踪逐帧传播检测框，跟丢或连续跟踪该帧数后才重新检测。
+        detect_backend 选择检测推理后端（torch / onnx / openvino），每个后端各自缓存一个 Detect 实例。
+        分类按顺序流式进行，插入帧确认后再分类 classify_post_roll 个裁剪即停止。
+        分割按需进行：从插入帧开始，长度降到修正后峰值（与 estimate_speed 相同）的一半以下并多分割一个测速窗口后停止。
+        segment_all 为 True 时分割全部裁剪；为 None 时取 save_video，即生成标注视频时分割全部裁剪
+        （每帧都有掩码），只测速时才按需分割。
+        segment_batch_size 为分割滑窗瓦片的跨帧批大小（None 时使用 Segment.batch_size）。
+        segment_mode 为分割推理模式（slide / whole / auto，见 Segment.predict_images）。
+        save_video 为 False 时不生成标注视频（temp_save_path 不会被写入），
+        分割器只输出长度（与多边形模式的长度一致），省去多边形输出和掩码绘制。
+        quantize 为 True 时分类、分割使用 INT8 动态量化模型（CPU）。
+        classify_cascade 为 True 时先低分辨率粗筛，只对类别跳变附近和低置信度的裁剪做全分辨率分类。
+        每一遍都是有界队列串起来的流水线：解码、裁剪/张量转换在后台线程执行，
+        与主线程上的模型推理、视频写出并发进行。
+    """
     
     # 初始化模型
-    detector = Detect()
-    classifier = Classify()
-    segmenter = Segment()
+    detector = Detect(backend=detect_backend)
+    classifier = Classify(quantize=quantize)
+    segmenter = Segment(quantize=quantize)
     if status_callback:
         try:
             status_callback({"status": "PROCESSING"})
         except Exception:
             pass
     
-    # 提取视频帧
-    video = extract_video_frames(video_path)
-    frames = video["frames"]
-    meta = video["meta"]
+    # 打开视频帧源（只读元信息，不解码全部帧）
+    source = VideoFrameSource(video_path, window=frame_window)
+    meta = source.meta
     fps = int(meta["fps"])
     if fps >= 60:
         wnd_size = 150
@@ -60,39 +282,94 @@ def analyse_video(
     else:
         wnd_size = 90
         step = 30
-    # 预测检测框
-    detect_norm_annotation = detector.predict_images(frames, int(meta["width"]), int(meta["height"]))
+    if detect_interval is None:
+        detect_interval = max(1, fps // 15)
+    # 预测检测框（在代理帧上检测）
+    detect_source = source.proxy(detect_max_side) if detect_max_side else source
+    detect_boxes = detector.predict_boxes(
+        prefetch(detect_source, maxsize=frame_window, name="decode"),
+        int(detect_source.meta["width"]),
+        int(detect_source.meta["height"]),
+        batch_size=detect_batch_size,
+        interval=1 if detect_track_max_interval > 0 else detect_interval,
+        track_max_interval=detect_track_max_interval,
+    )
+    # 检测遍历结束后 meta["frame_count"] 已修正为实际解码帧数
+    frame_count = len(detect_source)
     # 优化检测框（扩大为正方形）
-    annotations_per_frame = Detect.optimize_detect_norm_annotation(
-        detect_norm_annotation,
+    frame_boxes = Detect.optimize_detect_boxes(
+        detect_boxes,
         wnd_size=wnd_size, 
         step=step,
         box_scale = get_detect_box_sacle(int(meta["width"]), int(meta["height"]))
     )
     group_size = 30
-    group_square_annotations = make_group_square_annotations(
-        annotations_per_frame,
+    group_square_boxes = make_group_square_boxes(
+        frame_boxes,
         group_size=group_size,
         image_size=(int(meta["width"]), int(meta["height"])),
     )
 
-    # 裁剪图片（用于后续分类和分割）
-    crop_items: list[tuple[int, object, int, int]] = []
-    crop_frames = []
-    for frame_idx, (frame, frame_anns) in enumerate(zip(frames, group_square_annotations)):
-        for ann in frame_anns:
-            out = square_crop_with_origin(frame, ann)
+    # 裁剪图片（用于后续分类和分割）：解码 -> 裁剪/转张量 -> 分类+分割 三级流水线
+    device = get_device()
+
+    def iter_crop_chunks(start_frame: int = 0):
+        # 同组（BOX_SIDE 相同）的裁剪一次性写入一个预分配的 NCHW 张量；start_frame 之前的帧只解码不裁剪
+        pending: list[tuple[int, NDArray[np.uint8], NDArray[np.float32]]] = []
+
+        def flush():
+            out = square_crops2tensor(
+                [frame for _, frame, _ in pending], [box for _, _, box in pending], device
+            )
             if out is None:
+                return None
+            batch, origins = out
+            side = int(batch.shape[-1])
+            items = [
+                (pending[index][0], (side, side, 3), origin_x, origin_y)
+                for index, origin_x, origin_y in origins
+            ]
+            return items, batch
+
+        frames = prefetch(source, maxsize=frame_window, name="decode")
+        for frame_idx, frame in enumerate(frames):
+            if frame_idx >= len(group_square_boxes):
+                break
+            if frame_idx < start_frame:
                 continue
-            crop, origin_x, origin_y = out
-            crop_items.append((frame_idx, crop, origin_x, origin_y))
-            crop_frames.append(crop)
+            for box in group_square_boxes.rows(frame_idx):
+                if pending and (
+                    len(pending) >= frame_window or pending[-1][2][BOX_SIDE] != box[BOX_SIDE]
+                ):
+                    chunk = flush()
+                    pending = []
+                    if chunk is not None:
+                        yield chunk
+                pending.append((frame_idx, frame, box))
+        if pending:
+            chunk = flush()
+            if chunk is not None:
+                yield chunk
+
+    # 第一遍：流式分类，插入帧确认并收满 post-roll 后提前结束
+    crop_count = 0
+    preds: list[int] = []
+    probs: list[float] = []
+    insertion_search = InsertionFrameSearch(post_roll=classify_post_roll)
+    classify_chunk = (
+        ClassifyCascade(classifier).predict if classify_cascade else classifier.predict_images
+    )
+    with closing(prefetch(iter_crop_chunks(), maxsize=2, name="crop")) as chunks:
+        for chunk_items, chunk_tensors in chunks:
+            crop_count += len(chunk_items)
+            chunk_preds, chunk_probs = classify_chunk(chunk_tensors)
+            preds.extend(chunk_preds)
+            probs.extend(chunk_probs)
+            if insertion_search.update(chunk_preds, chunk_probs):
+                break
 
-    if not crop_frames:
+    if crop_count == 0:
         raise RuntimeError("no crop_frames generated")
-    frame_tensors = frames2tensors(crop_frames, get_device())
-    # 预测分类
-    preds, probs = classifier.predict_images(frame_tensors)
     # 识别到“刺入帧”
     insert_frame_index = Classify.find_first_inserted_frame(
         class_list=preds,
@@ -101,95 +378,77 @@ def analyse_video(
     # print(f"insert_frame_index: {insert_frame_index}")
     insert_frame_index = insert_frame_index - 4 if insert_frame_index >= 4 else 0
     # print(f"insert_frame_index 调整后: {insert_frame_index}")
-    
-    # 预测分割
-    seg_results = segmenter.predict_images(frame_tensors, conf_thres=0.5)
 
-    # 计算分割长度
-    origin_lens: list[float] = [0.0 for _ in range(len(frames))]
-
-    for (frame_idx, _crop, _origin_x, _origin_y), seg in zip(crop_items, seg_results):
-        max_len = 0.0
-        for det in seg:
-            segments = det.get("segments")
-            if not segments:
+    if segment_all is None:
+        segment_all = save_video
+    # 第二遍：按需分割。从插入帧开始向后，单调长度降到修正后峰值的一半以下、再多分割一个测速窗口后停止
+    speed_swin, _ = default_speed_window(meta["fps"])
+    origin_lens: list[float] = [0.0 for _ in range(frame_count)]
+    crop_items: list[tuple[int, tuple[int, ...], int, int]] = []
+    seg_results: list[list[dict]] = []
+    seg_start = 0 if segment_all else insert_frame_index
+    segmented_until = frame_count
+    with closing(prefetch(iter_crop_chunks(seg_start), maxsize=2, name="crop")) as chunks:
+        for chunk_items, chunk_tensors in chunks:
+            chunk_seg = segmenter.predict_images(
+                chunk_tensors,
+                mode=segment_mode,
+                conf_thres=0.5,
+                batch=segment_batch_size,
+                output="polygon" if save_video else "length",
+            )
+            if save_video:
+                crop_items.extend(chunk_items)
+                seg_results.extend(chunk_seg)
+            # 分割长度（最小外接矩形长边）由分割器直接给出
+            for (frame_idx, _crop_shape, _origin_x, _origin_y), seg in zip(chunk_items, chunk_seg):
+                max_len = max((det["length"] for det in seg), default=0.0)
+                origin_lens[int(frame_idx)] = max(origin_lens[int(frame_idx)], max_len)
+            if segment_all:
                 continue
-            max_len = max(max_len, get_coord_min_rect_len(segments))
-        origin_lens[int(frame_idx)] = max(origin_lens[int(frame_idx)], max_len)
-
-    # 优化长度（从insert_frame_index开始取帧，并做单调递减处理）
-    lens, peak_idx = fix_to_monotonic_decreasing(origin_lens[insert_frame_index:])
-    floor_idx = peak_idx
-    predict_start = insert_frame_index 
-
-    # 寻找floor_idx
-    start_len = float(lens[0]) if lens else 0.0
-    threshold_len = start_len / 2.0   # 长度剩余1/2时 作为结束点
-    predict_end = predict_start + 1
-    if start_len > 0:
-        for i in range( 1,  + len(lens)):
-            end_len = float(lens[i])
-            if end_len <= threshold_len:
-                floor_idx = i
-                predict_end = predict_start + i
+            # 最后一帧的裁剪可能延续到下一块，只用已完整分割的帧判断是否可以停止
+            last_frame = int(chunk_items[-1][0])
+            if _segmented_end_reached(origin_lens[seg_start:last_frame], speed_swin):
+                segmented_until = last_frame
                 break
-    # TODO: 计算速度的窗口改为 前端可配置
-    # 计算速度 
-    speed_swin=60 if meta["fps"] >= 60 else 30
-    speed_step=30 if meta["fps"] >= 60 else 15
-    init_speed, avg_speed, instantaneous_speeds = calc_speed(
-        lens,
-        (0, int(floor_idx)),
-        fps=meta["fps"],
-        swin=speed_swin, 
-        step=speed_step,
-        init_speed_sample_points = 5
-    )
 
-    instantaneous_speed_indexes = [
-        int(predict_start + i * speed_step + speed_swin // 2)
-        for i in range(len(instantaneous_speeds))
-    ]
+    out = estimate_speed(origin_lens, insert_frame_index, meta["fps"])
+    out.segmented_until = int(segmented_until)
 
     # 保存分析视频（包含检测框和分割掩码）
-    frames_with_boxes = []
-    for frame, anns in zip(frames, annotations_per_frame):
-        drawn = draw_box_on_frame(frame, anns)
-        frames_with_boxes.append(drawn)
-
-    frames_with_masks = [f.copy() for f in frames_with_boxes]
-    for (frame_idx, crop, origin_x, origin_y), seg in zip(crop_items, seg_results):
-        for det in seg:
-            segments = det.get("segments")
-            if not segments:
-                continue
-            mask_crop = get_coord_mask(crop.shape, segments, color=(255, 255, 0))
-            overlay_crop_mask_on_frame(
-                frames_with_masks[frame_idx],
-                mask_crop,
-                origin_x=origin_x,
-                origin_y=origin_y,
-                alpha=0.35,
-            )
+    if save_video:
+        masks_per_frame: dict[int, list[tuple[tuple[int, ...], int, int, list]]] = {}
+        for (frame_idx, crop_shape, origin_x, origin_y), seg in zip(crop_items, seg_results):
+            for det in seg:
+                segments = det.get("segments")
+                if segments is None or len(segments) == 0:
+                    continue
+                masks_per_frame.setdefault(frame_idx, []).append(
+                    (crop_shape, origin_x, origin_y, segments)
+                )
 
+        def render_frames():
+            frames = prefetch(source, maxsize=frame_window, name="decode")
+            for frame_idx, frame in enumerate(frames):
+                if frame_idx >= len(frame_boxes):
+                    break
+                # 解码出的帧只被渲染一次，直接在原帧上合成后交给编码器
+                yield composite_frame(
+                    frame,
+                    frame_boxes.rows(frame_idx),
+                    masks_per_frame.pop(frame_idx, ()),
+                    color=(255, 255, 0),
+                    alpha=0.35,
+                )
 
-    # 保存视频到临时目录
-    save_frames2video(
-        frames = frames_with_masks,
-        output_path = temp_save_path ,
-        fps = int(meta["fps"]),
-        size = (int(meta["width"]), int(meta["height"])),
-    )
-
+        # 保存视频到临时目录（逐帧渲染、逐帧写出）
+        save_frames2video(
+            frames = prefetch(render_frames(), maxsize=frame_window, name="render"),
+            output_path = temp_save_path ,
+            fps = int(meta["fps"]),
+            size = (int(meta["width"]), int(meta["height"])),
+        )
 
-    out = AnalysisOutput(
-        init_speed=float(init_speed),
-        avg_speed=float(avg_speed),
-        instantaneous_speeds=[float(v) for v in instantaneous_speeds],
-        instantaneous_speed_indexes=instantaneous_speed_indexes,
-        predict_start=int(predict_start),
-        predict_end=int(predict_end),
-    )
     if status_callback:
         try:
             status_callback({"status": "COMPLETED"})
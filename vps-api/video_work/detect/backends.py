@@ -0,0 +1,210 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Literal, Protocol, Sequence
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+"""
+    YOLO 检测后端。所有后端都接收一批 BGR 帧，返回每帧一个 (M, 6) float32 数组
+    [x1, y1, x2, y2, conf, cls]（原图像素坐标）。
+    - torch：Ultralytics + PyTorch eager（可用 GPU）
+    - onnx：首次使用时把 .pt 导出为 .onnx 并缓存在权重旁边，用 onnxruntime 在 CPU 上推理
+    - openvino：同一个 .onnx，优先走 onnxruntime 的 OpenVINOExecutionProvider
+    onnx/openvino 推理时不导入 Ultralytics（只有导出缓存不存在或过期时才需要）。
+"""
+
+__all__ = [
+    "DetectBackendName",
+    "DetectBackend",
+    "TorchDetectBackend",
+    "OnnxDetectBackend",
+    "create_detect_backend",
+    "export_onnx",
+]
+
+DetectBackendName = Literal["torch", "onnx", "openvino"]
+
+# 与 Ultralytics predict 的默认值保持一致
+DEFAULT_IMGSZ = 640
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+DEFAULT_MAX_DET = 300
+
+
+class DetectBackend(Protocol):
+    def predict(self, batch: Sequence[NDArray[np.uint8]]) -> List[NDArray[np.float32]]:
+        ...
+
+
+class TorchDetectBackend:
+    def __init__(self, model_path: str) -> None:
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+
+    def predict(self, batch: Sequence[NDArray[np.uint8]]) -> List[NDArray[np.float32]]:
+        import torch
+
+        results = self.model(list(batch), verbose=False)
+        # 整个批次的框拼接后只做一次设备拷贝
+        counts = [len(result.boxes) for result in results]
+        if sum(counts) == 0:
+            return [np.zeros((0, 6), dtype=np.float32) for _ in results]
+        data = torch.cat([result.boxes.data for result in results], dim=0)
+        data = data.float().cpu().numpy()
+        return np.split(data[:, :6], np.cumsum(counts)[:-1])
+
+
+def export_onnx(model_path: str, imgsz: int = DEFAULT_IMGSZ) -> str:
+    """
+        把 .pt 导出为 .onnx（动态 batch），缓存在权重旁边；
+        缓存已存在且不比权重旧时直接返回缓存路径。
+        Ultralytics 总是导出到权重同名的 .onnx，因此先把权重复制到同目录的临时目录里导出，
+        再 os.replace 原子替换，多个 worker 同时导出也不会读到半截文件。
+    """
+    weights = Path(model_path)
+    onnx_path = weights.with_suffix(".onnx")
+    if onnx_path.exists() and onnx_path.stat().st_mtime >= weights.stat().st_mtime:
+        return str(onnx_path)
+
+    from ultralytics import YOLO
+
+    with tempfile.TemporaryDirectory(prefix=weights.name + ".", dir=weights.parent) as tmp_dir:
+        tmp_weights = Path(tmp_dir) / weights.name
+        shutil.copy2(weights, tmp_weights)
+        exported = YOLO(str(tmp_weights)).export(
+            format="onnx", imgsz=imgsz, dynamic=True, simplify=True
+        )
+        os.replace(exported, onnx_path)
+    return str(onnx_path)
+
+
+def _letterbox(
+    frame: NDArray[np.uint8], imgsz: int
+) -> tuple[NDArray[np.uint8], float, float, float]:
+    """等比缩放到 imgsz 并居中填充 114（与 Ultralytics 一致），返回 (图像, 缩放比, 左边距, 上边距)"""
+    height, width = frame.shape[:2]
+    ratio = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    if (new_w, new_h) != (width, height):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x = (imgsz - new_w) / 2.0
+    pad_y = (imgsz - new_h) / 2.0
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    frame = cv2.copyMakeBorder(
+        frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114)
+    )
+    return frame, ratio, float(left), float(top)
+
+
+def _nms(
+    boxes: NDArray[np.float32], scores: NDArray[np.float32], iou_threshold: float
+) -> NDArray[np.int64]:
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep: List[int] = []
+    while order.size > 0:
+        i = int(order[0])
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0.0, None)
+        inter_h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0.0, None)
+        inter = inter_w * inter_h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _decode_raw(
+    pred: NDArray[np.float32], conf_threshold: float, iou_threshold: float, max_det: int
+) -> NDArray[np.float32]:
+    """(4 + nc, A) 原始输出 -> 按类别 NMS 后的 (M, 6) 数组（letterbox 坐标）"""
+    pred = pred.T
+    cls_scores = pred[:, 4:]
+    cls = np.argmax(cls_scores, axis=1)
+    conf = cls_scores[np.arange(cls.size), cls]
+    keep = conf >= conf_threshold
+    if not keep.any():
+        return np.zeros((0, 6), dtype=np.float32)
+    xywh, conf, cls = pred[keep, :4], conf[keep], cls[keep].astype(np.float32)
+    xyxy = np.empty_like(xywh)
+    xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2.0
+    xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2.0
+    # 按类别偏移坐标，使一次 NMS 等价于逐类别 NMS
+    offset = cls[:, None] * 7680.0
+    kept = _nms(xyxy + offset, conf, iou_threshold)[:max_det]
+    return np.concatenate([xyxy[kept], conf[kept, None], cls[kept, None]], axis=1)
+
+
+class OnnxDetectBackend:
+    def __init__(
+        self,
+        model_path: str,
+        providers: Sequence[str] = ("CPUExecutionProvider",),
+        imgsz: int = DEFAULT_IMGSZ,
+        conf_threshold: float = DEFAULT_CONF,
+        iou_threshold: float = DEFAULT_IOU,
+        max_det: int = DEFAULT_MAX_DET,
+    ) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "onnx/openvino detect backend requires onnxruntime (pip install onnxruntime)"
+            ) from e
+
+        if not model_path.endswith(".onnx"):
+            model_path = export_onnx(model_path, imgsz=imgsz)
+        available = set(ort.get_available_providers())
+        chosen = [p for p in providers if p in available] or ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(model_path, providers=chosen)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def predict(self, batch: Sequence[NDArray[np.uint8]]) -> List[NDArray[np.float32]]:
+        if len(batch) == 0:
+            return []
+        tensor = np.empty((len(batch), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        transforms: List[tuple[float, float, float, int, int]] = []
+        for i, frame in enumerate(batch):
+            padded, ratio, pad_x, pad_y = _letterbox(frame, self.imgsz)
+            # BGR HWC uint8 -> RGB CHW float32 [0, 1]
+            tensor[i] = padded[:, :, ::-1].transpose(2, 0, 1)
+            transforms.append((ratio, pad_x, pad_y, frame.shape[1], frame.shape[0]))
+        tensor *= 1.0 / 255.0
+
+        output = self.session.run(None, {self.input_name: tensor})[0]
+        # 端到端模型（已含 NMS）输出 (B, max_det, 6)，普通模型输出 (B, 4 + nc, A)
+        end_to_end = output.shape[-1] == 6 and output.shape[1] != 6
+
+        results: List[NDArray[np.float32]] = []
+        for pred, (ratio, pad_x, pad_y, width, height) in zip(output, transforms):
+            if end_to_end:
+                dets = pred[pred[:, 4] >= self.conf_threshold][: self.max_det]
+            else:
+                dets = _decode_raw(pred, self.conf_threshold, self.iou_threshold, self.max_det)
+            dets = dets.astype(np.float32, copy=True)
+            dets[:, [0, 2]] = np.clip((dets[:, [0, 2]] - pad_x) / ratio, 0.0, width)
+            dets[:, [1, 3]] = np.clip((dets[:, [1, 3]] - pad_y) / ratio, 0.0, height)
+            results.append(dets)
+        return results
+
+
+def create_detect_backend(name: DetectBackendName, model_path: str) -> DetectBackend:
+    if name == "torch":
+        return TorchDetectBackend(model_path)
+    if name == "onnx":
+        return OnnxDetectBackend(model_path)
+    if name == "openvino":
+        return OnnxDetectBackend(
+            model_path, providers=("OpenVINOExecutionProvider", "CPUExecutionProvider")
+        )
+    raise ValueError(f"unknown detect backend: {name}")
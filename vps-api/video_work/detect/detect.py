@@ -1,11 +1,26 @@
 from pathlib import Path
-from typing import Any, Dict, List, Sequence
+from typing import Any, Dict, Iterable, List, Sequence
 
 import numpy as np
 from numpy.typing import NDArray
-from ultralytics import YOLO
 from pydantic import BaseModel, ConfigDict, Field
 
+from video_work.boxes import (
+    BOX_COLUMNS,
+    BOX_CONF,
+    BOX_X1,
+    BOX_X2,
+    BOX_Y1,
+    BOX_Y2,
+    FrameBoxes,
+)
+from video_work.detect.backends import (
+    DetectBackend,
+    DetectBackendName,
+    create_detect_backend,
+)
+from video_work.detect.tracker import TemplateTracker
+
 DEFAULT_MODEL_PATH = str(Path(__file__).resolve().parent / "yolo.pt")
 
 
@@ -37,19 +52,72 @@ class DetectResult(BaseModel):
         return getattr(self, key)
 
 
-class Detect:
-    _instance: "Detect | None" = None
+def _best_box(
+    frame_boxes: NDArray[np.float32], conf_threshold: float
+) -> NDArray[np.float32] | None:
+    valid = frame_boxes[frame_boxes[:, BOX_CONF] >= conf_threshold]
+    if valid.shape[0] == 0:
+        return None
+    return valid[int(np.argmax(valid[:, BOX_CONF]))]
+
+
+def _box_iou(a: NDArray[np.float32], b: NDArray[np.float32]) -> float:
+    inter_w = min(a[BOX_X2], b[BOX_X2]) - max(a[BOX_X1], b[BOX_X1])
+    inter_h = min(a[BOX_Y2], b[BOX_Y2]) - max(a[BOX_Y1], b[BOX_Y1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    area_a = (a[BOX_X2] - a[BOX_X1]) * (a[BOX_Y2] - a[BOX_Y1])
+    area_b = (b[BOX_X2] - b[BOX_X1]) * (b[BOX_Y2] - b[BOX_Y1])
+    union = area_a + area_b - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def _is_consistent(
+    box_0: NDArray[np.float32] | None,
+    box_1: NDArray[np.float32] | None,
+    iou_threshold: float,
+) -> bool:
+    """相邻关键帧是否一致：都没有有效框，或两个最佳框 IoU 足够大"""
+    if box_0 is None and box_1 is None:
+        return True
+    if box_0 is None or box_1 is None:
+        return False
+    return _box_iou(box_0, box_1) >= iou_threshold
+
+
+def _interpolate_boxes(
+    box_0: NDArray[np.float32] | None,
+    box_1: NDArray[np.float32] | None,
+    steps: int,
+) -> List[NDArray[np.float32]]:
+    """在两个关键帧之间线性插值出 steps - 1 帧的检测框（两端都没有框时为空）"""
+    if box_0 is None or box_1 is None:
+        return [np.zeros((0, BOX_COLUMNS), dtype=np.float32) for _ in range(steps - 1)]
+    t = (np.arange(1, steps, dtype=np.float32) / np.float32(steps))[:, None]
+    interpolated = box_0[None, :] + (box_1 - box_0)[None, :] * t
+    return [row[None, :] for row in interpolated]
 
-    def __new__(cls, model_path: str = DEFAULT_MODEL_PATH) -> "Detect":
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
 
-    def __init__(self, model_path: str = DEFAULT_MODEL_PATH) -> None:
+class Detect:
+    _instances: dict[str, "Detect"] = {}
+
+    def __new__(
+        cls, model_path: str = DEFAULT_MODEL_PATH, backend: DetectBackendName = "torch"
+    ) -> "Detect":
+        if backend not in cls._instances:
+            cls._instances[backend] = super().__new__(cls)
+        return cls._instances[backend]
+
+    def __init__(
+        self, model_path: str = DEFAULT_MODEL_PATH, backend: DetectBackendName = "torch"
+    ) -> None:
+        """backend 选择推理运行时（torch / onnx / openvino），见 video_work.detect.backends"""
         if hasattr(self, "_initialized") and self._initialized:
             return
         self.model_path = model_path
-        self.model = YOLO(model_path)
+        self.backend_name = backend
+        self.backend: DetectBackend = create_detect_backend(backend, model_path)
         self._initialized = True
 
 
@@ -61,230 +129,131 @@ class Detect:
         conf_threshhold=0.5,
         box_scale=2,
     ) -> List[List[Dict[str, float]]]:
-        frame_count = len(detect_norm_annotation)
-        if frame_count == 0:
+        """dict 形式的兼容接口，实现见 optimize_detect_boxes"""
+        if len(detect_norm_annotation) == 0:
             return detect_norm_annotation
+        optimized = Detect.optimize_detect_boxes(
+            FrameBoxes.from_annotations(detect_norm_annotation),
+            wnd_size=wnd_size,
+            step=step,
+            conf_threshhold=conf_threshhold,
+            box_scale=box_scale,
+        )
+        return optimized.to_annotations()
 
-        filtered: List[List[Dict[str, float]]] = []
-        for frame_boxes in detect_norm_annotation:
-            valid_boxes = [
-                box
-                for box in frame_boxes
-                if float(box.get("conf", 0.0)) >= conf_threshhold
-            ]
-            filtered.append(valid_boxes)
-
-        optimized: List[List[Dict[str, float]]] = [[] for _ in range(frame_count)]
-
-        for wnd_start in range(0, frame_count, step):
-            wnd_end = min(wnd_start + wnd_size, frame_count)
-
-            centers_x: List[float] = []
-            centers_y: List[float] = []
-            widths: List[float] = []
-            heights: List[float] = []
-            wh_ratios: List[float] = []
-            confs: List[float] = []
-
-            for idx in range(wnd_start, wnd_end):
-                frame_boxes = filtered[idx]
-                if not frame_boxes:
-                    continue
-
-                best_box = max(
-                    frame_boxes,
-                    key=lambda b: float(b.get("conf", 0.0)),
-                )
-
-                x1 = float(best_box.get("x1", 0.0))
-                y1 = float(best_box.get("y1", 0.0))
-                x2 = float(best_box.get("x2", 0.0))
-                y2 = float(best_box.get("y2", 0.0))
-                conf = float(best_box.get("conf", 0.0))
-
-                w = max(x2 - x1, 0.0)
-                h = max(y2 - y1, 1e-6)
-                cx = (x1 + x2) / 2.0
-                cy = (y1 + y2) / 2.0
-
-                centers_x.append(cx)
-                centers_y.append(cy)
-                widths.append(w)
-                heights.append(h)
-                wh_ratios.append(w / h)
-                confs.append(conf)
-
-            if not centers_x:
-                continue
-
-            delegate_center_x = sum(centers_x) / len(centers_x)
-            delegate_center_y = sum(centers_y) / len(centers_y)
-            delegate_w = sum(widths) / len(widths)
-            delegate_h = sum(heights) / len(heights)
-            delegate_wh_ratio = sum(wh_ratios) / len(wh_ratios)
-            delegate_conf = sum(confs) / len(confs) if confs else 0.0
-
-            half_w = delegate_w / 2.0
-            half_h = delegate_h / 2.0
-
-            x1_d = delegate_center_x - half_w
-            y1_d = delegate_center_y - half_h
-            x2_d = delegate_center_x + half_w
-            y2_d = delegate_center_y + half_h
-
-            x1_d = max(0.0, min(1.0, x1_d))
-            y1_d = max(0.0, min(1.0, y1_d))
-            x2_d = max(0.0, min(1.0, x2_d))
-            y2_d = max(0.0, min(1.0, y2_d))
-
-            if x2_d <= x1_d:
-                x2_d = min(1.0, x1_d + 1e-6)
-            if y2_d <= y1_d:
-                y2_d = min(1.0, y1_d + 1e-6)
-
-            for idx in range(wnd_start, wnd_end):
-                frame_boxes = filtered[idx]
-
-                if not frame_boxes:
-                    use_delegate = True
-                    x1 = x1_d
-                    y1 = y1_d
-                    x2 = x2_d
-                    y2 = y2_d
-                    conf = delegate_conf
-                else:
-                    best_box = max(
-                        frame_boxes,
-                        key=lambda b: float(b.get("conf", 0.0)),
-                    )
-
-                    x1 = float(best_box.get("x1", 0.0))
-                    y1 = float(best_box.get("y1", 0.0))
-                    x2 = float(best_box.get("x2", 0.0))
-                    y2 = float(best_box.get("y2", 0.0))
-                    conf = float(best_box.get("conf", 0.0))
-
-                    w = max(x2 - x1, 0.0)
-                    h = max(y2 - y1, 1e-6)
-                    wh_ratio = w / h
-                    cx = (x1 + x2) / 2.0
-                    cy = (y1 + y2) / 2.0
-
-                    invalid_ratio = (
-                        wh_ratio >= 2.0 * delegate_wh_ratio
-                        or wh_ratio <= 0.5 * delegate_wh_ratio
-                    )
-                    invalid_center = (
-                        cx < x1_d
-                        or cx > x2_d
-                        or cy < y1_d
-                        or cy > y2_d
-                    )
-
-                    use_delegate = invalid_ratio or invalid_center
-
-                if use_delegate:
-                    new_box = {
-                        "x1": x1_d,
-                        "y1": y1_d,
-                        "x2": x2_d,
-                        "y2": y2_d,
-                        "conf": delegate_conf,
-                    }
-                else:
-                    new_box = {
-                        "x1": x1,
-                        "y1": y1,
-                        "x2": x2,
-                        "y2": y2,
-                        "conf": conf,
-                    }
-
-                optimized[idx] = [new_box]
+    @staticmethod
+    def optimize_detect_boxes(
+        detect_boxes: FrameBoxes,
+        wnd_size: int = 60,
+        step: int = 30,
+        conf_threshhold=0.5,
+        box_scale=2,
+    ) -> FrameBoxes:
+        """
+        优化检测框（向量化实现），输出每帧恰好一个框：
+        1. 按 (wnd_size, step) 滑窗，用窗口内各帧最佳框的均值得到代表框；
+           帧的最佳框宽高比偏离代表框 2 倍以上或中心落在代表框外时，用代表框替换；
+           多个窗口覆盖同一帧时以最后一个有检测的窗口为准
+        2. 仍然没有框的帧取其后最近的框，后面没有则取前面最近的框，都没有则取整幅画面
+        3. 以中心为基准放大 box_scale 倍并扩为正方形
+        """
+        frame_count = len(detect_boxes)
+        if frame_count == 0:
+            return FrameBoxes.empty(0)
+        if wnd_size <= 0 or step <= 0:
+            raise ValueError("wnd_size and step must be positive")
+
+        best, valid = detect_boxes.best_per_frame(conf_threshhold)
+        x1, y1, x2, y2 = best[:, BOX_X1], best[:, BOX_Y1], best[:, BOX_X2], best[:, BOX_Y2]
+        conf = best[:, BOX_CONF]
+        w = np.maximum(x2 - x1, 0.0)
+        h = np.maximum(y2 - y1, 1e-6)
+        cx = (x1 + x2) / 2.0
+        cy = (y1 + y2) / 2.0
+        wh_ratio = w / h
+
+        # 滑窗求和：前缀和，无效帧记 0
+        def window_sums(values: NDArray[np.float64]) -> NDArray[np.float64]:
+            prefix = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+            return prefix[wnd_ends] - prefix[wnd_starts]
+
+        wnd_starts = np.arange(0, frame_count, step, dtype=np.int64)
+        wnd_ends = np.minimum(wnd_starts + wnd_size, frame_count)
+        counts = window_sums(np.ones(frame_count))
+        has_boxes = counts > 0
+        safe_counts = np.where(has_boxes, counts, 1.0)
+        d_cx = window_sums(cx) / safe_counts
+        d_cy = window_sums(cy) / safe_counts
+        d_w = window_sums(w) / safe_counts
+        d_h = window_sums(h) / safe_counts
+        d_ratio = window_sums(wh_ratio) / safe_counts
+        d_conf = window_sums(conf) / safe_counts
+
+        d_x1 = np.clip(d_cx - d_w / 2.0, 0.0, 1.0)
+        d_y1 = np.clip(d_cy - d_h / 2.0, 0.0, 1.0)
+        d_x2 = np.clip(d_cx + d_w / 2.0, 0.0, 1.0)
+        d_y2 = np.clip(d_cy + d_h / 2.0, 0.0, 1.0)
+        d_x2 = np.where(d_x2 <= d_x1, np.minimum(1.0, d_x1 + 1e-6), d_x2)
+        d_y2 = np.where(d_y2 <= d_y1, np.minimum(1.0, d_y1 + 1e-6), d_y2)
+
+        # 每帧最终生效的窗口：覆盖该帧且有检测的窗口中序号最大的
+        frames = np.arange(frame_count, dtype=np.int64)
+        wnd_hi = frames // step
+        wnd_lo = np.maximum(0, (frames - wnd_size) // step + 1)
+        last_with_boxes = np.maximum.accumulate(
+            np.where(has_boxes, np.arange(wnd_starts.size), -1)
+        )
+        wnd = last_with_boxes[wnd_hi]
+        assigned = (wnd >= 0) & (wnd >= wnd_lo)
+        wnd = np.where(assigned, wnd, 0)
+
+        invalid_ratio = (wh_ratio >= 2.0 * d_ratio[wnd]) | (wh_ratio <= 0.5 * d_ratio[wnd])
+        invalid_center = (cx < d_x1[wnd]) | (cx > d_x2[wnd]) | (cy < d_y1[wnd]) | (cy > d_y2[wnd])
+        use_delegate = ~valid | invalid_ratio | invalid_center
+
+        optimized = np.stack(
+            [
+                np.where(use_delegate, d_x1[wnd], x1),
+                np.where(use_delegate, d_y1[wnd], y1),
+                np.where(use_delegate, d_x2[wnd], x2),
+                np.where(use_delegate, d_y2[wnd], y2),
+                np.where(use_delegate, d_conf[wnd], conf),
+            ],
+            axis=1,
+        )
 
         # 对于任然存在的预测框空缺 从后取帧的预测框 作为填充. 如果后面帧都没有预测框，则从前取。
-        for idx in range(frame_count):
-            if optimized[idx]:
-                continue
-
-            fill_box: Dict[str, float] | None = None
-
-            for j in range(idx + 1, frame_count):
-                if optimized[j]:
-                    fill_box = optimized[j][0]
-                    break
-
-            if fill_box is None:
-                for j in range(idx - 1, -1, -1):
-                    if optimized[j]:
-                        fill_box = optimized[j][0]
-                        break
-
-            if fill_box is None:
-                fill_box = {
-                    "x1": 0.0,
-                    "y1": 0.0,
-                    "x2": 1.0,
-                    "y2": 1.0,
-                    "conf": 0.0,
-                }
-
-            optimized[idx] = [
-                {
-                    "x1": float(fill_box["x1"]),
-                    "y1": float(fill_box["y1"]),
-                    "x2": float(fill_box["x2"]),
-                    "y2": float(fill_box["y2"]),
-                    "conf": float(fill_box.get("conf", 0.0)),
-                }
-            ]
-
-        for idx, frame_boxes in enumerate(optimized):
-            if not frame_boxes:
-                continue
-
-            scaled_boxes: List[Dict[str, float]] = []
-            for box in frame_boxes:
-                x1 = float(box.get("x1", 0.0))
-                y1 = float(box.get("y1", 0.0))
-                x2 = float(box.get("x2", 0.0))
-                y2 = float(box.get("y2", 0.0))
-
-                cx = (x1 + x2) / 2.0
-                cy = (y1 + y2) / 2.0
-                w = (x2 - x1) * box_scale
-                h = (y2 - y1) * box_scale
-
-                side = max(w, h)
-                half_side = side / 2.0
-
-                x1_s = cx - half_side
-                y1_s = cy - half_side
-                x2_s = cx + half_side
-                y2_s = cy + half_side
-
-                x1_s = max(0.0, min(1.0, x1_s))
-                y1_s = max(0.0, min(1.0, y1_s))
-                x2_s = max(0.0, min(1.0, x2_s))
-                y2_s = max(0.0, min(1.0, y2_s))
-
-                if x2_s <= x1_s:
-                    x2_s = min(1.0, x1_s + 1e-6)
-                if y2_s <= y1_s:
-                    y2_s = min(1.0, y1_s + 1e-6)
-
-                scaled_box = {
-                    "x1": x1_s,
-                    "y1": y1_s,
-                    "x2": x2_s,
-                    "y2": y2_s,
-                    "conf": float(box.get("conf", 0.0)),
-                }
-                scaled_boxes.append(scaled_box)
-
-            optimized[idx] = scaled_boxes
-
-        return optimized
+        if not assigned.all():
+            next_idx = np.minimum.accumulate(
+                np.where(assigned, frames, frame_count)[::-1]
+            )[::-1]
+            prev_idx = np.maximum.accumulate(np.where(assigned, frames, -1))
+            fill_idx = np.where(next_idx < frame_count, next_idx, prev_idx)
+            filled = optimized[np.maximum(fill_idx, 0)]
+            filled[fill_idx < 0] = [0.0, 0.0, 1.0, 1.0, 0.0]
+            optimized = np.where(assigned[:, None], optimized, filled)
+
+        # 放大为正方形
+        cx = (optimized[:, 0] + optimized[:, 2]) / 2.0
+        cy = (optimized[:, 1] + optimized[:, 3]) / 2.0
+        half_side = np.maximum(
+            (optimized[:, 2] - optimized[:, 0]) * box_scale,
+            (optimized[:, 3] - optimized[:, 1]) * box_scale,
+        ) / 2.0
+        x1_s = np.clip(cx - half_side, 0.0, 1.0)
+        y1_s = np.clip(cy - half_side, 0.0, 1.0)
+        x2_s = np.clip(cx + half_side, 0.0, 1.0)
+        y2_s = np.clip(cy + half_side, 0.0, 1.0)
+        x2_s = np.where(x2_s <= x1_s, np.minimum(1.0, x1_s + 1e-6), x2_s)
+        y2_s = np.where(y2_s <= y1_s, np.minimum(1.0, y1_s + 1e-6), y2_s)
+
+        boxes = np.zeros((frame_count, BOX_COLUMNS), dtype=np.float32)
+        boxes[:, BOX_X1] = x1_s
+        boxes[:, BOX_Y1] = y1_s
+        boxes[:, BOX_X2] = x2_s
+        boxes[:, BOX_Y2] = y2_s
+        boxes[:, BOX_CONF] = optimized[:, 4]
+        return FrameBoxes(boxes=boxes, frame_idx=frames, frame_count=frame_count)
 
     @staticmethod
     def crop_frames(
@@ -384,40 +353,213 @@ class Detect:
 
     def predict_images(
         self, 
-        frames: List[NDArray[np.uint8]],
+        frames: Iterable[NDArray[np.uint8]],
         frame_width: int,
         frame_height: int,
+        batch_size: int = 16,
+        interval: int = 1,
+        conf_threshold: float = 0.5,
+        iou_threshold: float = 0.5,
+        track_max_interval: int = 0,
+        track_min_score: float = 0.7,
     ) -> List[List[Dict[str, float]]]:
-        detect_norm_annotation: List[List[Dict[str, float]]] = []
+        """
+        dict 形式的兼容接口，参数与实现见 predict_boxes
+
+        Returns:
+            List[List[Dict[str, float]]]: 每帧一个归一化检测框列表 {x1, y1, x2, y2, conf}
+        """
+        return self.predict_boxes(
+            frames,
+            frame_width,
+            frame_height,
+            batch_size=batch_size,
+            interval=interval,
+            conf_threshold=conf_threshold,
+            iou_threshold=iou_threshold,
+            track_max_interval=track_max_interval,
+            track_min_score=track_min_score,
+        ).to_annotations()
+
+    def predict_boxes(
+        self,
+        frames: Iterable[NDArray[np.uint8]],
+        frame_width: int,
+        frame_height: int,
+        batch_size: int = 16,
+        interval: int = 1,
+        conf_threshold: float = 0.5,
+        iou_threshold: float = 0.5,
+        track_max_interval: int = 0,
+        track_min_score: float = 0.7,
+    ) -> FrameBoxes:
+        """
+        批量检测：按 batch_size 把帧打包送入检测后端（torch / onnx / openvino）。
+        frames 可以是帧列表，也可以是流式帧源（如 VideoFrameSource / prefetch 迭代器）。
+
+        interval > 1 时启用时间下采样：只对每 interval 帧的关键帧做检测，
+        相邻关键帧的最佳框一致（conf >= conf_threshold 且 IoU >= iou_threshold）时线性插值填充中间帧，
+        否则（目标出现/消失、运动或置信度突变）对中间帧逐帧补检测。
+
+        track_max_interval > 0 时启用跟踪模式（与 interval > 1 互斥）：检测到目标后用模板跟踪器
+        逐帧传播最佳框，跟踪得分低于 track_min_score 或连续跟踪 track_max_interval 帧后才重新检测。
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if track_max_interval < 0:
+            raise ValueError("track_max_interval must be non-negative")
+        if track_max_interval > 0:
+            if interval > 1:
+                raise ValueError("tracking and interval > 1 cannot be combined")
+            per_frame = self._predict_tracked(
+                frames,
+                frame_width,
+                frame_height,
+                conf_threshold=conf_threshold,
+                max_interval=track_max_interval,
+                min_score=track_min_score,
+            )
+            return FrameBoxes.from_frame_arrays(per_frame)
+        if interval > 1:
+            per_frame = self._predict_sampled(
+                frames,
+                frame_width,
+                frame_height,
+                batch_size=batch_size,
+                interval=interval,
+                conf_threshold=conf_threshold,
+                iou_threshold=iou_threshold,
+            )
+            return FrameBoxes.from_frame_arrays(per_frame)
+
+        per_frame: List[NDArray[np.float32]] = []
+        batch: List[NDArray[np.uint8]] = []
         for frame in frames:
-            results = self.model(frame, verbose=False)
-
-            frame_annotations: List[Dict[str, float]] = []
-
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = float(box.conf[0].cpu().numpy())
-
-                    # x1_i, y1_i, x2_i, y2_i = int(x1), int(y1), int(x2), int(y2)
-                    x1_n = x1 / frame_width
-                    y1_n = y1 / frame_height
-                    x2_n = x2 / frame_width
-                    y2_n = y2 / frame_height
-
-                    frame_annotations.append(
-                        {
-                            "x1": x1_n,
-                            "y1": y1_n,
-                            "x2": x2_n,
-                            "y2": y2_n,
-                            "conf": conf,
-                        }
+            batch.append(frame)
+            if len(batch) >= batch_size:
+                per_frame.extend(self._predict_batch(batch, frame_width, frame_height))
+                batch = []
+        if batch:
+            per_frame.extend(self._predict_batch(batch, frame_width, frame_height))
+
+        return FrameBoxes.from_frame_arrays(per_frame)
+
+    def _predict_sampled(
+        self,
+        frames: Iterable[NDArray[np.uint8]],
+        frame_width: int,
+        frame_height: int,
+        batch_size: int,
+        interval: int,
+        conf_threshold: float,
+        iou_threshold: float,
+    ) -> List[NDArray[np.float32]]:
+        """
+        按片段处理：每个片段包含 batch_size 个关键帧间隔（片段首帧为上一片段已检测的末尾关键帧），
+        因此最多缓存 batch_size * interval + 1 帧。
+        """
+        detect_norm_annotation: List[NDArray[np.float32]] = []
+        span_len = batch_size * interval + 1
+        span: List[NDArray[np.uint8]] = []
+        carried: NDArray[np.float32] | None = None
+
+        def process_span() -> NDArray[np.float32]:
+            key_positions = list(range(0, len(span), interval))
+            if key_positions[-1] != len(span) - 1:
+                key_positions.append(len(span) - 1)
+            to_detect = key_positions if carried is None else key_positions[1:]
+
+            key_results: Dict[int, NDArray[np.float32]] = {}
+            if carried is not None:
+                key_results[0] = carried
+            for i in range(0, len(to_detect), batch_size):
+                positions = to_detect[i : i + batch_size]
+                results = self._predict_batch(
+                    [span[p] for p in positions], frame_width, frame_height
+                )
+                key_results.update(zip(positions, results))
+
+            for p0, p1 in zip(key_positions, key_positions[1:]):
+                detect_norm_annotation.append(key_results[p0])
+                if p1 - p0 <= 1:
+                    continue
+                best_0 = _best_box(key_results[p0], conf_threshold)
+                best_1 = _best_box(key_results[p1], conf_threshold)
+                if _is_consistent(best_0, best_1, iou_threshold):
+                    detect_norm_annotation.extend(
+                        _interpolate_boxes(best_0, best_1, p1 - p0)
+                    )
+                    continue
+                gap = span[p0 + 1 : p1]
+                for i in range(0, len(gap), batch_size):
+                    detect_norm_annotation.extend(
+                        self._predict_batch(gap[i : i + batch_size], frame_width, frame_height)
                     )
+            return key_results[key_positions[-1]]
 
-            detect_norm_annotation.append(frame_annotations)
+        for frame in frames:
+            span.append(frame)
+            if len(span) >= span_len:
+                carried = process_span()
+                span = span[-1:]
 
-            detect_norm_annotation.append(frame_annotations)
+        if carried is None or len(span) > 1:
+            if span:
+                carried = process_span()
+        if carried is not None:
+            detect_norm_annotation.append(carried)
 
         return detect_norm_annotation
+
+    def _predict_tracked(
+        self,
+        frames: Iterable[NDArray[np.uint8]],
+        frame_width: int,
+        frame_height: int,
+        conf_threshold: float,
+        max_interval: int,
+        min_score: float,
+    ) -> List[NDArray[np.float32]]:
+        """
+        跟踪模式：跟踪中的帧只保留被跟踪的最佳框，检测次数随场景变化而不是帧数增长。
+        没有目标时逐帧检测。
+        """
+        per_frame: List[NDArray[np.float32]] = []
+        tracker: TemplateTracker | None = None
+        tracked_frames = 0
+        for frame in frames:
+            if tracker is not None and tracked_frames < max_interval:
+                box = tracker.update(frame)
+                if box is not None:
+                    per_frame.append(box[None, :])
+                    tracked_frames += 1
+                    continue
+            frame_boxes = self._predict_batch([frame], frame_width, frame_height)[0]
+            per_frame.append(frame_boxes)
+            best = _best_box(frame_boxes, conf_threshold)
+            tracker = None if best is None else TemplateTracker(frame, best, min_score=min_score)
+            tracked_frames = 0
+        return per_frame
+
+    def _predict_batch(
+        self,
+        batch: List[NDArray[np.uint8]],
+        frame_width: int,
+        frame_height: int,
+    ) -> List[NDArray[np.float32]]:
+        """返回每帧一个 (M, 6) 归一化检测框数组"""
+        results = self.backend.predict(batch)
+        counts = [result.shape[0] for result in results]
+        if sum(counts) == 0:
+            return [np.zeros((0, BOX_COLUMNS), dtype=np.float32) for _ in results]
+        data = np.concatenate(results, axis=0)
+
+        boxes = np.zeros((data.shape[0], BOX_COLUMNS), dtype=np.float32)
+        scale = np.array(
+            [frame_width, frame_height, frame_width, frame_height], dtype=np.float32
+        )
+        boxes[:, BOX_X1 : BOX_Y2 + 1] = data[:, :4] / scale
+        boxes[:, BOX_CONF] = data[:, 4]
+        return np.split(boxes, np.cumsum(counts)[:-1])
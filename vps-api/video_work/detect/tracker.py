@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+from video_work.boxes import BOX_X1, BOX_X2, BOX_Y1, BOX_Y2
+
+"""
+    轻量模板跟踪：在上一帧框周围的搜索区域内做归一化互相关（TM_CCOEFF_NORMED），
+    把检测框逐帧平移传播。模板只在 YOLO 重新检测时刷新，避免跟踪漂移累积。
+"""
+
+__all__ = ["TemplateTracker"]
+
+
+def _gray(frame: NDArray[np.uint8]) -> NDArray[np.uint8]:
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+class TemplateTracker:
+    def __init__(
+        self,
+        frame: NDArray[np.uint8],
+        box: NDArray[np.float32],
+        min_score: float = 0.7,
+        search_scale: float = 1.0,
+        min_template_px: int = 4,
+    ) -> None:
+        """
+            box 为归一化检测框行（列见 BOX_*）。
+            min_score：匹配得分低于该值视为跟丢；
+            search_scale：搜索区域在框的每一侧向外扩展 search_scale 倍框宽/高。
+        """
+        gray = _gray(frame)
+        self.height, self.width = gray.shape[:2]
+        self.box = box.astype(np.float32, copy=True)
+        self.min_score = float(min_score)
+        self.search_scale = float(search_scale)
+        self.score = 1.0
+
+        x1, y1, x2, y2 = self._pixel_box(self.box)
+        self.template: NDArray[np.uint8] | None = None
+        if x2 - x1 >= min_template_px and y2 - y1 >= min_template_px:
+            self.template = gray[y1:y2, x1:x2].copy()
+
+    def _pixel_box(self, box: NDArray[np.float32]) -> tuple[int, int, int, int]:
+        x1 = int(np.clip(round(float(box[BOX_X1]) * self.width), 0, self.width))
+        y1 = int(np.clip(round(float(box[BOX_Y1]) * self.height), 0, self.height))
+        x2 = int(np.clip(round(float(box[BOX_X2]) * self.width), 0, self.width))
+        y2 = int(np.clip(round(float(box[BOX_Y2]) * self.height), 0, self.height))
+        return x1, y1, x2, y2
+
+    def update(self, frame: NDArray[np.uint8]) -> NDArray[np.float32] | None:
+        """在新帧中定位目标，成功返回平移后的框，跟丢（得分不足或越界）返回 None"""
+        if self.template is None:
+            return None
+        gray = _gray(frame)
+        if gray.shape[:2] != (self.height, self.width):
+            return None
+        t_h, t_w = self.template.shape[:2]
+        x1, y1, _, _ = self._pixel_box(self.box)
+        margin_x = int(round(t_w * self.search_scale))
+        margin_y = int(round(t_h * self.search_scale))
+        sx1, sy1 = max(0, x1 - margin_x), max(0, y1 - margin_y)
+        sx2 = min(self.width, x1 + t_w + margin_x)
+        sy2 = min(self.height, y1 + t_h + margin_y)
+        if sx2 - sx1 < t_w or sy2 - sy1 < t_h:
+            return None
+
+        scores = cv2.matchTemplate(gray[sy1:sy2, sx1:sx2], self.template, cv2.TM_CCOEFF_NORMED)
+        _, max_score, _, (loc_x, loc_y) = cv2.minMaxLoc(scores)
+        # 纯色区域的 NCC 没有定义（nan），同样视为跟丢
+        if not np.isfinite(max_score) or max_score < self.min_score:
+            return None
+
+        dx = (sx1 + loc_x - x1) / float(self.width)
+        dy = (sy1 + loc_y - y1) / float(self.height)
+        self.box[[BOX_X1, BOX_X2]] += np.float32(dx)
+        self.box[[BOX_Y1, BOX_Y2]] += np.float32(dy)
+        self.score = float(max_score)
+        return self.box.copy()
@@ -0,0 +1,119 @@
+import copy
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+import torch
+import torch.nn as nn
+
+"""
+    INT8 动态量化（仅 CPU）。MENet 中计算量最大的是 1x1 卷积（_Mlp / _LKA 的 fc、proj）和分类头的 Linear，
+    而 PyTorch 动态量化只支持 nn.Linear，因此先把 1x1 卷积等价替换为按通道的 Linear，再做 qint8 动态量化。
+    量化后的 state_dict 缓存在权重旁边（<weights>.int8.pt），缓存不比权重旧时直接加载，跳过浮点权重。
+    缓存先写临时文件再原子替换，读取失败时回退为由浮点模型重建；权重目录不可写时不缓存。
+"""
+
+__all__ = [
+    "PointwiseLinear",
+    "convert_pointwise_convs",
+    "quantize_dynamic_int8",
+    "load_or_build_int8",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class PointwiseLinear(nn.Module):
+    """与 1x1 Conv2d 等价的 NCHW Linear（在通道维上做矩阵乘）"""
+
+    def __init__(self, linear: nn.Linear) -> None:
+        super().__init__()
+        self.linear = linear
+
+    @classmethod
+    def from_conv(cls, conv: nn.Conv2d) -> "PointwiseLinear":
+        linear = nn.Linear(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+        with torch.no_grad():
+            linear.weight.copy_(conv.weight.reshape(conv.out_channels, conv.in_channels))
+            if conv.bias is not None:
+                linear.bias.copy_(conv.bias)
+        return cls(linear)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.linear(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)
+
+
+def _is_pointwise(module: nn.Module) -> bool:
+    return (
+        isinstance(module, nn.Conv2d)
+        and module.kernel_size == (1, 1)
+        and module.stride == (1, 1)
+        and module.padding == (0, 0)
+        and module.dilation == (1, 1)
+        and module.groups == 1
+    )
+
+
+def convert_pointwise_convs(model: nn.Module) -> nn.Module:
+    """原地把所有 1x1 卷积替换为 PointwiseLinear，返回 model"""
+    for name, child in model.named_children():
+        if _is_pointwise(child):
+            setattr(model, name, PointwiseLinear.from_conv(child))
+        else:
+            convert_pointwise_convs(child)
+    return model
+
+
+def quantize_dynamic_int8(model: nn.Module) -> nn.Module:
+    """返回 model 的 INT8 动态量化副本（CPU，eval 模式），原模型不变"""
+    float_model = copy.deepcopy(model).cpu().eval()
+    convert_pointwise_convs(float_model)
+    return torch.ao.quantization.quantize_dynamic(
+        float_model, {nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_or_build_int8(
+    weight_path: str,
+    build_float: Callable[[], nn.Module],
+    build_skeleton: Callable[[], nn.Module],
+) -> nn.Module:
+    """
+        build_float 构造并加载浮点权重的模型，build_skeleton 只构造结构（不加载权重）。
+        缓存有效时：skeleton -> 量化结构 -> 加载缓存的 INT8 state_dict；否则由浮点模型量化后写缓存。
+    """
+    weights = Path(weight_path)
+    cache_path = weights.with_name(weights.name + ".int8.pt")
+    if cache_path.exists() and cache_path.stat().st_mtime >= weights.stat().st_mtime:
+        try:
+            model = quantize_dynamic_int8(build_skeleton())
+            model.load_state_dict(torch.load(cache_path, map_location="cpu"))
+            return model.eval()
+        except Exception as e:
+            # 缓存损坏（截断、结构不符等）时重建并覆盖
+            logger.warning("failed to load INT8 cache %s, rebuilding: %r", cache_path, e)
+
+    model = quantize_dynamic_int8(build_float())
+    _save_cache(model.state_dict(), cache_path)
+    return model.eval()
+
+
+def _save_cache(state_dict: dict, cache_path: Path) -> None:
+    """写入同目录临时文件后 os.replace 原子替换，并发写入或中途崩溃不会留下半截缓存；目录不可写时跳过"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=cache_path.name + ".", suffix=".tmp", dir=cache_path.parent
+        )
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(state_dict, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
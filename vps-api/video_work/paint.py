@@ -5,16 +5,32 @@ import numpy as np
 from numpy.typing import NDArray
 import matplotlib.pyplot as plt
 
-def square_crop_with_origin(
-    frame: NDArray[np.uint8],
-    ann: Dict[str, float],
-) -> Tuple[NDArray[np.uint8], int, int] | None:
-    height, width = frame.shape[:2]
+from video_work.boxes import (
+    BOX_CONF,
+    BOX_SIDE,
+    BOX_X1,
+    BOX_X2,
+    BOX_Y1,
+    BOX_Y2,
+    as_box_array,
+    box_row,
+)
+
+def square_crop_region(
+    frame_shape: Sequence[int],
+    ann: Dict[str, float] | NDArray[np.floating],
+) -> Tuple[int, int, int] | None:
+    """
+        计算正方形裁剪区域，返回 (side, origin_x, origin_y)；origin 可能为负或使区域超出画面，
+        超出部分在裁剪时填 0。框无效时返回 None。
+    """
+    height, width = int(frame_shape[0]), int(frame_shape[1])
 
-    x1_n = float(ann.get("x1", 0.0))
-    y1_n = float(ann.get("y1", 0.0))
-    x2_n = float(ann.get("x2", 1.0))
-    y2_n = float(ann.get("y2", 1.0))
+    row = box_row(ann)
+    x1_n = float(row[BOX_X1])
+    y1_n = float(row[BOX_Y1])
+    x2_n = float(row[BOX_X2])
+    y2_n = float(row[BOX_Y2])
 
     x1_f = x1_n * width
     y1_f = y1_n * height
@@ -36,8 +52,8 @@ def square_crop_with_origin(
 
     w_f = float(x2_f - x1_f)
     h_f = float(y2_f - y1_f)
-    side_override = ann.get("square_side_px")
-    if side_override is None:
+    side_override = float(row[BOX_SIDE])
+    if side_override <= 0:
         side = int(round(max(w_f, h_f)))
     else:
         side = int(round(float(side_override)))
@@ -57,16 +73,32 @@ def square_crop_with_origin(
     half_side = side / 2.0
     new_x1 = int(round(cx - half_side))
     new_y1 = int(round(cy - half_side))
-    new_x2 = new_x1 + side
-    new_y2 = new_y1 + side
 
     src_x1 = max(0, min(width, new_x1))
     src_y1 = max(0, min(height, new_y1))
-    src_x2 = max(0, min(width, new_x2))
-    src_y2 = max(0, min(height, new_y2))
+    src_x2 = max(0, min(width, new_x1 + side))
+    src_y2 = max(0, min(height, new_y1 + side))
 
     if src_x2 <= src_x1 or src_y2 <= src_y1:
         return None
+    return side, new_x1, new_y1
+
+
+def square_crop_with_origin(
+    frame: NDArray[np.uint8],
+    ann: Dict[str, float] | NDArray[np.floating],
+) -> Tuple[NDArray[np.uint8], int, int] | None:
+    """ann 可以是 dict，也可以是 FrameBoxes 中的一行（BOX_SIDE 列为 0 表示未设置边长）"""
+    region = square_crop_region(frame.shape, ann)
+    if region is None:
+        return None
+    side, new_x1, new_y1 = region
+    height, width = frame.shape[:2]
+
+    src_x1 = max(0, min(width, new_x1))
+    src_y1 = max(0, min(height, new_y1))
+    src_x2 = max(0, min(width, new_x1 + side))
+    src_y2 = max(0, min(height, new_y1 + side))
 
     dst_x1 = src_x1 - new_x1
     dst_y1 = src_y1 - new_y1
@@ -120,33 +152,95 @@ def overlay_crop_mask_on_frame(
     if not mask_idx.any():
         return frame
 
-    roi_f = roi.astype(np.float32)
-    mask_f = mask_roi.astype(np.float32)
-    roi_f[mask_idx] = roi_f[mask_idx] * (1.0 - float(alpha)) + mask_f[mask_idx] * float(
-        alpha
-    )
-    roi[:] = np.clip(roi_f, 0, 255).astype(np.uint8)
+    blended = cv2.addWeighted(roi, 1.0 - float(alpha), mask_roi, float(alpha), 0.0)
+    roi[mask_idx] = blended[mask_idx]
 
     return frame
 
 
+def overlay_polygon_on_frame(
+    frame: NDArray[np.uint8],
+    segments: Sequence[int] | NDArray[np.integer] | NDArray[np.floating],
+    crop_shape: Sequence[int],
+    origin_x: int,
+    origin_y: int,
+    color: Tuple[int, int, int] = (255, 255, 0),
+    alpha: float = 0.35,
+) -> NDArray[np.uint8]:
+    """
+        把裁剪图坐标系下的多边形以半透明 color 原地叠加到整帧上。
+        与 get_coord_mask + overlay_crop_mask_on_frame 覆盖的像素一致（混合取整误差不超过 1），
+        但只栅格化多边形外接矩形大小的单通道掩码，并只在其与画面的交集上用 addWeighted 混合，
+        不再分配整块 crop 大小的三通道掩码，也不做 float32 转换。
+    """
+    arr = np.asarray(segments, dtype=np.float32)
+    if arr.size < 6 or int(arr.size) % 2 != 0:
+        return frame
+
+    # 与 get_coord_mask 相同：在裁剪图内取整并截断
+    crop_h, crop_w = int(crop_shape[0]), int(crop_shape[1])
+    pts = arr.reshape(-1, 2)
+    xs = np.clip(np.round(pts[:, 0]), 0, crop_w - 1).astype(np.int32)
+    ys = np.clip(np.round(pts[:, 1]), 0, crop_h - 1).astype(np.int32)
+
+    # 在裁剪图坐标的完整外接矩形内栅格化（整数平移不改变 fillPoly 的结果），
+    # 之后再切到与画面的交集；若先按画面截断画布，被截断的边会被按不同方式栅格化
+    bx1, by1 = int(xs.min()), int(ys.min())
+    bx2, by2 = int(xs.max()) + 1, int(ys.max()) + 1
+    fh, fw = frame.shape[:2]
+    x1, y1 = max(bx1 + int(origin_x), 0), max(by1 + int(origin_y), 0)
+    x2, y2 = min(bx2 + int(origin_x), fw), min(by2 + int(origin_y), fh)
+    if x2 <= x1 or y2 <= y1:
+        return frame
+
+    mask = np.zeros((by2 - by1, bx2 - bx1), dtype=np.uint8)
+    poly = np.stack([xs - bx1, ys - by1], axis=1).reshape(-1, 1, 2)
+    cv2.fillPoly(mask, [poly], 255)
+    mx1, my1 = x1 - int(origin_x) - bx1, y1 - int(origin_y) - by1
+    mask_idx = mask[my1 : my1 + (y2 - y1), mx1 : mx1 + (x2 - x1)].astype(bool)
+    if not mask_idx.any():
+        return frame
+
+    roi = frame[y1:y2, x1:x2]
+    solid = np.empty_like(roi)
+    solid[:] = color[: roi.shape[2]] if roi.ndim == 3 else color[0]
+    blended = cv2.addWeighted(roi, 1.0 - float(alpha), solid, float(alpha), 0.0)
+    roi[mask_idx] = blended[mask_idx]
+    return frame
+
+
+def composite_frame(
+    frame: NDArray[np.uint8],
+    annotations: List[Dict[str, float]] | NDArray[np.floating],
+    polygons: Sequence[Tuple[Sequence[int], int, int, NDArray[np.integer]]] = (),
+    color: Tuple[int, int, int] = (255, 255, 0),
+    alpha: float = 0.35,
+) -> NDArray[np.uint8]:
+    """
+        单趟原地合成标注帧：先画检测框，再叠加分割多边形。
+        polygons 的元素为 (crop_shape, origin_x, origin_y, segments)，坐标位于对应裁剪图内。
+    """
+    draw_box_on_frame(frame, annotations)
+    for crop_shape, origin_x, origin_y, segments in polygons:
+        overlay_polygon_on_frame(
+            frame, segments, crop_shape, origin_x, origin_y, color=color, alpha=alpha
+        )
+    return frame
+
+
 
 def draw_box_on_frame(
     frame: NDArray[np.uint8],
-    annotations: List[Dict[str, float]],
+    annotations: List[Dict[str, float]] | NDArray[np.floating],
 ) -> NDArray[np.uint8]:
     height, width = frame.shape[:2]
     scale = height / 720.0 if height > 0 else 1.0
     thickness = max(1, int(round(2 * scale)))
     font_scale = 0.6 * scale
     text_offset = int(round(10 * scale))
-    for ann in annotations:
-        x1_n = ann["x1"]
-        y1_n = ann["y1"]
-        x2_n = ann["x2"]
-        y2_n = ann["y2"]
-        conf = ann.get("conf", 0.0)
-
+    for x1_n, y1_n, x2_n, y2_n, conf in as_box_array(annotations)[
+        :, [BOX_X1, BOX_Y1, BOX_X2, BOX_Y2, BOX_CONF]
+    ].tolist():
         x1 = int(x1_n * width)
         y1 = int(y1_n * height)
         x2 = int(x2_n * width)
@@ -0,0 +1,75 @@
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+"""
+    有界生产者-消费者流水线：把一个可迭代对象放到后台线程里生产，
+    消费端通过有界队列拉取，从而让解码、裁剪/张量转换、模型推理等阶段并发执行。
+    OpenCV 解码与 torch 推理都会释放 GIL，因此线程即可获得真实的并行度。
+"""
+
+__all__ = ["prefetch"]
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class _StageFailure:
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+def prefetch(
+    iterable: Iterable[T],
+    maxsize: int = 2,
+    name: str = "prefetch",
+) -> Iterator[T]:
+    """
+        在后台线程中迭代 iterable，并通过容量为 maxsize 的队列把元素交给调用方。
+        - 队列满时生产者阻塞，内存占用上限为 maxsize 个元素
+        - 生产者抛出的异常会在消费端原样重新抛出
+        - 消费端提前退出（break / 异常）时会通知生产者停止并等待线程结束
+    """
+    if maxsize <= 0:
+        raise ValueError("maxsize must be positive")
+
+    q: "queue.Queue[object]" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker() -> None:
+        it = iter(iterable)
+        try:
+            for item in it:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(_StageFailure(e))
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=worker, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.exc
+            yield item  # type: ignore[misc]
+    finally:
+        stop.set()
+        thread.join()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import time
 from pathlib import Path
+from typing import Literal
 
 import cv2
 import numpy as np
@@ -9,36 +11,64 @@ import torch.nn.functional as F
 from torchvision import transforms
 from video_work.tools import get_device
 from video_work.models.menet_seg import MENetSeg
+from video_work.models.quantize import load_or_build_int8
 
 
+# polygon：多边形 + 长度（用于绘制掩码）；length：只输出长度
+SegmentOutput = Literal["polygon", "length"]
+# slide：滑窗融合；whole：整图缩放到 crop_size 单次推理；auto：按尺寸在两者间选择
+SegmentMode = Literal["slide", "whole", "auto"]
+
 DEFAULT_MODEL_PATH = str(Path(__file__).resolve().parent / "menet.pth")
+# 缓存的滑窗布局数（每种补边尺寸 + 滑窗参数一个）
+_LAYOUT_CACHE_SIZE = 16
+# 跨图滑窗瓦片的默认批大小（可用 Segment.benchmark_batch_size 按机器调优）
+DEFAULT_BATCH_SIZE = 8
 
 
 class Segment:
-    _instance: "Segment | None" = None
+    _instances: dict[bool, "Segment"] = {}
 
-    def __new__(cls, model_path: str = DEFAULT_MODEL_PATH) -> "Segment":
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    def __new__(cls, model_path: str = DEFAULT_MODEL_PATH, quantize: bool = False) -> "Segment":
+        if quantize not in cls._instances:
+            cls._instances[quantize] = super().__new__(cls)
+        return cls._instances[quantize]
 
-    def __init__(self, model_path: str = DEFAULT_MODEL_PATH) -> None:
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, quantize: bool = False) -> None:
+        """quantize 为 True 时使用 INT8 动态量化模型（仅 CPU，见 video_work.models.quantize）"""
         if hasattr(self, "_initialized") and self._initialized:
             return
 
         self.model_path = model_path or DEFAULT_MODEL_PATH
-        self.device = get_device()
-        self.model = MENetSeg(num_classes=2)
-        self._load_weights(self.model, self.model_path, self.device)
-        self.model.to(self.device)
+        self.quantize = quantize
+        if quantize:
+            self.device = torch.device("cpu")
+            self.model = load_or_build_int8(
+                self.model_path,
+                build_float=self._build_float_model,
+                build_skeleton=lambda: MENetSeg(num_classes=2),
+            )
+        else:
+            self.device = get_device()
+            self.model = MENetSeg(num_classes=2)
+            self._load_weights(self.model, self.model_path, self.device)
+            self.model.to(self.device)
         self.model.eval()
 
         self.input_size = (384, 384)
         self._norm_mean = torch.tensor([0.485, 0.456, 0.406], dtype=torch.float32).view(1, 3, 1, 1)
         self._norm_std = torch.tensor([0.229, 0.224, 0.225], dtype=torch.float32).view(1, 3, 1, 1)
         self.transform = transforms.Compose([transforms.Resize(self.input_size)])
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.last_batch_timings: list[tuple[int, float]] = []
+        self._layouts: dict[tuple[int, ...], _SlideLayout] = {}
         self._initialized = True
 
+    def _build_float_model(self) -> MENetSeg:
+        model = MENetSeg(num_classes=2)
+        self._load_weights(model, self.model_path, torch.device("cpu"))
+        return model
+
     @staticmethod
     def _load_weights(model: torch.nn.Module, weight_path: str, device: torch.device) -> None:
         checkpoint = torch.load(weight_path, map_location=device)
@@ -70,30 +100,136 @@ class Segment:
                 f"Failed to load segmentation weights. missing={len(missing)}, unexpected={len(unexpected)}"
             )
 
+    def benchmark_batch_size(
+        self,
+        candidates: tuple[int, ...] = (1, 2, 4, 8, 16, 32),
+        crop_size: int = 384,
+        repeats: int = 3,
+    ) -> int:
+        """
+        用随机瓦片测量各批大小的单瓦片耗时，取最快者写入 self.batch_size 并返回。
+        每个候选先预热一次，再取 repeats 次中的最小耗时。
+        """
+        best_size, best_cost = self.batch_size, float("inf")
+        for size in candidates:
+            if size <= 0:
+                continue
+            tiles = torch.rand(size, 3, crop_size, crop_size, device=self.device)
+            self._infer_tiles(tiles, crop_size, crop_size)
+            elapsed = float("inf")
+            for _ in range(max(1, repeats)):
+                started = time.perf_counter()
+                self._infer_tiles(tiles, crop_size, crop_size)
+                if self.device.type == "cuda":
+                    torch.cuda.synchronize(self.device)
+                elapsed = min(elapsed, time.perf_counter() - started)
+            if elapsed / size < best_cost:
+                best_size, best_cost = size, elapsed / size
+        self.batch_size = best_size
+        return best_size
+
+    def _infer_tiles(self, tiles: torch.Tensor, crop_h: int, crop_w: int) -> torch.Tensor:
+        """(B, 3, crop_h, crop_w) 瓦片 -> (B, crop_h, crop_w) 前景概率（float32，仍在推理设备上）"""
+        mean = self._norm_mean.to(tiles.device, dtype=tiles.dtype)
+        std = self._norm_std.to(tiles.device, dtype=tiles.dtype)
+        batch_tensor = (tiles - mean) / std
+
+        in_h, in_w = int(self.input_size[0]), int(self.input_size[1])
+        if (crop_h, crop_w) != (in_h, in_w):
+            batch_tensor = F.interpolate(batch_tensor, size=(in_h, in_w), mode="bilinear", align_corners=False)
+
+        with torch.no_grad():
+            logits = self.model(batch_tensor)
+            probs = torch.softmax(logits, dim=1)[:, 1]
+
+        if probs.shape[-2:] != (crop_h, crop_w):
+            probs = F.interpolate(probs.unsqueeze(1), size=(crop_h, crop_w), mode="bilinear", align_corners=False).squeeze(1)
+
+        return probs.detach().float()
+
+    @staticmethod
+    def _prob_map_to_results(
+        prob_map: np.ndarray,
+        bin_mask: np.ndarray,
+        min_area: int,
+        epsilon_ratio: float,
+        output: SegmentOutput = "polygon",
+    ) -> list[dict]:
+        orig_h, orig_w = prob_map.shape[:2]
+        contours, _ = cv2.findContours(bin_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        image_results: list[dict] = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area < float(min_area):
+                continue
+            # 两种输出都在同一个简化后的多边形上取最小外接矩形，长度与 output 无关
+            peri = cv2.arcLength(contour, True)
+            epsilon = max(1.0, float(peri) * float(epsilon_ratio))
+            shape = cv2.approxPolyDP(contour, epsilon, True)
+            pts = shape.reshape(-1, 2)
+            if pts.shape[0] < 3:
+                continue
+
+            # 只在外接矩形内画填充掩码并求均值，避免每个轮廓分配整图掩码
+            x0, y0, box_w, box_h = cv2.boundingRect(shape)
+            fill = np.zeros((box_h, box_w), dtype=np.uint8)
+            cv2.drawContours(fill, [shape], -1, 1, thickness=-1, offset=(-x0, -y0))
+            if cv2.countNonZero(fill):
+                conf = float(cv2.mean(prob_map[y0 : y0 + box_h, x0 : x0 + box_w], mask=fill)[0])
+            else:
+                conf = float(prob_map.max())
+
+            segment = np.empty(pts.shape[0] * 2, dtype=np.int32)
+            segment[0::2] = np.clip(pts[:, 0], 0, orig_w - 1)
+            segment[1::2] = np.clip(pts[:, 1], 0, orig_h - 1)
+            (_, (rect_w, rect_h), _) = cv2.minAreaRect(segment.reshape(-1, 1, 2))
+            det = {"cls": 1, "conf": conf, "length": float(max(rect_w, rect_h))}
+            if output != "length":
+                det["segments"] = segment
+            image_results.append(det)
+
+        image_results.sort(key=lambda d: d["conf"], reverse=True)
+        return image_results
+
     def predict_images(
         self,
         frame_tensors,
-        mode: str = "slide",
+        mode: SegmentMode = "slide",
         crop_size: int = 384,
         stride: tuple[int, int] = (224, 224),
         conf_thres: float = 0.5,
         min_area: int = 32,
         epsilon_ratio: float = 0.002,
+        batch: int | None = None,
+        output: SegmentOutput = "polygon",
+        whole_max_side: int | None = None,
     ) -> list[list[dict]]:
         """对多张图做分割推理并输出多边形结果。
 
-        - 输入：frame_tensors 为 CHW、RGB、float(0~1) 的 torch.Tensor 列表
-        - 模式：当前仅支持 mode='slide'，使用滑窗裁剪后批量推理并融合概率图
+        - 输入：frame_tensors 为 CHW、RGB、float(0~1) 的 torch.Tensor 列表，或同尺寸的 (N, 3, H, W) 张量
+        - 模式：
+          - slide：不足 crop_size 的边复制补边，滑窗裁剪后批量推理并融合概率图
+          - whole：整图缩放到 crop_size 推理一次，概率图再缩放回原尺寸
+          - auto：边长不超过 crop_size 时用 slide（补边后本就只有一个瓦片，无需插值），
+            不超过 whole_max_side（默认 crop_size 的 4/3，即 512）时用 whole，更大时用 slide
         - 参数：crop_size 默认为 384（32 的倍数且 >=224），stride 默认为 (224,224)
-        - 输出：每张图对应一个 list[dict]，dict 结构为 {cls, conf, segments}
+        - 批量：所有图的滑窗瓦片按顺序拼成大小为 batch 的批（跨图），每批推理一次后把概率
+          散回各自的融合缓冲；batch 为 None 时使用 self.batch_size（可由 benchmark_batch_size 调优），
+          每批耗时记录在 last_batch_timings
+        - 输出：每张图对应一个 list[dict]，dict 结构为 {cls, conf, segments, length}
           - cls 固定为 1
           - conf 为该实例区域内概率均值（回退到 max）
-          - segments 为像素坐标多边形点序列展开 [x1,y1,x2,y2,...]
+          - segments 为像素坐标多边形点序列展开 [x1,y1,x2,y2,...]（int32 的 np.ndarray）
+          - length 为最小外接矩形的长边（与 speed.get_coord_min_rect_len 相同）
+          - output='length' 时不输出 segments；length 与 polygon 模式一样由简化后的多边形计算，两种模式结果一致
         """
         if frame_tensors is None:
             raise ValueError("frame_tensors is None")
-        if mode not in {"slide"}:
+        if mode not in {"slide", "whole", "auto"}:
             raise ValueError(f"unsupported mode: {mode}")
+        if output not in {"polygon", "length"}:
+            raise ValueError(f"unsupported output: {output}")
         crop_h = int(crop_size)
         crop_w = int(crop_size)
         if crop_h <= 0 or crop_w <= 0:
@@ -107,26 +243,20 @@ class Segment:
             raise ValueError("stride must be positive")
         if stride_h > crop_h or stride_w > crop_w:
             raise ValueError("stride must be <= crop_size")
+        batch = self.batch_size if batch is None else int(batch)
+        if batch <= 0:
+            raise ValueError("batch must be positive")
+        if whole_max_side is None:
+            whole_max_side = crop_h * 4 // 3
 
-        if not frame_tensors:
+        if len(frame_tensors) == 0:
             return []
 
-        all_results: list[list[dict]] = []
-        in_h, in_w = int(self.input_size[0]), int(self.input_size[1])
-
-        weight_y = torch.hann_window(crop_h, periodic=False, dtype=torch.float32)
-        weight_x = torch.hann_window(crop_w, periodic=False, dtype=torch.float32)
-        weight_map = torch.outer(weight_y, weight_x).clamp_min(1e-3).cpu().numpy().astype(np.float32)
-
-        def starts(full: int, crop: int, step: int) -> list[int]:
-            if full <= crop:
-                return [0]
-            out = list(range(0, full - crop + 1, step))
-            last = full - crop
-            if out[-1] != last:
-                out.append(last)
-            return out
+        self.last_batch_timings = []
 
+        # 先为每张图补边并取得滑窗布局，瓦片按图顺序排成一个队列
+        images: list[_SlideImage | None] = []
+        tiles: list[tuple[int, int, int]] = []
         for tensor in frame_tensors:
             if tensor is None:
                 raise ValueError("tensor in frame_tensors is None")
@@ -136,88 +266,156 @@ class Segment:
             orig_h = int(tensor.shape[1])
             orig_w = int(tensor.shape[2])
             if orig_h <= 0 or orig_w <= 0:
-                all_results.append([])
+                images.append(None)
                 continue
 
             work_tensor = tensor.to(self.device, non_blocking=True).float()
 
-            pad_h = max(0, crop_h - orig_h)
-            pad_w = max(0, crop_w - orig_w)
-            if pad_h or pad_w:
-                work_tensor = F.pad(work_tensor.unsqueeze(0), (0, pad_w, 0, pad_h), mode="replicate").squeeze(0)
-
-            work_h = int(work_tensor.shape[1])
-            work_w = int(work_tensor.shape[2])
-            y_starts = starts(work_h, crop_h, stride_h)
-            x_starts = starts(work_w, crop_w, stride_w)
-
-            crops: list[torch.Tensor] = []
-            positions: list[tuple[int, int]] = []
-            for y0 in y_starts:
-                for x0 in x_starts:
-                    crop = work_tensor[:, y0 : y0 + crop_h, x0 : x0 + crop_w]
-                    crops.append(crop)
-                    positions.append((y0, x0))
-
-            if not crops:
-                all_results.append([])
-                continue
-
-            batch_tensor = torch.stack(crops, dim=0)
-            mean = self._norm_mean.to(batch_tensor.device, dtype=batch_tensor.dtype)
-            std = self._norm_std.to(batch_tensor.device, dtype=batch_tensor.dtype)
-            batch_tensor = (batch_tensor - mean) / std
-
-            if (crop_h, crop_w) != (in_h, in_w):
-                batch_tensor = F.interpolate(batch_tensor, size=(in_h, in_w), mode="bilinear", align_corners=False)
-
-            with torch.no_grad():
-                logits = self.model(batch_tensor)
-                probs = torch.softmax(logits, dim=1)[:, 1]
-
-            if probs.shape[-2:] != (crop_h, crop_w):
-                probs = F.interpolate(probs.unsqueeze(1), size=(crop_h, crop_w), mode="bilinear", align_corners=False).squeeze(1)
-
-            probs_np = probs.detach().float().cpu().numpy().astype(np.float32)
-            prob_sum = np.zeros((work_h, work_w), dtype=np.float32)
-            w_sum = np.zeros((work_h, work_w), dtype=np.float32)
-            for idx, (y0, x0) in enumerate(positions):
-                patch = probs_np[idx]
-                prob_sum[y0 : y0 + crop_h, x0 : x0 + crop_w] += patch * weight_map
-                w_sum[y0 : y0 + crop_h, x0 : x0 + crop_w] += weight_map
-
-            w_sum = np.maximum(w_sum, 1e-6)
-            prob_map = (prob_sum / w_sum)[:orig_h, :orig_w]
-
-            bin_mask = (prob_map >= conf_thres).astype(np.uint8) * 255
-            contours, _ = cv2.findContours(bin_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            image_results: list[dict] = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if area < float(min_area):
-                    continue
-                peri = cv2.arcLength(contour, True)
-                epsilon = max(1.0, float(peri) * float(epsilon_ratio))
-                approx = cv2.approxPolyDP(contour, epsilon, True)
-                pts = approx.reshape(-1, 2)
-                if pts.shape[0] < 3:
-                    continue
-
-                fill = np.zeros((orig_h, orig_w), dtype=np.uint8)
-                cv2.drawContours(fill, [approx], -1, 1, thickness=-1)
-                region = prob_map[fill.astype(bool)]
-                conf = float(region.mean()) if region.size else float(prob_map.max())
-
-                xs = np.clip(np.round(pts[:, 0]), 0, orig_w - 1).astype(np.int32)
-                ys = np.clip(np.round(pts[:, 1]), 0, orig_h - 1).astype(np.int32)
-                segment: list[int] = []
-                for x, y in zip(xs.tolist(), ys.tolist()):
-                    segment.extend([int(x), int(y)])
-
-                image_results.append({"cls": 1, "conf": conf, "segments": segment})
-
-            image_results.sort(key=lambda d: d["conf"], reverse=True)
-            all_results.append(image_results)
+            side = max(orig_h, orig_w)
+            whole = mode == "whole" or (mode == "auto" and crop_h < side <= whole_max_side)
+            if whole:
+                if (orig_h, orig_w) != (crop_h, crop_w):
+                    work_tensor = F.interpolate(
+                        work_tensor.unsqueeze(0), size=(crop_h, crop_w), mode="bilinear", align_corners=False
+                    ).squeeze(0)
+            else:
+                pad_h = max(0, crop_h - orig_h)
+                pad_w = max(0, crop_w - orig_w)
+                if pad_h or pad_w:
+                    work_tensor = F.pad(work_tensor.unsqueeze(0), (0, pad_w, 0, pad_h), mode="replicate").squeeze(0)
+
+            layout = self._slide_layout(
+                int(work_tensor.shape[1]), int(work_tensor.shape[2]), crop_h, crop_w, stride_h, stride_w
+            )
+            tiles.extend((len(images), y0, x0) for y0, x0 in layout.positions)
+            images.append(_SlideImage(work_tensor, orig_h, orig_w, layout, resized=whole))
+
+        all_results: list[list[dict]] = [[] for _ in images]
+        for b0 in range(0, len(tiles), batch):
+            batch_tiles = tiles[b0 : b0 + batch]
+            batch_tensor = torch.stack(
+                [
+                    images[i].tensor[:, y0 : y0 + crop_h, x0 : x0 + crop_w]
+                    for i, y0, x0 in batch_tiles
+                ],
+                dim=0,
+            )
+            started = time.perf_counter()
+            probs = self._infer_tiles(batch_tensor, crop_h, crop_w)
+            self.last_batch_timings.append((len(batch_tiles), time.perf_counter() - started))
+
+            # 同一张图的瓦片在队列中连续，按图整段拷入其瓦片缓冲；瓦片到齐后立即融合并后处理
+            j = 0
+            while j < len(batch_tiles):
+                i = batch_tiles[j][0]
+                image = images[i]
+                count = min(len(batch_tiles) - j, image.layout.count - image.filled)
+                image.tile_probs[image.filled : image.filled + count] = probs[j : j + count]
+                image.filled += count
+                j += count
+                if image.filled == image.layout.count:
+                    prob_map = image.prob_map()
+                    bin_mask = (prob_map >= conf_thres).to(torch.uint8).mul_(255)
+                    all_results[i] = self._prob_map_to_results(
+                        prob_map.cpu().numpy(), bin_mask.cpu().numpy(), min_area, epsilon_ratio, output
+                    )
+                    images[i] = None
 
         return all_results
+
+    def _slide_layout(
+        self, work_h: int, work_w: int, crop_h: int, crop_w: int, stride_h: int, stride_w: int
+    ) -> _SlideLayout:
+        """按 (work_h, work_w, crop, stride) 缓存滑窗布局（瓦片位置、散射索引、Hann 权重和归一化图）"""
+        key = (work_h, work_w, crop_h, crop_w, stride_h, stride_w)
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = _SlideLayout(work_h, work_w, crop_h, crop_w, stride_h, stride_w, self.device)
+            if len(self._layouts) >= _LAYOUT_CACHE_SIZE:
+                self._layouts.pop(next(iter(self._layouts)))
+            self._layouts[key] = layout
+        return layout
+
+
+def _tile_starts(full: int, crop: int, step: int) -> list[int]:
+    if full <= crop:
+        return [0]
+    out = list(range(0, full - crop + 1, step))
+    last = full - crop
+    if out[-1] != last:
+        out.append(last)
+    return out
+
+
+class _SlideLayout:
+    """
+    一种补边尺寸 + 滑窗参数下的融合布局。瓦片概率乘 Hann 权重后用一次 index_add_
+    散射累加到整图（等价于 fold，但允许最后一个瓦片贴边、不对齐步长），再乘预先算好的
+    权重和倒数完成归一化。
+    """
+
+    def __init__(
+        self,
+        work_h: int,
+        work_w: int,
+        crop_h: int,
+        crop_w: int,
+        stride_h: int,
+        stride_w: int,
+        device: torch.device,
+    ) -> None:
+        self.work_h = work_h
+        self.work_w = work_w
+        self.crop_h = crop_h
+        self.crop_w = crop_w
+        self.positions = [
+            (y0, x0)
+            for y0 in _tile_starts(work_h, crop_h, stride_h)
+            for x0 in _tile_starts(work_w, crop_w, stride_w)
+        ]
+        self.count = len(self.positions)
+
+        weight_y = torch.hann_window(crop_h, periodic=False, dtype=torch.float32)
+        weight_x = torch.hann_window(crop_w, periodic=False, dtype=torch.float32)
+        self.weight = torch.outer(weight_y, weight_x).clamp_min(1e-3).to(device)
+
+        starts = torch.tensor(self.positions, dtype=torch.long, device=device)
+        rows = starts[:, 0, None, None] + torch.arange(crop_h, device=device)[None, :, None]
+        cols = starts[:, 1, None, None] + torch.arange(crop_w, device=device)[None, None, :]
+        self.index = (rows * work_w + cols).reshape(-1)
+
+        w_sum = torch.zeros(work_h * work_w, dtype=torch.float32, device=device)
+        w_sum.index_add_(0, self.index, self.weight.expand(self.count, -1, -1).reshape(-1))
+        self.inv_weight = w_sum.clamp_min(1e-6).reciprocal().view(work_h, work_w)
+
+    def fuse(self, tile_probs: torch.Tensor) -> torch.Tensor:
+        """(count, crop_h, crop_w) 瓦片概率 -> (work_h, work_w) 融合概率图"""
+        prob_sum = torch.zeros(self.work_h * self.work_w, dtype=torch.float32, device=tile_probs.device)
+        prob_sum.index_add_(0, self.index, (tile_probs * self.weight).reshape(-1))
+        return prob_sum.view(self.work_h, self.work_w) * self.inv_weight
+
+
+class _SlideImage:
+    """单张图的滑窗状态：补边（或 whole 模式下缩放）后的张量、所用布局和已推理的瓦片概率"""
+
+    def __init__(
+        self, tensor: torch.Tensor, orig_h: int, orig_w: int, layout: _SlideLayout, resized: bool = False
+    ) -> None:
+        self.tensor = tensor
+        self.orig_h = orig_h
+        self.orig_w = orig_w
+        self.layout = layout
+        self.resized = resized
+        self.tile_probs = torch.empty(
+            (layout.count, layout.crop_h, layout.crop_w), dtype=torch.float32, device=tensor.device
+        )
+        self.filled = 0
+
+    def prob_map(self) -> torch.Tensor:
+        """融合瓦片并还原到原图尺寸：whole 模式缩放回去，slide 模式去掉补边"""
+        fused = self.layout.fuse(self.tile_probs)
+        if self.resized and fused.shape != (self.orig_h, self.orig_w):
+            return F.interpolate(
+                fused[None, None], size=(self.orig_h, self.orig_w), mode="bilinear", align_corners=False
+            )[0, 0]
+        return fused[: self.orig_h, : self.orig_w]
@@ -11,12 +11,21 @@ import cv2
 """
 
 __all__ = [
+    "PEAK_FIT_RADIUS",
     "get_coord_min_rect_len",
+    "box_mean",
     "calc_length_diff",
-    "calc_speed"
+    "calc_instantaneous_speeds",
+    "forward_fill_outliers",
+    "calc_init_speed",
+    "calc_speed",
+    "calc_speed_batch",
 ]
 
 
+# 峰值修正时在峰值前后各取的帧数
+PEAK_FIT_RADIUS = 4
+
 
 def get_coord_min_rect_len(seg_coords: Sequence[int] | NDArray[np.integer] | NDArray[np.floating],):
     """计算多边形坐标的最小外接矩形的长度，这里指的较大的边"""
@@ -65,7 +74,7 @@ def detect_outliers_mad(data, threshold=2.0):
 
 
 
-def fix_to_monotonic_decreasing(lens):
+def fix_to_monotonic_decreasing(lens, outlier_threshold=2.0):
         """
             从峰值开始修正为单调减的序列，
             并且对峰值做了离群点和均值优化
@@ -82,8 +91,8 @@ def fix_to_monotonic_decreasing(lens):
             peak_idx = int(np.nanargmax(arr))
         except ValueError:
             peak_idx = 0
-        left = max(0, peak_idx - 4)
-        right = min(len(lens) - 1, peak_idx + 4)
+        left = max(0, peak_idx - PEAK_FIT_RADIUS)
+        right = min(len(lens) - 1, peak_idx + PEAK_FIT_RADIUS)
         xs = np.arange(left, right + 1, dtype=np.float64)
         ys = np.asarray(lens[left : right + 1], dtype=np.float64)
         finite_mask = np.isfinite(ys)
@@ -95,7 +104,7 @@ def fix_to_monotonic_decreasing(lens):
                 A = np.column_stack([x0, np.ones_like(x0)])
                 (m, b), *_ = np.linalg.lstsq(A, ys_f, rcond=None)
                 residuals = ys_f - (m * x0 + b)
-                outlier_mask = detect_outliers_mad(residuals)
+                outlier_mask = detect_outliers_mad(residuals, threshold=outlier_threshold)
                 inlier_mask = ~outlier_mask
 
                 if np.count_nonzero(inlier_mask) < 3:
@@ -108,50 +117,131 @@ def fix_to_monotonic_decreasing(lens):
                 peak_avg = float(np.mean(ys_f))
             lens[0] = peak_avg
 
-        # 单调减
-        for i in range(1, len(lens)):
-            if lens[i] > lens[i - 1]:
-                lens[i] = lens[i - 1]
-        
-        
-        
+        # 单调减（累计最小值）
+        lens[:] = np.minimum.accumulate(np.asarray(lens, dtype=np.float64)).tolist()
 
         return lens, peak_idx
 
 
 
+def box_mean(values, r: int = 2) -> NDArray[np.float64]:
+    """
+        沿最后一维求每个位置前后 r 个数（含自身，边界处截断）的平均值，
+        用前缀和实现；values 可为 1-D 或 2-D（每行一条序列）
+    """
+    arr = np.asarray(values, dtype=np.float64)
+    n = arr.shape[-1]
+    csum = np.zeros(arr.shape[:-1] + (n + 1,), dtype=np.float64)
+    np.cumsum(arr, axis=-1, out=csum[..., 1:])
+    idx = np.arange(n)
+    start = np.maximum(idx - r, 0)
+    end = np.minimum(idx + r + 1, n)
+    return (csum[..., end] - csum[..., start]) / (end - start)
+
+
+
 def calc_length_diff(length_list, swin=6, step=2):
     '''
         计算长度列表的长度差列表
+        length_list 为 2-D 数组时逐行计算，返回 (B, K) 数组（1-D 输入仍返回 list）
     '''
-        
-    def _average_within(nums, index, r=2):
-        # 计算前后 r 个数的范围，考虑到列表边界
-        start = max(0, index - r)
-        end = min(len(nums), index + r + 1)
-        
-        # 提取范围内的子列表并计算平均值
-        values = nums[start:end]
-        
-        # 计算并返回平均值
-        if values:
-            return sum(values) / len(values)
-        else:
-            return None  # 如果范围内没有元素，返回 None
-        
-    lengths_diff = []
-    indexes = []
-    n = len(length_list)
-    for i in range(0, n - swin + 1, step):
-        start = _average_within(length_list, i, r=2)
-        end = _average_within(length_list, i + swin - 1, r=2) 
-        diff = start - end
-        lengths_diff.append(diff)
-        indexes.append(i)
+    arr = np.asarray(length_list, dtype=np.float64)
+    n = arr.shape[-1]
+    indexes = list(range(0, n - swin + 1, step))
+    if not indexes:
+        if arr.ndim == 1:
+            return [], []
+        return np.zeros(arr.shape[:-1] + (0,), dtype=np.float64), []
+
+    # 每个窗口首尾各取前后 2 个数的平均值
+    means = box_mean(arr, r=2)
+    starts = np.asarray(indexes, dtype=np.int64)
+    lengths_diff = means[..., starts] - means[..., starts + swin - 1]
+    if arr.ndim == 1:
+        return lengths_diff.tolist(), indexes
+    return lengths_diff, indexes
 
 
-    return lengths_diff, indexes
 
+def calc_instantaneous_speeds(
+    needle_lengths,
+    fps=30,
+    swin=8,
+    step=2,
+    init_shaft_len=20,
+    sigma=3,
+) -> tuple[NDArray[np.float64], list[int]]:
+    """
+        由 [start_idx, end_idx] 区间内的针梗长度计算瞬时速度（高斯平滑 -> 窗口长度差 -> 换算为 毫米/秒）。
+        needle_lengths 为 1-D 或 2-D（每行一条序列），返回 (速度数组, 窗口起点下标)
+    """
+    smoothed = gaussian_filter1d(np.asarray(needle_lengths, dtype=np.float64), sigma=sigma, axis=-1)
+    # 比例因子（起始长度 <= 0 时避免除以 0）
+    start_length = smoothed[..., 0]
+    start_length = np.where(start_length <= 0, 0.000001, start_length)
+    r = init_shaft_len / start_length
+
+    lengths_diff, indexes = calc_length_diff(np.atleast_2d(smoothed), swin=swin, step=step)
+    lengths_diff = lengths_diff.reshape(smoothed.shape[:-1] + (len(indexes),))
+    swin_time_diff = swin / fps
+    speeds = (np.maximum(0.0, lengths_diff) * np.expand_dims(r, -1)) / swin_time_diff
+    return speeds, indexes
+
+
+
+def forward_fill_outliers(speeds, outlier_mask, fallback):
+    """
+        把异常点替换为它之前最近的“有限值且非异常”的点（前向填充），
+        之前没有这样的点时用 fallback；speeds / outlier_mask 可为 1-D 或 2-D，fallback 可按行给出
+    """
+    arr = np.array(speeds, dtype=np.float64)
+    outlier_mask = np.asarray(outlier_mask, dtype=bool)
+    source = np.isfinite(arr) & ~outlier_mask
+    positions = np.where(source, np.arange(arr.shape[-1]), -1)
+    last_source = np.maximum.accumulate(positions, axis=-1)
+    filled = np.take_along_axis(arr, np.maximum(last_source, 0), axis=-1)
+    fallback = np.broadcast_to(np.expand_dims(np.asarray(fallback, dtype=np.float64), -1), arr.shape)
+    filled = np.where(last_source >= 0, filled, fallback)
+    return np.where(outlier_mask, filled, arr)
+
+
+
+
+def calc_init_speed(instantaneous_speeds, fps, step, init_speed_sample_points: int = 5) -> float:
+    '''
+        计算若干个速度点的“加速度”（考虑初始加速度的一个合理性）。
+        - sum =  instantaneous_speeds[0]
+        - sum += instantaneous_speeds[1], 然后判断“加速度”[0] ,若大于2 则停止 sum自增，否则继续加。
+        - ...
+        - 最终算平均速度。
+    '''
+    if len(instantaneous_speeds) == 0:
+        return 0.0
+
+    sample_points_count = max(1, int(init_speed_sample_points))
+    first_pos = next((i for i, x in enumerate(instantaneous_speeds) if x >= 0.6), None)
+    if first_pos is None:
+        first_pos = 0
+
+    if len(instantaneous_speeds) >= sample_points_count:
+        first_pos = min(max(0, first_pos), len(instantaneous_speeds) - sample_points_count)
+        speed_points = instantaneous_speeds[first_pos : first_pos + sample_points_count]
+    else:
+        first_pos = min(max(0, first_pos), len(instantaneous_speeds) - 1)
+        speed_points = instantaneous_speeds[first_pos:]
+
+    time_step = (step/fps)
+    accelerations = [(speed_points[i + 1] - speed_points[i]) /time_step for i in range(len(speed_points) - 1)]
+
+    speed_sum = speed_points[0]
+    speed_count = 1
+    for i, a in enumerate(accelerations):
+        speed_sum += speed_points[i + 1]
+        speed_count += 1
+        if a > 10: # 根据实际视频总结出来 10 是一个合理的阈值 (可根据 初始速度定义 进行调整)
+            break
+
+    return speed_sum / speed_count
 
 
 
@@ -163,27 +253,15 @@ def calc_speed(
     step=2, # 窗口步长
     init_shaft_len = 20, # 针梗的实际长度，单位为毫米
     init_speed_sample_points: int = 5,
+    outlier_threshold: float = 3.5, # 瞬时速度 MAD 离群阈值
 ):
     """
         基于视频帧针梗长度，计算穿刺速度
     """
 
-    def _gaussian_smoothing(lens, sigma=3):
-        """高斯平滑"""
-        return gaussian_filter1d(lens, sigma=sigma).tolist()
-    
     start_idx, end_idx = start_end
     
     needle_lengths = lengths[start_idx:end_idx+1]
-    needle_lengths = _gaussian_smoothing(needle_lengths) #对长度平滑
-    start_length = needle_lengths[0]
-    end_length = needle_lengths[-1]
-
-    if start_length<=0:
-        start_length = 0.000001 #避免除以0
-    
-    # 计算比例因子
-    r = (init_shaft_len/start_length)
 
 
     # -------------- 计算1/10长度变化 START -----------------
@@ -209,74 +287,96 @@ def calc_speed(
 
 
     # -------------- 计算瞬时速度 START -----------------
-    needle_lengths_diff, needle_lengths_index = calc_length_diff(needle_lengths, swin=swin, step=step)
-    swin_time_diff = swin/fps
-    instantaneous_speeds = [ (max(0.0, len_diff)*r)/swin_time_diff for len_diff in needle_lengths_diff]
+    speeds_arr, needle_lengths_index = calc_instantaneous_speeds(
+        needle_lengths, fps=fps, swin=swin, step=step, init_shaft_len=init_shaft_len
+    )
+    instantaneous_speeds = speeds_arr.tolist()
 
     avg_speed = 0.0
     if instantaneous_speeds:
-        speeds_arr = np.asarray(instantaneous_speeds, dtype=np.float64)
         idx_arr = np.asarray(needle_lengths_index, dtype=np.int64)
         in_range_mask = (idx_arr >= start_idx) & (idx_arr + swin - 1 <= end_idx)
         valid_mask = in_range_mask & np.isfinite(speeds_arr)
         speeds_valid = speeds_arr[valid_mask]
 
         if speeds_valid.size > 0:
-            outliers_local = detect_outliers_mad(speeds_valid, threshold=3.5)
+            outliers_local = detect_outliers_mad(speeds_valid, threshold=outlier_threshold)
             inliers = speeds_valid[~outliers_local]
             avg_speed = float(np.mean(inliers)) if inliers.size > 0 else float(np.mean(speeds_valid))
 
-            replace_positions = np.flatnonzero(valid_mask)
-            outlier_positions = replace_positions[outliers_local]
-            for pos in outlier_positions:
-                prev_pos = int(pos) - 1
-                while prev_pos >= 0 and not np.isfinite(speeds_arr[prev_pos]):
-                    prev_pos -= 1
-                if prev_pos >= 0:
-                    speeds_arr[int(pos)] = float(speeds_arr[prev_pos])
-                else:
-                    speeds_arr[int(pos)] = avg_speed
-            instantaneous_speeds = speeds_arr.tolist()
+            # 异常点替换为之前最近的有限值（没有时用平均速度）
+            outlier_mask = np.zeros_like(valid_mask)
+            outlier_mask[np.flatnonzero(valid_mask)[outliers_local]] = True
+            instantaneous_speeds = forward_fill_outliers(speeds_arr, outlier_mask, avg_speed).tolist()
     # -------------- 计算瞬时速度 END -----------------
 
     # -------------- 计算初始速度 START -----------------
-    '''
-        计算若干个速度点的“加速度”（考虑初始加速度的一个合理性）。
-        - sum =  instantaneous_speeds[0]
-        - sum += instantaneous_speeds[1], 然后判断“加速度”[0] ,若大于2 则停止 sum自增，否则继续加。
-        - ...
-        - 最终算平均速度。
-    '''
-    if not instantaneous_speeds:
-        init_speed = 0.0
-    else:
-        sample_points_count = max(1, int(init_speed_sample_points))
-        first_pos = next((i for i, x in enumerate(instantaneous_speeds) if x >= 0.6), None)
-        if first_pos is None:
-            first_pos = 0
-
-        if len(instantaneous_speeds) >= sample_points_count:
-            first_pos = min(max(0, first_pos), len(instantaneous_speeds) - sample_points_count)
-            speed_points = instantaneous_speeds[first_pos : first_pos + sample_points_count]
-        else:
-            first_pos = min(max(0, first_pos), len(instantaneous_speeds) - 1)
-            speed_points = instantaneous_speeds[first_pos:]
-
-        time_step = (step/fps)
-        accelerations = [(speed_points[i + 1] - speed_points[i]) /time_step for i in range(len(speed_points) - 1)]
-
-        speed_sum = speed_points[0]
-        speed_count = 1
-        for i, a in enumerate(accelerations):
-            speed_sum += speed_points[i + 1]
-            speed_count += 1
-            if a > 10: # 根据实际视频总结出来 10 是一个合理的阈值 (可根据 初始速度定义 进行调整)
-                break
-
-        init_speed = speed_sum / speed_count
+    init_speed = calc_init_speed(instantaneous_speeds, fps, step, init_speed_sample_points)
     # -------------- 计算初始速度 END -----------------
 
 
     
 
     return init_speed, avg_speed, instantaneous_speeds
+
+
+
+def calc_speed_batch(
+    lengths: list[float],
+    start_end: tuple[int, int],
+    params: Sequence[tuple[int, int, int, float]],
+    fps=30,
+    init_shaft_len=20,
+) -> list[tuple[float, float, list[float]]]:
+    """
+        对同一段长度一次计算多组参数的 calc_speed 结果。
+        params 每项为 (swin, step, init_speed_sample_points, outlier_threshold)；
+        高斯平滑只做一次，相同 (swin, step) 的参数共用长度差和 MAD 分数，
+        各离群阈值的平均速度和前向填充按行向量化。返回值与逐个调用 calc_speed 相同。
+    """
+    start_idx, end_idx = start_end
+    smoothed = gaussian_filter1d(
+        np.asarray(lengths[start_idx:end_idx+1], dtype=np.float64), sigma=3
+    )
+    start_length = smoothed[0] if smoothed[0] > 0 else 0.000001
+    r = init_shaft_len / start_length
+
+    results: list[tuple[float, float, list[float]] | None] = [None] * len(params)
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, (swin, step, _, _) in enumerate(params):
+        groups.setdefault((int(swin), int(step)), []).append(i)
+
+    for (swin, step), rows in groups.items():
+        lengths_diff, indexes = calc_length_diff(smoothed, swin=swin, step=step)
+        speeds = (np.maximum(0.0, np.asarray(lengths_diff, dtype=np.float64)) * r) / (swin / fps)
+        thresholds = np.asarray([params[i][3] for i in rows], dtype=np.float64)
+        table = np.broadcast_to(speeds, (len(rows), speeds.size))
+        avg_speeds = np.zeros(len(rows), dtype=np.float64)
+
+        idx_arr = np.asarray(indexes, dtype=np.int64)
+        valid_mask = (idx_arr >= start_idx) & (idx_arr + swin - 1 <= end_idx) & np.isfinite(speeds)
+        speeds_valid = speeds[valid_mask]
+        if speeds_valid.size > 0:
+            # 与 detect_outliers_mad 相同的 Modified Z-score，只算一次，按行比较不同阈值
+            mad = median_abs_deviation(speeds_valid)
+            if mad == 0:
+                outliers_local = np.zeros((len(rows), speeds_valid.size), dtype=bool)
+            else:
+                z_score = np.abs(0.6745 * (speeds_valid - np.median(speeds_valid)) / mad)
+                outliers_local = z_score[None, :] > thresholds[:, None]
+            inlier_count = np.count_nonzero(~outliers_local, axis=1)
+            inlier_sum = np.where(outliers_local, 0.0, speeds_valid[None, :]).sum(axis=1)
+            avg_speeds = np.where(
+                inlier_count > 0,
+                inlier_sum / np.maximum(inlier_count, 1),
+                float(np.mean(speeds_valid)),
+            )
+            outlier_mask = np.zeros(table.shape, dtype=bool)
+            outlier_mask[:, valid_mask] = outliers_local
+            table = forward_fill_outliers(table, outlier_mask, avg_speeds)
+
+        for row, i in enumerate(rows):
+            instantaneous_speeds = table[row].tolist()
+            init_speed = calc_init_speed(instantaneous_speeds, fps, step, params[i][2])
+            results[i] = (init_speed, float(avg_speeds[row]), instantaneous_speeds)
+    return results
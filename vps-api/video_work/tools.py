@@ -1,15 +1,16 @@
 
 import os
-import tempfile
-import shutil
+import threading
 import ffmpeg
 import cv2
 import numpy as np
-import math
 import torch
 from numpy.typing import NDArray
 from torch import Tensor
-from typing import Dict, List, Literal, Sequence, Tuple, TypedDict
+from typing import Dict, Iterable, Iterator, List, Literal, Sequence, Tuple, TypedDict
+
+from video_work.boxes import BOX_SIDE, BOX_X1, BOX_X2, BOX_Y1, BOX_Y2, FrameBoxes
+from video_work.paint import square_crop_region
 
 
 class VideoFramesMeta(TypedDict):
@@ -54,41 +55,113 @@ def get_detect_box_sacle(width: int, height: int):
 
 
 
-def extract_video_frames(video_path: str) -> VideoFramesResult:
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise RuntimeError(f"Could not open video {video_path}")
-
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 25
-    fourcc_int = int(cap.get(cv2.CAP_PROP_FOURCC))
-    fourcc = (
+def _fourcc_to_str(fourcc_int: int) -> str:
+    return (
         chr(fourcc_int & 0xFF)
         + chr((fourcc_int >> 8) & 0xFF)
         + chr((fourcc_int >> 16) & 0xFF)
         + chr((fourcc_int >> 24) & 0xFF)
     )
 
-    frames: List[NDArray[np.uint8]] = []
-    try:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frames.append(frame.copy())
-    finally:
-        cap.release()
-        cv2.destroyAllWindows()
-
-    meta: VideoFramesMeta = {
-        "width": frame_width,
-        "height": frame_height,
-        "fps": fps,
-        "codec": fourcc,
-        "frame_count": len(frames),
-    }
-    return {"frames": frames, "meta": meta}
+
+class VideoFrameSource:
+    """
+        流式视频帧源：构造时只读取元信息，迭代时逐帧解码，不在内存中保留整段视频。
+        - 每次迭代都会重新打开视频，因此可以多次遍历（检测、裁剪、渲染各走一遍）
+        - iter_windows 按窗口分批产出帧，峰值内存由 window 决定而不是由视频时长决定
+        - meta["frame_count"] 初始为容器上报的帧数，完整遍历一次后修正为实际解码帧数
+        - max_side 不为空时输出缩小后的代理帧（长边不超过 max_side），解码后立即缩放，
+          meta 中的宽高为代理帧尺寸；归一化坐标与原始分辨率通用
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        window: int = 32,
+        max_side: int | None = None,
+    ) -> None:
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if max_side is not None and max_side <= 0:
+            raise ValueError("max_side must be positive")
+        self.video_path = video_path
+        self.window = int(window)
+        self.meta = self._read_meta()
+        self.proxy_size: Tuple[int, int] | None = None
+        longest_side = max(int(self.meta["width"]), int(self.meta["height"]))
+        if max_side is not None and longest_side > max_side:
+            scale = float(max_side) / float(longest_side)
+            proxy_w = max(1, int(round(self.meta["width"] * scale)))
+            proxy_h = max(1, int(round(self.meta["height"] * scale)))
+            self.proxy_size = (proxy_w, proxy_h)
+            self.meta["width"] = proxy_w
+            self.meta["height"] = proxy_h
+
+    def proxy(self, max_side: int) -> "VideoFrameSource":
+        """基于同一视频创建代理帧源（用于低分辨率检测）"""
+        return VideoFrameSource(self.video_path, window=self.window, max_side=max_side)
+
+    def _open(self) -> cv2.VideoCapture:
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open video {self.video_path}")
+        return cap
+
+    def _read_meta(self) -> VideoFramesMeta:
+        cap = self._open()
+        try:
+            meta: VideoFramesMeta = {
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": int(cap.get(cv2.CAP_PROP_FPS)) or 25,
+                "codec": _fourcc_to_str(int(cap.get(cv2.CAP_PROP_FOURCC))),
+                "frame_count": max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+            }
+        finally:
+            cap.release()
+        return meta
+
+    def __len__(self) -> int:
+        return int(self.meta["frame_count"])
+
+    def __iter__(self) -> Iterator[NDArray[np.uint8]]:
+        cap = self._open()
+        count = 0
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                count += 1
+                if self.proxy_size is not None:
+                    frame = cv2.resize(frame, self.proxy_size, interpolation=cv2.INTER_AREA)
+                yield frame
+        finally:
+            cap.release()
+        # 只有完整读完才修正帧数（中途 break 的遍历不作数）
+        self.meta["frame_count"] = count
+
+    def iter_windows(self, window: int | None = None) -> Iterator[List[NDArray[np.uint8]]]:
+        size = int(window or self.window)
+        if size <= 0:
+            raise ValueError("window must be positive")
+        buffer: List[NDArray[np.uint8]] = []
+        for frame in self:
+            buffer.append(frame)
+            if len(buffer) >= size:
+                yield buffer
+                buffer = []
+        if buffer:
+            yield buffer
+
+
+def extract_video_frames(video_path: str) -> VideoFramesResult:
+    """
+        一次性解码全部视频帧（整段视频驻留内存，仅适合短视频/调试，分析流程请使用 VideoFrameSource）
+    """
+    source = VideoFrameSource(video_path)
+    frames: List[NDArray[np.uint8]] = list(source)
+    return {"frames": frames, "meta": source.meta}
 
 def get_device() -> torch.device:
     return torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -112,15 +185,75 @@ def frames2tensors(
     return tensors
 
 
+def square_crops2tensor(
+    frames: Sequence[NDArray[np.uint8]],
+    boxes: Sequence[NDArray[np.floating]],
+    device: torch.device,
+) -> Tuple[Tensor, List[Tuple[int, int, int]]] | None:
+    """
+        把一组同边长的正方形裁剪直接写入预分配的 (N, 3, side, side) float 张量：
+        裁剪、BGR->RGB、HWC->CHW、/255 在一次拷贝中完成，框完全在画面内时不做补 0。
+        frames[i] 与 boxes[i] 一一对应（boxes 为 FrameBoxes 的行，同组 BOX_SIDE 相同）。
+        返回 (张量, 每个裁剪的 (输入序号, origin_x, origin_y))；无效框（与 square_crop_with_origin
+        返回 None 的情况一致）直接跳过，没有有效裁剪时返回 None。
+    """
+    regions: List[Tuple[int, NDArray[np.uint8], int, int]] = []
+    side = 0
+    for index, (frame, box) in enumerate(zip(frames, boxes)):
+        region = square_crop_region(frame.shape, box)
+        if region is None:
+            continue
+        if side and region[0] != side:
+            raise ValueError("all crops in a group must have the same side")
+        side = region[0]
+        regions.append((index, frame, region[1], region[2]))
+    if not regions:
+        return None
+
+    pin = device.type == "cuda"
+    batch = torch.empty((len(regions), 3, side, side), dtype=torch.float32, pin_memory=pin)
+    buffer = batch.numpy()
+    origins: List[Tuple[int, int, int]] = []
+    for i, (index, frame, x0, y0) in enumerate(regions):
+        height, width = frame.shape[:2]
+        src_x1, src_y1 = max(0, x0), max(0, y0)
+        src_x2, src_y2 = min(width, x0 + side), min(height, y0 + side)
+        dst = buffer[i]
+        if (src_x1, src_y1, src_x2, src_y2) != (x0, y0, x0 + side, y0 + side):
+            dst.fill(0.0)
+            dst = dst[:, src_y1 - y0 : src_y2 - y0, src_x1 - x0 : src_x2 - x0]
+        # BGR HWC uint8 -> RGB CHW float32 [0, 1]
+        src = frame[src_y1:src_y2, src_x1:src_x2, ::-1].transpose(2, 0, 1)
+        np.divide(src, np.float32(255.0), out=dst, casting="unsafe")
+        origins.append((index, x0, y0))
+    return batch.to(device, non_blocking=pin), origins
+
+
 def make_group_square_annotations(
     annotations: List[List[Dict[str, float]]],
     group_size: int,
     image_size: Tuple[int, int],
 ) -> List[List[Dict[str, float]]]:
+    """
+        dict 形式的兼容接口，实现见 make_group_square_boxes
+    """
+    if group_size <= 0:
+        raise ValueError("group_size must be positive")
+    boxes = FrameBoxes.from_annotations(annotations)
+    if boxes.boxes.shape[0] == 0:
+        return annotations
+    return make_group_square_boxes(boxes, group_size, image_size).to_annotations()
+
+
+def make_group_square_boxes(
+    boxes: FrameBoxes,
+    group_size: int,
+    image_size: Tuple[int, int],
+) -> FrameBoxes:
     """
         将预测框按“顺序分组”，每组取该组内最大的边长，然后把组内每个框调整为同尺寸正方形框：
-        - 分组顺序：按 annotations 的遍历顺序（先帧后框）扁平化后，每 group_size 个为一组
-        - 正方形边长：先取组内最大像素边长，再向上取整到 [224, 640] 范围内的 32 倍数
+        - 分组顺序：按 boxes 的存放顺序（先帧后框）每 group_size 个为一组
+        - 正方形边长：先取组内最大像素边长，再向上取整到 [224, 640] 范围内的 32 倍数，写入 BOX_SIDE 列
         - 每个框保持中心点不变（若越界则平移回 [0,1] 范围内）
     """
     if group_size <= 0:
@@ -130,126 +263,72 @@ def make_group_square_annotations(
     if width <= 0 or height <= 0:
         raise ValueError("image_size must be positive (width, height)")
 
-    flat: List[Tuple[int, Dict[str, float]]] = []
-    for frame_idx, frame_boxes in enumerate(annotations):
-        for ann in frame_boxes:
-            flat.append((frame_idx, ann))
-
-    if not flat:
-        return annotations
+    count = boxes.boxes.shape[0]
+    if count == 0:
+        return boxes
 
     min_side = 32 * 7
     max_side = 32 * 20
     step = 32
 
-    def quantize_side_px(side_px: float) -> int:
-        target = max(float(side_px), float(min_side))
-        quantized = int(math.ceil(target / float(step)) * step)
-        return int(max(min_side, min(max_side, quantized)))
-
-    group_side_px_list: List[int] = []
-    current_max_px = 0.0
-    current_count = 0
-    for _, ann in flat:
-        w_n = float(ann["x2"] - ann["x1"])
-        h_n = float(ann["y2"] - ann["y1"])
-        w_px = w_n * float(width)
-        h_px = h_n * float(height)
-        current_max_px = max(current_max_px, max(w_px, h_px))
-        current_count += 1
-        if current_count >= group_size:
-            group_side_px_list.append(quantize_side_px(current_max_px))
-            current_max_px = 0.0
-            current_count = 0
-    if current_count > 0:
-        group_side_px_list.append(quantize_side_px(current_max_px))
-
-    out: List[List[Dict[str, float]]] = [[] for _ in range(len(annotations))]
-    for flat_idx, (frame_idx, ann) in enumerate(flat):
-        group_idx = flat_idx // group_size
-        side_px = int(group_side_px_list[group_idx]) if group_idx < len(group_side_px_list) else 0
-        if side_px <= 0:
-            continue
-
-        max_side_x = float(side_px) / float(width)
-        max_side_y = float(side_px) / float(height)
-        half_x = max_side_x / 2.0
-        half_y = max_side_y / 2.0
-
-        x1 = float(ann["x1"])
-        y1 = float(ann["y1"])
-        x2 = float(ann["x2"])
-        y2 = float(ann["y2"])
-
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-
-        new_x1 = cx - half_x
-        new_x2 = cx + half_x
-        if new_x1 < 0.0:
-            shift = -new_x1
-            new_x1 += shift
-            new_x2 += shift
-        if new_x2 > 1.0:
-            shift = new_x2 - 1.0
-            new_x1 -= shift
-            new_x2 -= shift
-
-        new_y1 = cy - half_y
-        new_y2 = cy + half_y
-        if new_y1 < 0.0:
-            shift = -new_y1
-            new_y1 += shift
-            new_y2 += shift
-        if new_y2 > 1.0:
-            shift = new_y2 - 1.0
-            new_y1 -= shift
-            new_y2 -= shift
-
-        new_x1 = float(max(0.0, min(1.0, new_x1)))
-        new_y1 = float(max(0.0, min(1.0, new_y1)))
-        new_x2 = float(max(0.0, min(1.0, new_x2)))
-        new_y2 = float(max(0.0, min(1.0, new_y2)))
-
-        if new_x2 <= new_x1 or new_y2 <= new_y1:
-            continue
-
-        new_ann = dict(ann)
-        new_ann["x1"] = new_x1
-        new_ann["y1"] = new_y1
-        new_ann["x2"] = new_x2
-        new_ann["y2"] = new_y2
-        new_ann["square_side_px"] = float(side_px) # 正方形边长
-        out[frame_idx].append(new_ann)
-
-    return out
-
-def save_frames2video(
-    frames: List[NDArray[np.uint8]],
-    output_path: str,
-    fps: int,
-    size: Tuple[int, int],
-) -> None:
+    data = boxes.boxes.astype(np.float64)
+    x1, y1, x2, y2 = data[:, BOX_X1], data[:, BOX_Y1], data[:, BOX_X2], data[:, BOX_Y2]
+    side_px = np.maximum(np.maximum((x2 - x1) * width, (y2 - y1) * height), 0.0)
+    group_starts = np.arange(0, count, group_size)
+    group_max = np.maximum.reduceat(side_px, group_starts)
+    group_side = np.ceil(np.maximum(group_max, min_side) / step) * step
+    group_side = np.clip(group_side, min_side, max_side)
+    side = np.repeat(group_side, np.diff(np.append(group_starts, count)))
+
+    def fit(center: NDArray[np.float64], half: NDArray[np.float64]):
+        lo = center - half
+        hi = center + half
+        shift = np.where(lo < 0.0, -lo, 0.0)
+        lo, hi = lo + shift, hi + shift
+        shift = np.where(hi > 1.0, hi - 1.0, 0.0)
+        lo, hi = lo - shift, hi - shift
+        return np.clip(lo, 0.0, 1.0), np.clip(hi, 0.0, 1.0)
+
+    new_x1, new_x2 = fit((x1 + x2) / 2.0, side / float(width) / 2.0)
+    new_y1, new_y2 = fit((y1 + y2) / 2.0, side / float(height) / 2.0)
+    keep = (new_x2 > new_x1) & (new_y2 > new_y1)
+
+    out = boxes.boxes[keep].copy()
+    out[:, BOX_X1] = new_x1[keep]
+    out[:, BOX_Y1] = new_y1[keep]
+    out[:, BOX_X2] = new_x2[keep]
+    out[:, BOX_Y2] = new_y2[keep]
+    out[:, BOX_SIDE] = side[keep]  # 正方形边长
+    return FrameBoxes(boxes=out, frame_idx=boxes.frame_idx[keep], frame_count=len(boxes))
+
+class FfmpegVideoWriter:
     """
-        保存视频帧到视频文件
+        流式视频编码器：把 BGR 原始帧经 stdin 管道直接送入 ffmpeg 子进程编码为 H.264 mp4，
+        不再逐帧落盘 PNG 再二次读取。
+        - 写管道在 ffmpeg 编码跟不上时阻塞，缓冲上限为管道容量，生产端自然被限速
+        - stderr 由后台线程持续读取（只保留末尾 STDERR_TAIL 字节），避免管道写满导致死锁
+        - ffmpeg 提前退出（BrokenPipe）或返回码非 0 时抛出 RuntimeError，附带 stderr 内容
+        - 作为上下文管理器使用时，块内抛出异常会终止子进程并删除半成品文件；编码失败时同样删除
     """
-    if not frames:
-        raise ValueError("frames is empty")
-
-    width, height = size
-    tmp_dir = tempfile.mkdtemp(prefix="detect_frames_")
-
-    try:
-        for idx, frame in enumerate(frames):
-            resized = cv2.resize(frame, (width, height))
-            frame_path = os.path.join(tmp_dir, f"frame_{idx:06d}.png")
-            ok = cv2.imwrite(frame_path, resized)
-            if not ok:
-                raise RuntimeError(f"Failed to write frame {idx} to disk")
-
-        input_pattern = os.path.join(tmp_dir, "frame_%06d.png")
-        (
-            ffmpeg.input(input_pattern, framerate=fps)
+
+    STDERR_TAIL = 64 * 1024
+
+    def __init__(self, output_path: str, fps: int, size: Tuple[int, int]) -> None:
+        width, height = int(size[0]), int(size[1])
+        if width <= 0 or height <= 0:
+            raise ValueError("size must be positive")
+        self.output_path = output_path
+        self.size = (width, height)
+        self.frame_count = 0
+        self._stderr = bytearray()
+        self._process = (
+            ffmpeg.input(
+                "pipe:",
+                format="rawvideo",
+                pix_fmt="bgr24",
+                s=f"{width}x{height}",
+                framerate=fps,
+            )
             .output(
                 output_path,
                 vcodec="libx264",
@@ -258,18 +337,93 @@ def save_frames2video(
                 format="mp4",
             )
             .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
+            .run_async(pipe_stdin=True, pipe_stderr=True)
         )
-    except ffmpeg.Error as e:
-        error_message = e.stderr.decode() if e.stderr else str(e)
-        raise RuntimeError(f"Error during ffmpeg processing: {error_message}") from e
-    finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
-
-
-
+        self._stderr_thread = threading.Thread(
+            target=self._drain_stderr, name="ffmpeg-stderr", daemon=True
+        )
+        self._stderr_thread.start()
+
+    def _drain_stderr(self) -> None:
+        stream = self._process.stderr
+        for chunk in iter(lambda: stream.read(4096), b""):
+            self._stderr += chunk
+            if len(self._stderr) > self.STDERR_TAIL:
+                del self._stderr[: len(self._stderr) - self.STDERR_TAIL]
+
+    def _error(self, reason: str) -> RuntimeError:
+        message = self._stderr.decode(errors="replace").strip() or reason
+        return RuntimeError(f"Error during ffmpeg processing: {message}")
+
+    def write(self, frame: NDArray[np.uint8]) -> None:
+        """写入一帧 BGR 图像；尺寸与目标不一致时才缩放"""
+        width, height = self.size
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        if frame.shape[:2] != (height, width):
+            frame = cv2.resize(frame, (width, height))
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        try:
+            self._process.stdin.write(frame.data)
+        except OSError as e:
+            self.abort()
+            raise self._error(f"ffmpeg exited after {self.frame_count} frames") from e
+        self.frame_count += 1
+
+    def close(self) -> None:
+        """结束输入并等待编码完成；未写入任何帧时抛出 ValueError"""
+        if self.frame_count == 0:
+            self.abort()
+            raise ValueError("frames is empty")
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+        if returncode != 0:
+            self._remove_output()
+            raise self._error(f"ffmpeg exited with code {returncode}")
+
+    def abort(self) -> None:
+        """终止子进程并删除未完成的输出文件"""
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._stderr_thread.join()
+        self._remove_output()
+
+    def _remove_output(self) -> None:
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self) -> "FfmpegVideoWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
 
 
+def save_frames2video(
+    frames: Iterable[NDArray[np.uint8]],
+    output_path: str,
+    fps: int,
+    size: Tuple[int, int],
+) -> None:
+    """
+        保存视频帧到视频文件（frames 可以是列表，也可以是逐帧产出的迭代器）。
+        帧经管道流式送入 ffmpeg，边渲染边编码，不产生临时图片。
+    """
+    with FfmpegVideoWriter(output_path, fps=fps, size=size) as writer:
+        for frame in frames:
+            writer.write(frame)
 
 
 def get_coord_mask(